@@ -0,0 +1,245 @@
+# benchmarks/e2e.py
+# End-to-end benchmark of upload → /extract → /analyze_stream → /final against a stub API
+#
+# Usage:
+#   python benchmarks/e2e.py                                  # 640x360, 20 s, no API latency
+#   python benchmarks/e2e.py --width 3840 --height 2160 --seconds 60 \
+#       --latency 0.8 --jitter 0.4 --rate-limit 0.05 --output results/4k.json
+#
+# Everything runs in this process through Flask's test client, with jobs and
+# caches in a temporary directory and OPENAI_BASE_URL pointing at the stub, so
+# no real API calls are made. The JSON report is printed (and written to
+# --output) so runs can be compared over time. API clients are built before
+# their stage starts, so one-off imports do not count towards latencies. Peak
+# RSS is the process high-water mark after each stage, not the stage's own usage.
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC_DIR = os.path.join(PROJECT_ROOT, "src")
+sys.path[:0] = [PROJECT_ROOT, SRC_DIR]
+
+from benchmarks.stub_openai import StubOpenAI  # noqa: E402
+from benchmarks.synthetic import make_video  # noqa: E402
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def _sse_events(body: str) -> list[tuple[str, str]]:
+    """(event, data) pairs of an SSE body; unnamed events are 'message'."""
+    events = []
+    for block in body.split("\n\n"):
+        name, data = "message", []
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                name = line[len("event: "):]
+            elif line.startswith("data: "):
+                data.append(line[len("data: "):])
+        if data:
+            events.append((name, "\n".join(data)))
+    return events
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="minewatch-bench-")
+    stub = StubOpenAI(args.latency, args.jitter, args.token_latency, args.rate_limit,
+                      args.retry_after, seed=args.seed).start()
+    try:
+        t0 = time.perf_counter()
+        video = make_video(os.path.join(workdir, "bench.mp4"), args.width, args.height,
+                           args.seconds, args.fps, args.scene_seconds, args.seed)
+        video["generate_seconds"] = time.perf_counter() - t0
+        video["bytes"] = os.path.getsize(video["path"])
+
+        # config reads the environment on import, so set it before the app is loaded
+        os.environ.update({
+            "OPENAI_API_KEY": "stub", "OPENAI_BASE_URL": stub.base_url,
+            "JOBS_DB_PATH": os.path.join(workdir, "jobs.db"), "JOBS_DIR": os.path.join(workdir, "jobs"),
+            "ANALYSIS_CACHE_ENABLED": "0", "SUMMARY_CACHE_ENABLED": "0",
+            "ANALYSIS_INDEX_PATH": os.path.join(workdir, "analysis_index.db"),
+            # A fresh frame cache, so "extract" times decoding rather than hardlinking
+            "FRAME_CACHE_DIR": os.path.join(workdir, "frame_cache"),
+            "DEDUP_MAX_DISTANCE": str(args.dedup_distance),
+            "OPENAI_RETRY_BASE_DELAY": str(args.retry_base_delay),
+            "OPENAI_RPM": str(args.rpm), "OPENAI_TPM": str(args.tpm),
+            "ANALYZE_BATCH_SIZE": str(args.batch_size),
+        })
+        import app as app_module
+        import gpt_integration
+        import jobs
+        from services import llm_service
+
+        # Time each analyze_image call as the app sees it (preprocessing, rate limiting, retries);
+        # every frame of a batched call counts with the latency of the whole call
+        latencies, latency_lock = [], threading.Lock()
+        analyze_image = app_module.analyze_image
+        analyze_images = app_module.analyze_images
+
+        def timed_analyze(path, context):
+            start = time.perf_counter()
+            try:
+                return analyze_image(path, context)
+            finally:
+                with latency_lock:
+                    latencies.append(time.perf_counter() - start)
+
+        def timed_analyze_batch(paths, context):
+            start = time.perf_counter()
+            try:
+                return analyze_images(paths, context)
+            finally:
+                with latency_lock:
+                    latencies.extend([time.perf_counter() - start] * len(paths))
+
+        app_module.analyze_image = timed_analyze
+        app_module.analyze_images = timed_analyze_batch
+        logging.getLogger().setLevel(args.log_level)
+        app_module.app.logger.setLevel(args.log_level)
+        client = app_module.app.test_client()
+        report = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": _git_revision(),
+                  "python": platform.python_version(), "platform": platform.platform(),
+                  "config": {"interval": args.interval, "mode": args.mode, "workers": args.workers,
+                             "dedup_distance": args.dedup_distance, "rpm": args.rpm, "tpm": args.tpm,
+                             "batch_size": args.batch_size},
+                  "video": {k: v for k, v in video.items() if k != "path"},
+                  "stub": {"latency": args.latency, "jitter": args.jitter, "token_latency": args.token_latency,
+                           "rate_limit": args.rate_limit, "retry_after": args.retry_after},
+                  "stages": {}}
+
+        t0 = time.perf_counter()
+        with open(video["path"], "rb") as f:
+            resp = client.post("/upload", data={"video": (f, "bench.mp4")}, content_type="multipart/form-data")
+        if resp.status_code != 200:
+            raise RuntimeError(f"upload failed: {resp.status_code} {resp.get_data(as_text=True)}")
+        report["stages"]["upload"] = {"seconds": time.perf_counter() - t0, "peak_rss_mb": peak_rss_mb()}
+        job_id = resp.get_json()["job"]
+        store = jobs.get_store()
+
+        t0 = time.perf_counter()
+        body = client.get(f"/extract?interval={args.interval}&mode={args.mode}&workers={args.workers}").get_data(as_text=True)
+        seconds = time.perf_counter() - t0
+        if "ERROR" in body:
+            raise RuntimeError(f"extraction failed: {body[-200:]}")
+        frames = len(store.frames(job_id))
+        report["stages"]["extract"] = {
+            "seconds": seconds, "frames": frames, "source_fps": video["frames"] / seconds if seconds else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+        # Build the API client up front so its one-off import does not skew the first latencies
+        gpt_integration.get_client()
+        before = stub.counters()
+        t0 = time.perf_counter()
+        events = _sse_events(client.get("/analyze_stream?context=Open-pit%20gold%20mine").get_data(as_text=True))
+        seconds = time.perf_counter() - t0
+        after = stub.counters()
+        results = store.results(job_id)
+        errors = sum(r.startswith(jobs.ERROR_PREFIX) for r in results.values())
+        report["stages"]["analyze"] = {
+            "seconds": seconds, "frames": len(results), "api_frames": len(latencies), "errors": errors,
+            "frames_per_sec": len(results) / seconds if seconds else 0.0,
+            "latency_ms": {name: percentile(latencies, pct) * 1000
+                           for name, pct in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))},
+            "api_requests": after["requests"] - before["requests"],
+            "throttled": after["throttled"] - before["throttled"],
+            "completed": [data for name, data in events if name == "message"][-1:] == ["Analysis complete"],
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+        llm_service.get_llm()
+        before = stub.counters()
+        t0 = time.perf_counter()
+        events = _sse_events(client.get("/final_stream").get_data(as_text=True))
+        seconds = time.perf_counter() - t0
+        done = next((json.loads(data) for name, data in events if name == "done"), None)
+        report["stages"]["final"] = {
+            "seconds": seconds,
+            "ttft": done["ttft"] if done else None,
+            "backend": done["backend"] if done else None,
+            "error": next((data for name, data in events if name == "error"), None),
+            "api_requests": stub.counters()["requests"] - before["requests"],
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        report["peak_rss_mb"] = peak_rss_mb()
+        return report
+    finally:
+        stub.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against a stub OpenAI server")
+    video = parser.add_argument_group("synthetic video")
+    video.add_argument("--width", type=int, default=640)
+    video.add_argument("--height", type=int, default=360)
+    video.add_argument("--seconds", type=float, default=20.0)
+    video.add_argument("--fps", type=int, default=30)
+    video.add_argument("--scene-seconds", type=float, default=2.0, help="seconds between scene cuts")
+    video.add_argument("--seed", type=int, default=0)
+    pipeline = parser.add_argument_group("pipeline")
+    pipeline.add_argument("--interval", type=int, default=30)
+    pipeline.add_argument("--mode", choices=("interval", "adaptive"), default="interval")
+    pipeline.add_argument("--workers", type=int, default=1, help="extraction worker processes")
+    pipeline.add_argument("--dedup-distance", type=int, default=-1,
+                          help="near-duplicate distance (default -1: every frame goes to the API)")
+    pipeline.add_argument("--retry-base-delay", type=float, default=0.1, help="OPENAI_RETRY_BASE_DELAY")
+    pipeline.add_argument("--rpm", type=float, default=0, help="client-side OPENAI_RPM (default 0: unlimited)")
+    pipeline.add_argument("--tpm", type=float, default=0, help="client-side OPENAI_TPM (default 0: unlimited)")
+    pipeline.add_argument("--batch-size", type=int, default=1, help="ANALYZE_BATCH_SIZE (frames per request)")
+    stub = parser.add_argument_group("stub API")
+    stub.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    stub.add_argument("--jitter", type=float, default=0.0, help="extra random latency up to this many seconds")
+    stub.add_argument("--token-latency", type=float, default=0.0, help="seconds between streamed pieces")
+    stub.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    stub.add_argument("--retry-after", type=float, default=0.05, help="Retry-After seconds on 429")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary working directory")
+    parser.add_argument("--log-level", default="WARNING", help="app log level during the run")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    analyze = report["stages"]["analyze"]
+    return 0 if analyze["completed"] and not analyze["errors"] and not report["stages"]["final"]["error"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
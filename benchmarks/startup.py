@@ -0,0 +1,89 @@
+# benchmarks/startup.py
+# Cold-start import benchmark for the Flask app (python -X importtime breakdown)
+#
+# Usage:
+#   python benchmarks/startup.py                 # table of the slowest imports
+#   python benchmarks/startup.py --json          # machine-readable report
+#   python benchmarks/startup.py --max-ms 1500   # exit 1 if importing the app is slower
+#
+# The app is imported in a fresh interpreter without OPENAI_API_KEY, so the run
+# also fails if anything builds an API client at import time. Modules listed in
+# HEAVY_MODULES must stay unloaded until first use.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC_DIR = os.path.join(PROJECT_ROOT, "src")
+HEAVY_MODULES = ("cv2", "openai", "langchain", "langchain_core", "langchain_community", "tiktoken")
+
+
+def measure_imports(module: str = "app") -> dict:
+    """
+    Import `module` in a child interpreter with -X importtime.
+    Returns {"total_us", "modules": [{"name", "self_us", "cumulative_us"}], "heavy_loaded"}.
+    """
+    probe = (f"import sys; import {module}; "
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    env["PYTHONPATH"] = os.pathsep.join([SRC_DIR, PROJECT_ROOT, env.get("PYTHONPATH", "")])
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                          cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        tail = "\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:"))
+        raise RuntimeError(f"importing {module} failed:\n{tail}")
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({"name": name.strip(), "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    top = next((m for m in modules if m["name"] == module), None)
+    return {
+        "module": module,
+        "total_us": top["cumulative_us"] if top else sum(m["self_us"] for m in modules),
+        "modules": modules,
+        "heavy_loaded": [m for m in proc.stdout.strip().split(",") if m],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure how long importing the app takes")
+    parser.add_argument("--module", default="app", help="module to import (default: app)")
+    parser.add_argument("--runs", type=int, default=3, help="imports to measure; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="rows in the breakdown table")
+    parser.add_argument("--max-ms", type=float, help="fail when the median import takes longer")
+    parser.add_argument("--json", action="store_true", help="print a JSON report instead of a table")
+    args = parser.parse_args()
+
+    runs = [measure_imports(args.module) for _ in range(max(1, args.runs))]
+    median_ms = statistics.median(r["total_us"] for r in runs) / 1000
+    report = runs[-1]
+    slowest = sorted(report["modules"], key=lambda m: m["cumulative_us"], reverse=True)[:args.top]
+    failures = []
+    if report["heavy_loaded"]:
+        failures.append(f"heavy modules imported at startup: {', '.join(report['heavy_loaded'])}")
+    if args.max_ms is not None and median_ms > args.max_ms:
+        failures.append(f"median import {median_ms:.0f} ms exceeds {args.max_ms:.0f} ms")
+
+    if args.json:
+        print(json.dumps({"module": args.module, "runs": [r["total_us"] / 1000 for r in runs],
+                          "median_ms": median_ms, "heavy_loaded": report["heavy_loaded"],
+                          "slowest": slowest, "failures": failures}, indent=2))
+    else:
+        print(f"import {args.module}: median {median_ms:.0f} ms over {len(runs)} runs")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for m in slowest:
+            print(f"{m['cumulative_us'] / 1000:14.1f} {m['self_us'] / 1000:9.1f}  {m['name']}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# benchmarks/stub_openai.py
+# Local stand-in for the OpenAI chat completions endpoint with injectable latency and 429s
+#
+# Usage:
+#   python benchmarks/stub_openai.py --port 8900 --latency 0.8 --rate-limit 0.05
+#   OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=stub python src/app.py
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+REPLY = ("Exposed benches with minor erosion on the north wall; tailings pond shows "
+         "greenish discoloration near the outlet; no active equipment visible.")
+
+
+class StubOpenAI:
+    """
+    Threaded HTTP server answering POST /v1/chat/completions, streamed or not.
+
+    - latency: seconds before the response (or first token) is sent, plus up to
+      `jitter` extra seconds drawn uniformly
+    - token_latency: delay between streamed pieces
+    - rate_limit: fraction of requests answered with 429 and a Retry-After of
+      `retry_after` seconds, drawn from a seeded RNG so runs are repeatable
+    Counters (requests, throttled, streamed) are safe to read while serving.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, token_latency: float = 0.0,
+                 rate_limit: float = 0.0, retry_after: float = 0.1, reply: str = REPLY,
+                 seed: int = 0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.reply = reply
+        self.requests = self.throttled = self.streamed = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubOpenAI":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubOpenAI":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def counters(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "throttled": self.throttled, "streamed": self.streamed}
+
+    def _admit(self, stream: bool) -> tuple[bool, float]:
+        """Count the request; returns (throttle it?, delay before answering)."""
+        with self._lock:
+            self.requests += 1
+            throttle = self._rng.random() < self.rate_limit
+            if throttle:
+                self.throttled += 1
+            elif stream:
+                self.streamed += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        return throttle, delay
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    return self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+                stream = bool(body.get("stream"))
+                throttle, delay = stub._admit(stream)
+                if throttle:
+                    return self._json(429, {"error": {"message": "Rate limit reached (stub)",
+                                                      "type": "requests", "code": "rate_limit_exceeded"}},
+                                      {"Retry-After": f"{stub.retry_after:g}",
+                                       "retry-after-ms": str(int(stub.retry_after * 1000))})
+                time.sleep(delay)
+                prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+                reply = stub.reply
+                if (body.get("response_format") or {}).get("type") == "json_object":
+                    # Batched frame analysis: one entry per attached image
+                    images = sum(1 for m in body.get("messages", []) if isinstance(m.get("content"), list)
+                                 for part in m["content"] if part.get("type") == "image_url")
+                    reply = json.dumps({"frames": [{"frame": i, "analysis": stub.reply}
+                                                   for i in range(1, images + 1)]})
+                completion_tokens = len(reply) // 4
+                if not stream:
+                    return self._json(200, {
+                        "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                        "model": body.get("model", "stub"),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": reply}}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                  "total_tokens": prompt_tokens + completion_tokens},
+                    })
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i, word in enumerate(re.findall(r"\S+\s*", stub.reply)):
+                    if i and stub.token_latency:
+                        time.sleep(stub.token_latency)
+                    chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                             "model": body.get("model", "stub"),
+                             "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def _json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds between streamed pieces")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429")
+    args = parser.parse_args()
+
+    stub = StubOpenAI(args.latency, args.jitter, args.token_latency, args.rate_limit, args.retry_after,
+                      host=args.host, port=args.port)
+    print(f"Stub OpenAI API at {stub.base_url} (Ctrl+C to stop)")
+    stub.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(json.dumps(stub.counters()))
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/synthetic.py
+# Synthetic drone-style test footage generated with OpenCV
+#
+# Usage:
+#   python benchmarks/synthetic.py out.mp4 --width 1920 --height 1080 --seconds 60
+
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+
+def make_video(path: str, width: int = 640, height: int = 360, seconds: float = 10.0,
+               fps: int = 30, scene_seconds: float = 2.0, seed: int = 0) -> dict:
+    """
+    Write an mp4v video of textured "terrain" scenes that pan slowly and cut every
+    `scene_seconds`, so interval, adaptive and near-duplicate logic all see realistic
+    change. Returns {"path", "width", "height", "fps", "frames"}.
+    """
+    rng = np.random.default_rng(seed)
+    total = max(1, round(seconds * fps))
+    scene_frames = max(1, round(scene_seconds * fps))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"cannot open video writer for {path}")
+
+    pad_x, pad_y = width // 4, height // 4
+    terrain = None
+    try:
+        for i in range(total):
+            if i % scene_frames == 0:
+                # Low-frequency colour noise upscaled to a canvas larger than the frame
+                coarse = (rng.random((12, 16, 3)) * 255).astype(np.uint8)
+                terrain = cv2.resize(coarse, (width + pad_x, height + pad_y), interpolation=cv2.INTER_CUBIC)
+                for _ in range(6):
+                    center = (int(rng.integers(0, width + pad_x)), int(rng.integers(0, height + pad_y)))
+                    radius = int(rng.integers(max(2, height // 20), max(3, height // 5)))
+                    color = tuple(int(c) for c in rng.integers(0, 255, 3))
+                    cv2.circle(terrain, center, radius, color, -1)
+            t = (i % scene_frames) / scene_frames
+            x, y = int(pad_x * t), int(pad_y * t / 2)
+            writer.write(np.ascontiguousarray(terrain[y:y + height, x:x + width]))
+    finally:
+        writer.release()
+    return {"path": path, "width": width, "height": height, "fps": fps, "frames": total}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic test video")
+    parser.add_argument("path")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--scene-seconds", type=float, default=2.0, help="seconds between scene cuts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    info = make_video(args.path, args.width, args.height, args.seconds, args.fps, args.scene_seconds, args.seed)
+    print(f"{info['path']}: {info['frames']} frames at {info['width']}x{info['height']}")
+
+
+if __name__ == "__main__":
+    main()
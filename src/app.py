@@ -1,19 +1,34 @@
 # app.py
 import os
+import json
 import logging
 from flask import (
     Flask, render_template, request,
     redirect, url_for, flash,
     Response, stream_with_context, jsonify,
-    session, send_from_directory
+    session
 )
-from gpt_integration import analyze_image
-from media import media_bp
-from services.llm_service import summarize_with_chain
+import streams
+from gpt_integration import analyze_image, analyze_images
+from frame_hashing import find_duplicates
+from services.analysis_engine import analyze_concurrently
+from pipeline import run_pipeline
+from video_processing import (
+    ExtractionStats, iter_frames, iter_frames_adaptive, iter_frames_parallel,
+    resolve_workers
+)
+from frame_store import get_frame_store
+from jobs import ERROR_PREFIX, CancelToken, current_frame_dir, current_job_id, get_store
+from media import frame_url, media_bp, send_cached
+from thumbnails import remove_thumbnail
+from uploads import file_sha256, uploads_bp
+from services.analysis_index import get_index, index_analysis
+from services.llm_service import BACKENDS, SummaryStats, stream_summary, summarize_with_chain
+from metrics import ProgressLog
 import config
-import openai
-import cv2
-import shutil
+import metrics
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -21,11 +36,13 @@ load_dotenv()
 
 # Initialize Flask application and configuration
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.urandom(24)
+# A fixed SECRET_KEY lets every worker process read the same job session cookie
+app.config['SECRET_KEY'] = config.SECRET_KEY or os.urandom(24)
 app.config['UPLOAD_FOLDER'] = os.path.dirname(config.VIDEO_PATH)
 
-# Register media blueprint for handling media-specific routes
+# Register blueprints for media serving and chunked uploads
 app.register_blueprint(media_bp)
+app.register_blueprint(uploads_bp)
 
 # Custom Jinja filter to extract base filename from path
 def basename(path):
@@ -38,16 +55,15 @@ logging.basicConfig(
     level=logging.INFO
 )
 
-# Global state containers
-extracted_frames = []
-analysis_results = {}
-abort_extraction = False
-
 @app.route('/frames/<path:filename>')
 def frame_file(filename):
-    """Route: Serve extracted frame image files."""
-    frame_root = os.path.join(os.getcwd(), 'data', 'frames')
-    return send_from_directory(frame_root, filename)
+    """Route: Serve extracted frame image files of the current job."""
+    frame_root = current_frame_dir()
+    path = safe_join(frame_root, filename) if frame_root else None
+    response = send_cached(path) if path is not None else None
+    if response is None:
+        return ('File not found', 404)
+    return response
 
 @app.route('/')
 def index():
@@ -57,18 +73,32 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload():
-    """Route: Handle video file uploads from the client."""
+    """
+    Route: Handle single-request video uploads (form field 'video'). Each upload
+    starts a new job. Large files should use the chunked /upload/init protocol.
+    """
     app.logger.info('POST /upload → files: %s', list(request.files.keys()))
     file = request.files.get('video')
     if not file or not file.filename:
         app.logger.warning('Upload failed: no file selected')
         return jsonify({'success': False, 'message': 'No file selected'}), 400
 
-    dest = config.VIDEO_PATH
-    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    store = get_store()
+    job_id = store.create()
+    session['job_id'] = job_id
+    ext = os.path.splitext(secure_filename(file.filename))[1] or '.mp4'
+    dest = os.path.join(store.job_dir(job_id), f"video{ext}")
     file.save(dest)
-    app.logger.info('Saved uploaded video to %s', dest)
-    return jsonify({'success': True, 'message': 'Video uploaded successfully'})
+    store.set_video(job_id, dest, file_sha256(dest))
+    app.logger.info('Saved uploaded video for job %s to %s', job_id, dest)
+    return jsonify({'success': True, 'message': 'Video uploaded successfully', 'job': job_id})
+
+def _job_video(store, job_id):
+    """Video of the job and its recorded hash, falling back to the configured default video."""
+    job = store.get(job_id)
+    if job['video_path']:
+        return job['video_path'], job['video_sha256']
+    return config.VIDEO_PATH, None
 
 @app.route('/extract')
 def extract():
@@ -82,68 +112,197 @@ def extract():
         interval = config.FRAME_INTERVAL
         app.logger.warning('Invalid interval provided; using default %d', interval)
         flash(f"Invalid interval—using default {config.FRAME_INTERVAL}")
+    try:
+        workers = resolve_workers(int(request.args.get('workers', config.EXTRACT_WORKERS)))
+    except ValueError:
+        workers = resolve_workers()
+        app.logger.warning('Invalid worker count provided; using %d', workers)
+    mode = request.args.get('mode', 'interval')
 
-    def generate():
-        global extracted_frames
-        extracted_frames = []
-
-        app.logger.info('Starting video capture from %s', config.VIDEO_PATH)
-        cap = cv2.VideoCapture(config.VIDEO_PATH)
-        if not cap.isOpened():
-            app.logger.error('Cannot open video: %s', config.VIDEO_PATH)
-            yield "data: ERROR: cannot open video\n\n"
-            return
-
-        count = idx = 0
-        frame_dir = 'data/frames'
+    store = get_store()
+    job_id = current_job_id()
+    video_path, video_sha256 = _job_video(store, job_id)
+    cancel = CancelToken(job_id, ('extract',))
 
-        # Prepare frame directory
-        if os.path.exists(frame_dir):
-            shutil.rmtree(frame_dir)
-        os.makedirs(frame_dir, exist_ok=True)
+    def generate():
+        # Only this job's frames are discarded; other jobs keep theirs
+        store.clear_frames(job_id)
+        store.reset_cancel(job_id, 'extract')
+        store.set_status(job_id, 'extracting')
+        frame_dir = store.frame_dir(job_id)
         app.logger.info('Prepared frame directory: %s', frame_dir)
 
+        app.logger.info('Starting video capture from %s (%s mode, %d workers)',
+                        video_path, mode, workers)
+        stats = ExtractionStats()
+        if mode == 'adaptive':
+            events = _adaptive_extract_events(job_id, video_path, video_sha256, stats, cancel)
+        elif workers > 1:
+            events = _parallel_extract_events(job_id, video_path, video_sha256, interval, workers, stats, cancel)
+        else:
+            events = _serial_extract_events(job_id, video_path, video_sha256, interval, stats, cancel)
         try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    app.logger.info('No more frames after %d reads', count)
-                    break
-
-                if count % interval == 0:
-                    outpath = os.path.join(frame_dir, f"frame_{idx}.jpg")
-                    cv2.imwrite(outpath, frame)
-                    extracted_frames.append(outpath)
-                    app.logger.info('Extracted frame %d → %s', idx + 1, outpath)
-                    try:
-                        yield f"data: Extracted frame {idx + 1}\n\n"
-                    except (GeneratorExit, OSError) as e:
-                        app.logger.info('Extraction stopped at frame %d: %s', idx + 1, e)
-                        return
-                    idx += 1
-                count += 1
-
-            app.logger.info('Extraction complete: %d frames', idx)
-            try:
-                yield f"data: Extraction complete: {idx} frames\n\n"
-            except (GeneratorExit, OSError) as e:
-                app.logger.info('Client disconnected before final message: %s', e)
+            yield from events
+        except (FileNotFoundError, IOError):
+            app.logger.error('Cannot open video: %s', video_path)
+            store.set_status(job_id, 'error')
+            yield "ERROR: cannot open video"
+            return
         finally:
-            cap.release()
+            events.close()
 
-    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+        if cancel.is_set():
+            app.logger.info('Extraction aborted for job %s after %d frames', job_id, stats.frames_saved)
+            store.set_status(job_id, 'cancelled')
+            yield f"Extraction aborted: {stats.frames_saved} frames"
+            return
+
+        store.set_status(job_id, 'extracted')
+        app.logger.info('Extraction complete: %d frames (%d from the frame cache, '
+                        '%d dropped, %d swapped by the quality gate)', stats.frames_saved,
+                        stats.frames_cached, stats.frames_dropped, stats.frames_swapped)
+        gated = (f", {stats.frames_dropped} low-quality skipped, {stats.frames_swapped} replaced"
+                 if stats.frames_dropped or stats.frames_swapped else "")
+        if stats.frames_cached:
+            gated += f", {stats.frames_cached} reused from cache"
+        yield f"Extraction complete: {stats.frames_saved} frames ({stats.fps:.1f} frames/sec{gated})"
+
+    # Decoding runs in the background; the response follows it and can be resumed
+    return streams.stream_response(job_id, 'extract',
+                                   lambda: streams.start(job_id, 'extract', generate, cancel))
+
+def _serial_extract_events(job_id, video_path, video_sha256, interval, stats, cancel):
+    """Decode the video on one core, emitting a progress message per kept frame."""
+    store = get_store()
+    frame_dir = store.frame_dir(job_id)
+    progress = ProgressLog(app.logger, 'Extracted')
+    for outpath in iter_frames(video_path, frame_dir, interval, stats, stop=cancel.is_set,
+                               video_sha256=video_sha256):
+        store.add_frames(job_id, [outpath], stats.quality)
+        progress.update()
+        yield f"Extracted frame {stats.frames_saved}"
+
+def _adaptive_extract_events(job_id, video_path, video_sha256, stats, cancel):
+    """Keep frames only on scene change, emitting a progress message per kept frame."""
+    store = get_store()
+    frame_dir = store.frame_dir(job_id)
+    progress = ProgressLog(app.logger, 'Extracted')
+    for outpath in iter_frames_adaptive(video_path, frame_dir, stats=stats, stop=cancel.is_set,
+                                        video_sha256=video_sha256):
+        store.add_frames(job_id, [outpath], stats.quality)
+        progress.update()
+        yield f"Extracted frame {stats.frames_saved} (source frame {stats.frames_read})"
+
+def _parallel_extract_events(job_id, video_path, video_sha256, interval, workers, stats, cancel):
+    """Decode time segments in a process pool, emitting a progress message per finished segment."""
+    store = get_store()
+    frame_dir = store.frame_dir(job_id)
+    segments = iter_frames_parallel(video_path, frame_dir, interval, workers, stats, stop=cancel.is_set,
+                                    video_sha256=video_sha256)
+    try:
+        for done, total, paths in segments:
+            # Positions come from the frame_{idx}.jpg names, so completion order does not matter
+            store.add_frames(job_id, paths, stats.quality)
+            app.logger.info('Extracted segment %d/%d (%d frames)', done, total, len(paths))
+            yield f"Extracted segment {done}/{total}: {stats.frames_saved} frames so far"
+    finally:
+        segments.close()
+
+@app.route('/extract/abort', methods=['POST'])
+def extract_abort():
+    """Route: Stop an in-progress extraction of the current job."""
+    return _abort('extract')
+
+@app.route('/analyze/abort', methods=['POST'])
+def analyze_abort():
+    """Route: Stop in-progress analysis of the current job, including pipelined runs."""
+    return _abort('analyze')
+
+def _abort(stage):
+    job_id = current_job_id(create=False)
+    if job_id is None:
+        return jsonify({'success': False, 'message': 'No active job'}), 404
+    get_store().request_cancel(job_id, stage)
+    app.logger.info('Abort requested for %s of job %s', stage, job_id)
+    return jsonify({'success': True, 'message': f'{stage.capitalize()} abort requested'})
 
 @app.route('/preview_frames')
 def preview_frames():
-    """Route: Provide list of extracted frame filenames for client preview."""
-    basenames = [os.path.basename(p) for p in extracted_frames]
-    return jsonify({'frames': basenames})
+    """
+    Route: Provide list of extracted frame filenames, thumbnail URLs and quality
+    scores (null for frames extracted with the gate off) for client preview.
+    """
+    job_id = current_job_id()
+    store = get_store()
+    frames = store.frames(job_id)
+    scores = store.frame_quality(job_id)
+    basenames = [os.path.basename(p) for p in frames]
+    thumbs = [frame_url(p, thumb=True) for p in frames]
+    quality = [scores.get(p) for p in frames]
+    return jsonify({'frames': basenames, 'thumbs': thumbs, 'quality': quality, 'job': job_id})
+
+def _analyze_frames(job_id, frames, context, cancel):
+    """
+    Analyze frames concurrently, reusing the result of an earlier near-duplicate frame.
+    Results are saved to the job as they arrive. Yields (frame, result, representative)
+    in completion order; representative is None for frames sent to the API, and
+    duplicates follow their representative.
+    """
+    store = get_store()
+    duplicates = find_duplicates(frames)
+    followers = {}
+    for dup, rep in duplicates.items():
+        followers.setdefault(rep, []).append(dup)
+
+    representatives = [f for f in frames if f not in duplicates]
+    completed = analyze_concurrently(representatives, context, analyze=analyze_image,
+                                     analyze_batch=analyze_images, stop=cancel)
+    try:
+        for f, res in completed:
+            store.save_result(job_id, f, res)
+            _index_result(job_id, f, res, context)
+            yield f, res, None
+            for dup in followers.get(f, []):
+                store.save_result(job_id, dup, res, duplicate_of=f)
+                yield dup, res, f
+    finally:
+        completed.close()
+    app.logger.info('Analyzed %d frames, %d reused from near-duplicates',
+                    len(representatives), len(duplicates))
+
+def _reset_index(store, job_id):
+    """Start the job's run in the search index afresh; the index never fails an analysis."""
+    try:
+        index = get_index()
+        if index is not None:
+            job = store.get(job_id) or {}
+            index.remove(job_id)
+            index.add_run(job_id, 'web', job.get('video_path'), job.get('video_sha256'))
+    except Exception as e:
+        app.logger.warning('Search index reset failed for job %s: %s', job_id, e)
+
+def _index_result(job_id, frame, result, context):
+    """
+    Add one analysis to the search index as it arrives. Errors are left out, and so
+    are near-duplicates, whose text is their representative's.
+    """
+    if not result.startswith(ERROR_PREFIX):
+        index_analysis(job_id, frame, result, context)
+
+def _start_analysis(store, job_id):
+    store.clear_results(job_id)
+    store.reset_cancel(job_id, 'analyze')
+    store.set_status(job_id, 'analyzing')
+    _reset_index(store, job_id)
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """Route: Analyze extracted frames using the GPT-based image analysis service."""
-    app.logger.info('POST /analyze → %d frames in queue', len(extracted_frames))
-    if not extracted_frames:
+    store = get_store()
+    job_id = current_job_id()
+    frames = store.frames(job_id)
+    app.logger.info('POST /analyze → %d frames in queue for job %s', len(frames), job_id)
+    if not frames:
         app.logger.warning('Analyze failed: no frames extracted')
         flash('No frames—please extract first')
         return redirect(url_for('index'))
@@ -153,38 +312,202 @@ def analyze():
     )
     app.logger.info('Analysis context: %s', context)
 
-    global analysis_results
-    analysis_results = {f: analyze_image(f, context) for f in extracted_frames}
-    app.logger.info('Analysis complete for %d frames', len(analysis_results))
-    flash('Analysis complete')
+    _start_analysis(store, job_id)
+    cancel = CancelToken(job_id, ('analyze',))
+    count = sum(1 for _ in _analyze_frames(job_id, frames, context, cancel))
+    store.set_status(job_id, 'cancelled' if cancel.is_set() else 'analyzed')
+    app.logger.info('Analysis complete for %d frames', count)
+    flash('Analysis aborted' if cancel.is_set() else 'Analysis complete')
     return redirect(url_for('results'))
 
 @app.route('/analyze_stream')
 def analyze_stream():
     context = request.args.get('context')
+    store = get_store()
+    job_id = current_job_id()
+    cancel = CancelToken(job_id, ('analyze',))
+
+    def gen():
+        _start_analysis(store, job_id)
+        for f, res, rep in _analyze_frames(job_id, store.frames(job_id), context, cancel):
+            if rep:
+                yield f"{f} → duplicate of {os.path.basename(rep)}"
+            else:
+                yield f"{f} → {res}"
+        if cancel.is_set():
+            store.set_status(job_id, 'cancelled')
+            yield "Analysis aborted"
+            return
+        store.set_status(job_id, 'analyzed')
+        yield "Analysis complete"
+
+    return streams.stream_response(job_id, 'analyze',
+                                   lambda: streams.start(job_id, 'analyze', gen, cancel))
+
+@app.route('/pipeline')
+def pipeline():
+    """Route: Extract and analyze in one pipelined job, streaming both kinds of progress via SSE."""
+    app.logger.info('GET /pipeline → args: %s', dict(request.args))
+    try:
+        interval = int(request.args.get('interval', config.FRAME_INTERVAL))
+    except ValueError:
+        interval = config.FRAME_INTERVAL
+    mode = request.args.get('mode', 'interval')
+    context = request.args.get('context')
+    store = get_store()
+    job_id = current_job_id()
+    video_path, video_sha256 = _job_video(store, job_id)
+    cancel = CancelToken(job_id)
+
     def gen():
-        for f in extracted_frames:
-            res = analyze_image(f, context)
-            analysis_results[f] = res
-            yield f"data: {f} → {res}\n\n"
-        yield "data: Analysis complete\n\n"
-    return Response(stream_with_context(gen()),
-                    mimetype='text/event-stream')
+        store.clear_frames(job_id)
+        store.reset_cancel(job_id)
+        store.set_status(job_id, 'analyzing')
+        _reset_index(store, job_id)
+        extracted = analyzed = 0
+
+        events = run_pipeline(video_path, store.frame_dir(job_id), interval, context, mode=mode,
+                              analyze=analyze_image, analyze_batch=analyze_images, stop=cancel,
+                              video_sha256=video_sha256)
+        try:
+            for event in events:
+                kind = event[0]
+                if kind == 'extracted':
+                    _, frame, quality = event
+                    store.add_frames(job_id, [frame], {frame: quality} if quality else None)
+                    extracted += 1
+                    msg = f"Extracted frame {extracted}"
+                elif kind == 'analyzed':
+                    _, f, res, rep = event
+                    store.save_result(job_id, f, res, duplicate_of=rep)
+                    if not rep:
+                        _index_result(job_id, f, res, context)
+                    analyzed += 1
+                    if rep:
+                        msg = f"{f} → duplicate of {os.path.basename(rep)}"
+                    else:
+                        msg = f"{f} → {res}"
+                elif kind == 'error':
+                    app.logger.error('Pipeline error: %s', event[1])
+                    store.set_status(job_id, 'error')
+                    msg = f"ERROR: {event[1]}"
+                elif kind == 'cancelled':
+                    store.set_status(job_id, 'cancelled')
+                    msg = f"Analysis aborted: {extracted} frames extracted, {analyzed} analyzed"
+                else:
+                    stats = event[1]
+                    store.set_status(job_id, 'analyzed')
+                    msg = (f"Analysis complete: {extracted} frames extracted "
+                           f"({stats.fps:.1f} frames/sec), {analyzed} analyzed")
+                yield msg
+        finally:
+            events.close()
+
+    return streams.stream_response(job_id, 'pipeline',
+                                   lambda: streams.start(job_id, 'pipeline', gen, cancel))
 
 @app.route('/results')
 def results():
-    """Route: Render analysis results in the results view."""
+    """Route: Render the results view; results.js loads the analyses page by page."""
     app.logger.info('GET /results → rendering results.html')
-    return render_template('results.html', analysis_results=analysis_results)
+    current_job_id()
+    return render_template('results.html')
+
+def _page_args():
+    """(cursor, limit) from the query string; raises ValueError on malformed values."""
+    cursor = request.args.get('cursor')
+    limit = int(request.args.get('limit', config.PAGE_SIZE))
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return (int(cursor) if cursor else None), min(limit, config.MAX_PAGE_SIZE)
+
+def _page(items, positions, limit):
+    """
+    JSON page from up to `limit` items; `positions` holds one extra entry when a
+    further page exists. next_cursor is the last position returned, or null.
+    """
+    more = len(positions) > limit
+    return jsonify({'items': items, 'next_cursor': str(positions[limit - 1]) if more else None})
+
+@app.route('/api/frames')
+def api_frames():
+    """Route: Cursor-paginated frames of the current job (?cursor=&limit=)."""
+    try:
+        cursor, limit = _page_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid page parameters: {e}'}), 400
+    store = get_store()
+    job_id = current_job_id()
+    rows = store.frames_page(job_id, cursor, limit + 1)
+    scores = store.frame_quality(job_id, [path for path, _ in rows[:limit]])
+    items = [{'name': os.path.basename(path), 'url': frame_url(path),
+              'thumb': frame_url(path, thumb=True), 'quality': scores.get(path)}
+             for path, _ in rows[:limit]]
+    return _page(items, [pos for _, pos in rows], limit)
+
+@app.route('/api/results')
+def api_results():
+    """
+    Route: Cursor-paginated analyses of the current job in frame order.
+    Filters: ?q=<keyword> and ?status=error|success.
+    """
+    try:
+        cursor, limit = _page_args()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid page parameters: {e}'}), 400
+    status = request.args.get('status') or None
+    if status not in (None, 'error', 'success'):
+        return jsonify({'success': False, 'message': "status must be 'error' or 'success'"}), 400
+    rows = get_store().results_page(current_job_id(), cursor, limit + 1,
+                                    keyword=request.args.get('q') or None,
+                                    errors=None if status is None else status == 'error')
+    items = [{'name': os.path.basename(r['path']), 'url': frame_url(r['path']),
+              'thumb': frame_url(r['path'], thumb=True), 'result': r['result'],
+              'error': r['result'].startswith(ERROR_PREFIX),
+              'duplicate_of': os.path.basename(r['duplicate_of']) if r['duplicate_of'] else None}
+             for r in rows[:limit]]
+    return _page(items, [r['position'] for r in rows], limit)
+
+@app.route('/api/search')
+def api_search():
+    """
+    Route: Top-k frame analyses across all past runs ranked by relevance to ?q=
+    (BM25 over the full-text index). Optional ?k= and ?job= (one run only).
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'Missing query parameter q'}), 400
+    try:
+        k = int(request.args.get('k', config.SEARCH_TOP_K))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'k must be an integer'}), 400
+    index = get_index()
+    if index is None:
+        return jsonify({'success': False, 'message': 'Search index is disabled'}), 404
+    hits = index.search(query, k, run_id=request.args.get('job') or None)
+    # Frame URLs resolve against the current job, so only its own frames get one
+    job_id = current_job_id(create=False)
+    items = [{'job': h['run_id'], 'source': h['source'], 'video': h['video_path'],
+              'name': os.path.basename(h['frame']),
+              'url': frame_url(h['frame']) if h['run_id'] == job_id and os.path.isfile(h['frame']) else None,
+              'context': h['context'], 'result': h['result'], 'snippet': h['snippet'],
+              'score': h['score']} for h in hits]
+    return jsonify({'items': items})
 
 @app.route('/final')
 def final():
-    """Route: Summarize analysis results into a final conclusion via LLM."""
-    app.logger.info('GET /final → summarizing %d analysis entries', len(analysis_results))
+    """
+    Route: Render the final conclusion page. The conclusion streams in from
+    /final_stream; `?sync=1` summarizes server-side before rendering instead.
+    """
+    analysis_results = get_store().results(current_job_id())
+    app.logger.info('GET /final → %d analysis entries', len(analysis_results))
     if not analysis_results:
         app.logger.warning('Final summary failed: no analysis results')
         flash('No analysis to summarize')
         return redirect(url_for('results'))
+    if not request.args.get('sync'):
+        return render_template('final.html', final_conclusion=None)
 
     app.logger.info('Sending summary prompt to OpenAI (token limit: 300)')
     try:
@@ -196,13 +519,44 @@ def final():
 
     return render_template('final.html', final_conclusion=conclusion)
 
+@app.route('/final_stream')
+def final_stream():
+    """
+    Route: Stream the final conclusion via SSE as it is generated.
+    Emits `token` events with text pieces, then one `done` event carrying
+    time-to-first-token and total generation time (or an `error` event).
+    """
+    analysis_results = get_store().results(current_job_id())
+    backend = request.args.get('backend')
+    if backend not in BACKENDS:
+        backend = None
+    app.logger.info('GET /final_stream → summarizing %d analysis entries', len(analysis_results))
+
+    def gen():
+        if not analysis_results:
+            yield streams.format_event('No analysis to summarize', 'error')
+            return
+        stats = SummaryStats()
+        try:
+            for piece in stream_summary(analysis_results, backend, stats):
+                yield streams.format_event(piece, 'token')
+        except Exception as e:
+            app.logger.error('LLM error in /final_stream: %s', e)
+            yield streams.format_event(f"Error: {e}", 'error')
+            return
+        app.logger.info('Final conclusion streamed via %s: first token %.2fs, total %.2fs',
+                        stats.backend, stats.first_token or 0.0, stats.elapsed)
+        yield streams.format_event(json.dumps({'backend': stats.backend, 'ttft': stats.first_token,
+                               'elapsed': stats.elapsed, 'chunks': stats.tokens}), 'done')
+
+    return Response(stream_with_context(gen()), mimetype='text/event-stream', headers=streams.SSE_HEADERS)
+
 @app.route('/remove_frames', methods=['POST'])
 def remove_frames_route():
-    """Route: Remove selected frames from both filesystem and internal state."""
-    global extracted_frames, analysis_results
+    """Route: Remove selected frames of the current job from both filesystem and job state."""
     app.logger.info("POST /remove_frames received")
 
-    data = request.get_json()
+    data = request.get_json(silent=True)
     if not data or 'frames' not in data or not isinstance(data['frames'], list):
         app.logger.warning("Invalid request format for /remove_frames: %s", data)
         return jsonify({'success': False, 'message': 'Invalid request format. Expected {"frames": [...]}'}), 400
@@ -213,34 +567,54 @@ def remove_frames_route():
         return jsonify({'success': True, 'message': 'No frames specified for removal.'})
 
     app.logger.info('Removing frames: %s', frames_to_remove)
+    store = get_store()
+    job_id = current_job_id()
+    by_name = {os.path.basename(p): p for p in store.frames(job_id)}
+    frame_dir = store.frame_dir(job_id)
 
     processed, failures = [], []
     for name in frames_to_remove:
-        path_key = os.path.join('data', 'frames', name)
-        physical = os.path.join(app.root_path, path_key)
+        safe_name = secure_filename(name)
+        path_key = by_name.get(safe_name, os.path.join(frame_dir, safe_name))
         try:
-            if os.path.exists(physical):
-                os.remove(physical)
-                app.logger.info('Removed file: %s', physical)
+            get_frame_store().discard(path_key)
+            if os.path.exists(path_key):
+                os.remove(path_key)
+                remove_thumbnail(path_key)
+                app.logger.info('Removed file: %s', path_key)
             else:
-                app.logger.warning('File not found: %s', physical)
+                app.logger.warning('File not found: %s', path_key)
             processed.append(path_key)
         except Exception as e:
-            app.logger.error('Error deleting file %s: %s', physical, e)
+            app.logger.error('Error deleting file %s: %s', path_key, e)
             failures.append(name)
 
     if processed:
-        extracted_frames = [f for f in extracted_frames if f not in processed]
-        app.logger.info('Updated extracted_frames, removed %d items', len(processed))
-        for key in processed:
-            analysis_results.pop(key, None)
-        app.logger.info('Updated analysis_results, removed %d items', len(processed))
+        store.remove_frames(job_id, processed)
+        # The files are already gone; a search index failure must not fail the request
+        try:
+            index = get_index()
+            if index is not None:
+                index.remove(job_id, processed)
+        except Exception as e:
+            app.logger.warning('Search index update failed for job %s: %s', job_id, e)
+        app.logger.info('Updated job %s frames and results, removed %d items', job_id, len(processed))
 
     if failures:
         return jsonify({'success': False, 'message': f"Failed to delete: {failures}. Others removed."}), 500
 
     return jsonify({'success': True, 'message': 'Selected frames processed for removal.'})
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Route: Stage timings, API usage and error counters in the Prometheus text format.
+    Each server process reports its own metrics, so scrape every process.
+    """
+    if not config.METRICS_ENABLED:
+        return ('Metrics are disabled', 404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.logger.info('Launching MineWatch-AI-PH app on port 5000')
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,200 @@
+# src/asgi.py
+# ASGI entry point: progress streams followed by coroutines, everything else by the Flask app
+#
+# Run it with an ASGI server, e.g. `uvicorn asgi:app --app-dir src`. Requests are
+# handed to the Flask app in a thread pool, as a WSGI server would. The work behind
+# /extract, /analyze_stream and /pipeline already runs in the background (see
+# streams.py), so in this mode those routes only name the run, and following it is a
+# coroutine on the event loop instead of a worker thread held for the whole run. One
+# process can then keep hundreds of progress streams open. A client that disconnects
+# stops being followed at once rather than on the next write; the run itself is
+# cancelled only after no client has followed it for SSE_DISCONNECT_GRACE seconds.
+#
+# Requests, streamed bodies and event polls each have their own bounded thread pool
+# (ASGI_*_THREADS), so open /final_stream relays cannot starve request handling or
+# the polls that keep followed runs flowing.
+
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import config
+import streams
+from app import app as flask_app
+
+# Request bodies larger than this are spooled to a temporary file
+_SPOOL_BYTES = 1 << 20
+
+_requests = ThreadPoolExecutor(config.ASGI_REQUEST_THREADS, thread_name_prefix="asgi-request")
+_relays = ThreadPoolExecutor(config.ASGI_RELAY_THREADS, thread_name_prefix="asgi-relay")
+_polls = ThreadPoolExecutor(config.ASGI_POLL_THREADS, thread_name_prefix="asgi-poll")
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    body = await _read_body(receive)
+    if body is None:
+        return  # the client left before sending its request
+    loop = asyncio.get_running_loop()
+    try:
+        status, headers, chunks = await loop.run_in_executor(_requests, _call_flask, _environ(scope, body))
+        run_key = streams.RUN_HEADER.lower()
+        run = next((value for name, value in headers if name == run_key), None)
+        content_type = next((value for name, value in headers if name == "content-type"), "")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(name.encode("latin-1"), value.encode("latin-1"))
+                                for name, value in headers if name != run_key]})
+        if run is not None:
+            _close(chunks)
+            run_id, after = run.split()
+            await _follow(run_id, int(after), receive, send)
+        elif content_type.startswith("text/event-stream"):
+            await _send_iter(chunks, send)
+        else:
+            data = await loop.run_in_executor(_requests, _drain, chunks)
+            await send({"type": "http.response.body", "body": data})
+    finally:
+        body.close()
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def _read_body(receive) -> Optional[tempfile.SpooledTemporaryFile]:
+    body = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            body.close()
+            return None
+        body.write(message.get("body", b""))
+        if not message.get("more_body"):
+            body.seek(0)
+            return body
+
+
+def _environ(scope, body) -> dict:
+    """WSGI environ (PEP 3333) for an ASGI HTTP request."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        streams.ASYNC_ENVIRON_KEY: True,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_flask(environ) -> tuple[int, list[tuple[str, str]], object]:
+    """Run the Flask app on a request. Returns (status code, headers with lower-case names, body iterable)."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+
+    chunks = flask_app(environ, start_response)
+    headers = [(name.lower(), value) for name, value in started["headers"]]
+    return int(started["status"].split(" ", 1)[0]), headers, chunks
+
+
+def _drain(chunks) -> bytes:
+    try:
+        return b"".join(chunks)
+    finally:
+        _close(chunks)
+
+
+def _close(chunks) -> None:
+    close = getattr(chunks, "close", None)
+    if close is not None:
+        close()
+
+
+async def _send_iter(chunks, send) -> None:
+    """
+    Relay a streamed WSGI body (e.g. /final_stream) chunk by chunk. It is iterated
+    in one relay thread, as under a WSGI server, so generators keep their request context.
+    """
+    loop = asyncio.get_running_loop()
+
+    def relay():
+        try:
+            for chunk in chunks:
+                if chunk:
+                    asyncio.run_coroutine_threadsafe(
+                        send({"type": "http.response.body", "body": chunk, "more_body": True}), loop).result()
+        finally:
+            _close(chunks)
+
+    await loop.run_in_executor(_relays, relay)
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _follow(run: str, after: int, receive, send) -> None:
+    """Send a run's events as they are stored, until it ends or the client disconnects."""
+    loop = asyncio.get_running_loop()
+    tail = streams.Tail(run, after)
+    disconnected = asyncio.Event()
+    watcher = asyncio.create_task(_watch_disconnect(receive, disconnected))
+    try:
+        text = tail.opening()
+        while True:
+            # Polling reads SQLite, which may wait on a busy database; keep it off the event loop
+            text += await loop.run_in_executor(_polls, tail.poll)
+            if text or tail.done:
+                await send({"type": "http.response.body", "body": text.encode(), "more_body": not tail.done})
+                text = ""
+            if tail.done:
+                return
+            try:
+                await asyncio.wait_for(disconnected.wait(), config.SSE_POLL_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        watcher.cancel()
+
+
+async def _watch_disconnect(receive, disconnected: asyncio.Event) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            disconnected.set()
+            return
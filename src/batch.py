@@ -0,0 +1,378 @@
+# src/batch.py
+# Headless batch runner: extract, analyze and summarize many videos without the web UI
+#
+# Usage (from the project root):
+#   python src/batch.py VIDEOS_DIR_OR_MANIFEST... --context "Site type: open pit; Mineral: Gold"
+#
+# Each video gets a report directory <out>/<video name>-<hash prefix>/ holding its
+# frames, results.jsonl (one line per analyzed frame), report.json and report.html.
+# Re-running the same command resumes: finished videos are skipped, extracted
+# frames are reused and only frames without a successful analysis are sent again.
+# A rerun with another context or other extraction settings starts the video afresh.
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from multiprocessing.managers import BaseManager
+from typing import Callable, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+import config
+import gpt_integration
+from frame_hashing import find_duplicates
+from jobs import ERROR_PREFIX
+from services.analysis_engine import analyze_concurrently
+from services.analysis_index import index_analysis, index_run
+from services.llm_service import SummaryStats, stream_summary
+from services.rate_limiter import RateLimiter
+from thumbnails import thumb_path
+from uploads import file_sha256
+from video_processing import ExtractionStats, frame_sort_key, iter_frames, iter_frames_adaptive
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v")
+STATE_FILE = "state.json"
+RESULTS_FILE = "results.jsonl"
+REPORT_JSON = "report.json"
+REPORT_HTML = "report.html"
+
+
+@dataclass
+class VideoTask:
+    """One video of the batch and the site context its frames are analyzed with."""
+    path: str
+    context: str
+
+
+@dataclass
+class VideoOutcome:
+    """What happened to one video, as listed in the batch index."""
+    path: str
+    status: str                      # 'done', 'skipped' or 'failed'
+    report_dir: Optional[str] = None
+    frames: int = 0
+    analyzed: int = 0                # API calls made in this run
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    timings: dict = field(default_factory=dict)
+
+
+# --- Inputs ---
+
+def collect_tasks(inputs: list[str], context: str) -> list[VideoTask]:
+    """
+    Expand directories (videos directly inside, sorted), manifests and video paths.
+    A manifest is a .txt file with one path per line ('#' comments allowed) or a
+    .json list of paths or {"path": ..., "context": ...} objects. Relative paths
+    in a manifest are resolved against the manifest's directory.
+    """
+    tasks = []
+    for item in inputs:
+        if os.path.isdir(item):
+            names = sorted(n for n in os.listdir(item) if n.lower().endswith(VIDEO_EXTENSIONS))
+            tasks += [VideoTask(os.path.join(item, n), context) for n in names]
+        elif item.lower().endswith(".json"):
+            base = os.path.dirname(os.path.abspath(item))
+            with open(item) as f:
+                for entry in json.load(f):
+                    entry = entry if isinstance(entry, dict) else {"path": entry}
+                    tasks.append(VideoTask(os.path.join(base, entry["path"]), entry.get("context") or context))
+        elif item.lower().endswith(".txt"):
+            base = os.path.dirname(os.path.abspath(item))
+            with open(item) as f:
+                lines = [l.strip() for l in f]
+            tasks += [VideoTask(os.path.join(base, l), context) for l in lines if l and not l.startswith("#")]
+        else:
+            tasks.append(VideoTask(item, context))
+    # The same video listed twice would race on one report directory
+    unique = {}
+    for task in tasks:
+        unique.setdefault(os.path.abspath(task.path), task)
+    return list(unique.values())
+
+
+# --- Per-video state ---
+
+def _write_json(path: str, data) -> None:
+    """Write atomically so an interrupted run never leaves a truncated file."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _load_results(path: str) -> dict[str, dict]:
+    """Saved analyses by frame name; a torn last line from an interruption is ignored."""
+    results = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                results[record["frame"]] = record
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def _extraction_settings(interval: int, mode: str) -> dict:
+    """
+    Settings that decide which source frames become frame_N.jpg. Saved frames and
+    analyses are only reused by a run with the same settings.
+    """
+    settings = {"mode": mode, "quality_gate": config.QUALITY_GATE}
+    if config.QUALITY_GATE == "swap":
+        settings["quality_search_frames"] = config.QUALITY_SEARCH_FRAMES
+    if mode == "adaptive":
+        settings.update(threshold=config.ADAPTIVE_THRESHOLD, min_spacing=config.ADAPTIVE_MIN_SPACING,
+                        max_spacing=config.ADAPTIVE_MAX_SPACING, probe_step=config.ADAPTIVE_PROBE_STEP)
+    else:
+        settings["interval"] = interval
+    return settings
+
+
+def _extract(task: VideoTask, frame_dir: str, interval: int, mode: str, state_path: str,
+             state: dict, video_hash: str) -> tuple[list[str], ExtractionStats]:
+    """Extracted frame paths, reusing a finished extraction (made with the state's settings) from an earlier run."""
+    stats = ExtractionStats()
+    if state.get("extracted"):
+        frames = [os.path.join(frame_dir, name) for name in state["frames"]]
+        if all(os.path.isfile(f) for f in frames):
+            return frames, stats
+    os.makedirs(frame_dir, exist_ok=True)
+    if mode == "adaptive":
+        frames = list(iter_frames_adaptive(task.path, frame_dir, stats=stats, video_sha256=video_hash))
+    else:
+        frames = list(iter_frames(task.path, frame_dir, interval, stats, video_sha256=video_hash))
+    frames.sort(key=frame_sort_key)
+    state.update(extracted=True, frames=[os.path.basename(f) for f in frames])
+    _write_json(state_path, state)
+    return frames, stats
+
+
+def process_video(task: VideoTask, out_dir: str, interval: int, mode: str = "interval",
+                  summarize: bool = True,
+                  analyze: Optional[Callable[[str, str], str]] = None) -> VideoOutcome:
+    """Extract, analyze and summarize one video into its report directory, resuming saved work."""
+    start = time.perf_counter()
+    video_hash = file_sha256(task.path)
+    stem = os.path.splitext(os.path.basename(task.path))[0]
+    report_dir = os.path.join(out_dir, f"{stem}-{video_hash[:12]}")
+    os.makedirs(report_dir, exist_ok=True)
+    outcome = VideoOutcome(task.path, "done", report_dir)
+
+    settings = _extraction_settings(interval, mode)
+    report_path = os.path.join(report_dir, REPORT_JSON)
+    report = _read_json(report_path)
+    if (report is not None and report.get("context") == task.context
+            and report.get("extraction_settings") == settings):
+        outcome.status, outcome.frames = "skipped", len(report["frames"])
+        return outcome
+
+    state_path = os.path.join(report_dir, STATE_FILE)
+    state = _read_json(state_path) or {"video": os.path.abspath(task.path), "sha256": video_hash}
+    if state.get("context") != task.context or state.get("extraction_settings") != settings:
+        # Analyses made for another site context, or of frames extracted differently, cannot be reused
+        state = {"video": os.path.abspath(task.path), "sha256": video_hash, "context": task.context,
+                 "extraction_settings": settings}
+        for name in (RESULTS_FILE, STATE_FILE):
+            if os.path.exists(os.path.join(report_dir, name)):
+                os.remove(os.path.join(report_dir, name))
+        _write_json(state_path, state)
+
+    # Analyses also go to the cross-run search index, one run per report directory
+    run_id = f"batch:{os.path.basename(report_dir)}"
+    index_run(run_id, "batch", os.path.abspath(task.path), video_hash)
+
+    t0 = time.perf_counter()
+    frames, extraction = _extract(task, os.path.join(report_dir, "frames"), interval, mode, state_path, state,
+                                 video_hash)
+    outcome.timings["extract"] = time.perf_counter() - t0
+    outcome.frames = len(frames)
+
+    # Analyze frames without a successful saved result; near-duplicates reuse their representative
+    t0 = time.perf_counter()
+    results_path = os.path.join(report_dir, RESULTS_FILE)
+    saved = {name: r for name, r in _load_results(results_path).items()
+             if not r["result"].startswith(ERROR_PREFIX)}
+    duplicates = find_duplicates(frames)
+    pending = [f for f in frames if f not in duplicates and os.path.basename(f) not in saved]
+    with open(results_path, "a") as out:
+        def record(frame, result, duplicate_of=None):
+            entry = {"frame": os.path.basename(frame), "result": result,
+                     "duplicate_of": os.path.basename(duplicate_of) if duplicate_of else None}
+            out.write(json.dumps(entry) + "\n")
+            out.flush()
+            saved[entry["frame"]] = entry
+
+        for frame, result in analyze_concurrently(pending, task.context, analyze=analyze):
+            record(frame, result)
+            if not result.startswith(ERROR_PREFIX):
+                index_analysis(run_id, frame, result, task.context)
+            outcome.analyzed += 1
+        for dup, rep in duplicates.items():
+            rep_result = saved.get(os.path.basename(rep))
+            if rep_result is not None and not rep_result["result"].startswith(ERROR_PREFIX):
+                record(dup, rep_result["result"], rep)
+    outcome.timings["analyze"] = time.perf_counter() - t0
+
+    ordered = [saved[os.path.basename(f)] for f in frames if os.path.basename(f) in saved]
+    failed = [r["frame"] for r in ordered if r["result"].startswith(ERROR_PREFIX)]
+
+    summary, summary_stats = None, SummaryStats()
+    if summarize and ordered and not failed:
+        t0 = time.perf_counter()
+        summary = "".join(stream_summary({r["frame"]: r["result"] for r in ordered}, stats=summary_stats))
+        outcome.timings["summarize"] = time.perf_counter() - t0
+
+    outcome.elapsed = time.perf_counter() - start
+    if failed:
+        # Leave report.json unwritten so the next run retries these frames
+        outcome.status = "failed"
+        outcome.error = f"{len(failed)} frame analyses failed, e.g. {failed[0]}"
+    report = {
+        "video": os.path.abspath(task.path),
+        "sha256": video_hash,
+        "context": task.context,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "extraction": {"interval": interval, "mode": mode, "frames_read": extraction.frames_read,
+                       "frames_per_sec": extraction.fps},
+        "extraction_settings": settings,
+        "frames": ordered,
+        "summary": summary,
+        "summary_backend": summary_stats.backend or None,
+        "timings": outcome.timings,
+    }
+    _write_report_html(report_dir, report)
+    if not failed:
+        _write_json(report_path, report)
+    return outcome
+
+
+def _write_report_html(report_dir: str, report: dict) -> None:
+    """Render report.html with links relative to the report directory, so it can be moved or shared."""
+    env = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), "templates")),
+                      autoescape=select_autoescape(["html"]))
+
+    def thumb_src(frame: str) -> str:
+        thumb = thumb_path(os.path.join(report_dir, "frames", frame))
+        return os.path.relpath(thumb, report_dir) if os.path.isfile(thumb) else f"frames/{frame}"
+
+    html = env.get_template("batch_report.html").render(
+        report=report, basename=os.path.basename, thumb_src=thumb_src, error_prefix=ERROR_PREFIX)
+    with open(os.path.join(report_dir, REPORT_HTML), "w") as f:
+        f.write(html)
+
+
+# --- Process pool with one rate limiter for all workers ---
+
+class _LimiterManager(BaseManager):
+    """Serves a single RateLimiter to every worker process."""
+
+
+_LimiterManager.register("RateLimiter", RateLimiter)
+
+
+def _init_worker(limiter, log_level: int) -> None:
+    logging.basicConfig(format='%(asctime)s %(levelname)s [%(processName)s] %(module)s: %(message)s',
+                        level=log_level)
+    # Every analysis thread in every worker draws from the same RPM/TPM budget
+    gpt_integration.rate_limiter = limiter
+
+
+def run_batch(tasks: list[VideoTask], out_dir: str, interval: int, mode: str = "interval",
+              workers: Optional[int] = None, summarize: bool = True,
+              analyze: Optional[Callable[[str, str], str]] = None) -> list[VideoOutcome]:
+    """
+    Process videos on a process pool (inline when workers is 1) and write <out>/index.json.
+    A custom `analyze` must be picklable (a module-level function) when workers > 1.
+    """
+    workers = min(workers or config.BATCH_WORKERS, len(tasks)) or 1
+    os.makedirs(out_dir, exist_ok=True)
+    outcomes = []
+
+    def finished(outcome: VideoOutcome) -> None:
+        outcomes.append(outcome)
+        logger.info('[%d/%d] %s: %s (%d frames, %d analyzed, %.1fs)%s', len(outcomes), len(tasks),
+                    os.path.basename(outcome.path), outcome.status, outcome.frames, outcome.analyzed,
+                    outcome.elapsed, f" – {outcome.error}" if outcome.error else "")
+
+    def failed(task: VideoTask, exc: BaseException) -> VideoOutcome:
+        logger.exception('Processing %s failed', task.path, exc_info=exc)
+        return VideoOutcome(task.path, "failed", error=str(exc))
+
+    if workers == 1:
+        for task in tasks:
+            try:
+                finished(process_video(task, out_dir, interval, mode, summarize, analyze))
+            except Exception as e:
+                finished(failed(task, e))
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with _LimiterManager(ctx=ctx) as manager:
+            limiter = manager.RateLimiter(config.OPENAI_RPM, config.OPENAI_TPM)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                     initargs=(limiter, logging.getLogger().level)) as pool:
+                futures = {pool.submit(process_video, t, out_dir, interval, mode, summarize, analyze): t
+                           for t in tasks}
+                for future in as_completed(futures):
+                    try:
+                        finished(future.result())
+                    except Exception as e:
+                        finished(failed(futures[future], e))
+
+    order = {os.path.abspath(t.path): i for i, t in enumerate(tasks)}
+    outcomes.sort(key=lambda o: order[os.path.abspath(o.path)])
+    _write_json(os.path.join(out_dir, "index.json"), [asdict(o) for o in outcomes])
+    return outcomes
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Extract, analyze and summarize many videos.")
+    parser.add_argument("inputs", nargs="+", help="video files, directories of videos, or .txt/.json manifests")
+    parser.add_argument("--context", required=True, help="site context sent with every frame")
+    parser.add_argument("--out", default=config.BATCH_OUTPUT_DIR, help="report directory")
+    parser.add_argument("--workers", type=int, default=config.BATCH_WORKERS,
+                        help="videos processed in parallel (one process each)")
+    parser.add_argument("--interval", type=int, default=config.FRAME_INTERVAL, help="keep every Nth frame")
+    parser.add_argument("--adaptive", action="store_true", help="keep frames on scene change instead")
+    parser.add_argument("--no-summary", action="store_true", help="skip the final LLM summary")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s in %(module)s: %(message)s', level=logging.INFO)
+    tasks = collect_tasks(args.inputs, args.context)
+    missing = [t.path for t in tasks if not os.path.isfile(t.path)]
+    if missing:
+        parser.error(f"video not found: {', '.join(missing)}")
+    if not tasks:
+        parser.error("no videos found")
+
+    outcomes = run_batch(tasks, args.out, args.interval, "adaptive" if args.adaptive else "interval",
+                         args.workers, not args.no_summary)
+    failures = [o for o in outcomes if o.status == "failed"]
+    logger.info('Batch finished: %d done, %d skipped, %d failed; reports in %s',
+                sum(o.status == "done" for o in outcomes), sum(o.status == "skipped" for o in outcomes),
+                len(failures), os.path.abspath(args.out))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,7 +13,152 @@ FRAMES_DIR   = os.path.join(DATA_DIR, "frames")
 
 # API Key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Optional override, e.g. a local stub of the chat completions endpoint
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 # Additional Configurations
 FRAME_INTERVAL = int(os.getenv("FRAME_INTERVAL", 30))
 VIDEO_PATH     = os.getenv("VIDEO_PATH", os.path.join(DATA_DIR, "sample_video.mp4"))
+
+# Frame extraction: intervals at or above this many frames seek instead of grabbing
+EXTRACT_SEEK_THRESHOLD = int(os.getenv("EXTRACT_SEEK_THRESHOLD", 300))
+
+# Parallel extraction: worker processes (1 = serial, 0 = one per CPU core) and segment sizing
+EXTRACT_WORKERS              = int(os.getenv("EXTRACT_WORKERS", 1))
+EXTRACT_SEGMENTS_PER_WORKER  = int(os.getenv("EXTRACT_SEGMENTS_PER_WORKER", 2))
+EXTRACT_MIN_SEGMENT_FRAMES   = int(os.getenv("EXTRACT_MIN_SEGMENT_FRAMES", 900))
+
+# Adaptive (scene-change) sampling: spacing bounds in frames and change threshold (0..1)
+ADAPTIVE_MIN_SPACING = int(os.getenv("ADAPTIVE_MIN_SPACING", 10))
+ADAPTIVE_MAX_SPACING = int(os.getenv("ADAPTIVE_MAX_SPACING", 300))
+ADAPTIVE_THRESHOLD   = float(os.getenv("ADAPTIVE_THRESHOLD", 0.08))
+ADAPTIVE_PROBE_STEP  = int(os.getenv("ADAPTIVE_PROBE_STEP", 5))
+ADAPTIVE_THUMB_SIZE  = int(os.getenv("ADAPTIVE_THUMB_SIZE", 64))
+
+# Thumbnails written next to each extracted frame: format ("webp" or "jpeg"),
+# long edge in px and encoder quality (0-100)
+THUMBNAILS_ENABLED = os.getenv("THUMBNAILS_ENABLED", "1") == "1"
+THUMB_FORMAT       = os.getenv("THUMB_FORMAT", "webp")
+THUMB_MAX_EDGE     = int(os.getenv("THUMB_MAX_EDGE", 320))
+THUMB_QUALITY      = int(os.getenv("THUMB_QUALITY", 70))
+# Cache lifetime in seconds for frame and thumbnail URLs carrying a ?v= version
+FRAME_CACHE_MAX_AGE = int(os.getenv("FRAME_CACHE_MAX_AGE", 31536000))
+
+# Persistent frame cache keyed by video hash and source frame number: re-extracting a video
+# at another interval reuses frames decoded before. Disk budget in MiB (<= 0 is unbounded)
+FRAME_CACHE_ENABLED = os.getenv("FRAME_CACHE_ENABLED", "1") == "1"
+FRAME_CACHE_DIR     = os.getenv("FRAME_CACHE_DIR", os.path.join(DATA_DIR, "frame_cache"))
+FRAME_CACHE_MAX_MB  = int(os.getenv("FRAME_CACHE_MAX_MB", 2048))
+
+# In-memory store of encoded frames and thumbnails shared by extraction, serving and analysis
+# (MiB, <= 0 disables); entries pushed out can spill to a memory-mapped file of
+# FRAME_STORE_SPILL_MB in FRAME_STORE_SPILL_DIR (empty disables the spill)
+FRAME_STORE_MAX_MB    = int(os.getenv("FRAME_STORE_MAX_MB", 256))
+FRAME_STORE_SPILL_DIR = os.getenv("FRAME_STORE_SPILL_DIR", "")
+FRAME_STORE_SPILL_MB  = int(os.getenv("FRAME_STORE_SPILL_MB", 1024))
+
+# Frame quality gate during extraction: "off", "drop" (skip frames failing a threshold) or
+# "swap" (keep the sharpest passing frame among the next QUALITY_SEARCH_FRAMES instead, else drop).
+# Scores are computed on a QUALITY_SIZE-wide copy; sharpness is Laplacian variance at that size,
+# clipped the fraction of black/white pixels and haze the mean dark channel (both 0..1)
+QUALITY_GATE           = os.getenv("QUALITY_GATE", "swap")
+QUALITY_SEARCH_FRAMES  = int(os.getenv("QUALITY_SEARCH_FRAMES", 8))
+QUALITY_SIZE           = int(os.getenv("QUALITY_SIZE", 320))
+QUALITY_MIN_SHARPNESS  = float(os.getenv("QUALITY_MIN_SHARPNESS", 15))
+QUALITY_MAX_CLIPPED    = float(os.getenv("QUALITY_MAX_CLIPPED", 0.45))
+QUALITY_MAX_HAZE       = float(os.getenv("QUALITY_MAX_HAZE", 0.5))
+
+# Near-duplicate frames: max dHash Hamming distance to reuse an analysis (negative disables)
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 5))
+
+# Concurrent analysis: in-flight requests, account quotas (<= 0 disables) and retry policy
+ANALYZE_WORKERS          = int(os.getenv("ANALYZE_WORKERS", 8))
+OPENAI_RPM               = float(os.getenv("OPENAI_RPM", 500))
+OPENAI_TPM               = float(os.getenv("OPENAI_TPM", 30000))
+OPENAI_MAX_RETRIES       = int(os.getenv("OPENAI_MAX_RETRIES", 5))
+OPENAI_RETRY_BASE_DELAY  = float(os.getenv("OPENAI_RETRY_BASE_DELAY", 1.0))
+# Rough text size of one frame request (system prompt + context) for the TPM bucket
+ANALYZE_EST_TOKENS       = int(os.getenv("ANALYZE_EST_TOKENS", 150))
+# Batched analysis: frames packed into one request (1 disables) and the estimated
+# tokens (prompt, images and reply) one request may use
+ANALYZE_BATCH_SIZE       = int(os.getenv("ANALYZE_BATCH_SIZE", 4))
+ANALYZE_BATCH_TOKENS     = int(os.getenv("ANALYZE_BATCH_TOKENS", 8000))
+
+# Persistent analyze_image result cache (SQLite); age in days, entries <= 0 means unbounded
+ANALYSIS_CACHE_ENABLED       = os.getenv("ANALYSIS_CACHE_ENABLED", "1") == "1"
+ANALYSIS_CACHE_PATH          = os.getenv("ANALYSIS_CACHE_PATH", os.path.join(DATA_DIR, "analysis_cache.db"))
+ANALYSIS_CACHE_MAX_ENTRIES   = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 50000))
+ANALYSIS_CACHE_MAX_AGE_DAYS  = float(os.getenv("ANALYSIS_CACHE_MAX_AGE_DAYS", 30))
+
+# Image preprocessing before upload: long-edge target in px (<= 0 keeps full size),
+# JPEG re-encode quality and vision detail level ("low", "high" or "auto")
+IMAGE_MAX_EDGE      = int(os.getenv("IMAGE_MAX_EDGE", 1024))
+IMAGE_JPEG_QUALITY  = int(os.getenv("IMAGE_JPEG_QUALITY", 85))
+IMAGE_DETAIL        = os.getenv("IMAGE_DETAIL", "auto")
+
+# Pipelined extract-and-analyze: max frames waiting between the decoder and analysis workers
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 32))
+
+# Job registry shared by all server processes: SQLite database and per-job directories
+JOBS_DB_PATH          = os.getenv("JOBS_DB_PATH", os.path.join(DATA_DIR, "jobs.db"))
+JOBS_DIR              = os.getenv("JOBS_DIR", os.path.join(DATA_DIR, "jobs"))
+# Seconds between checks of a job's abort flag while decoding or analyzing
+CANCEL_POLL_INTERVAL  = float(os.getenv("CANCEL_POLL_INTERVAL", 0.25))
+# Flask session key; set it so every server process accepts the same job cookies
+SECRET_KEY            = os.getenv("SECRET_KEY")
+
+# Progress streams (SSE): seconds between heartbeat comments on an idle stream, between checks
+# for new events, and without any client following a run before its work is cancelled
+# (<= 0 never cancels); reconnection delay suggested to EventSource clients in milliseconds
+SSE_HEARTBEAT_INTERVAL  = float(os.getenv("SSE_HEARTBEAT_INTERVAL", 15))
+SSE_POLL_INTERVAL       = float(os.getenv("SSE_POLL_INTERVAL", 0.25))
+SSE_DISCONNECT_GRACE    = float(os.getenv("SSE_DISCONNECT_GRACE", 20))
+SSE_RETRY_MS            = int(os.getenv("SSE_RETRY_MS", 2000))
+
+# ASGI server (asgi.py): threads running Flask for requests, threads relaying streamed
+# bodies such as /final_stream (one per open stream; further streams wait for a free
+# thread), and threads polling followed runs' events
+ASGI_REQUEST_THREADS    = int(os.getenv("ASGI_REQUEST_THREADS", 32))
+ASGI_RELAY_THREADS      = int(os.getenv("ASGI_RELAY_THREADS", 16))
+ASGI_POLL_THREADS       = int(os.getenv("ASGI_POLL_THREADS", 4))
+
+# Full-text index of every analysis across runs, for search and chatbot retrieval (SQLite FTS5);
+# results returned by default and at most per query
+ANALYSIS_INDEX_ENABLED = os.getenv("ANALYSIS_INDEX_ENABLED", "1") == "1"
+ANALYSIS_INDEX_PATH    = os.getenv("ANALYSIS_INDEX_PATH", os.path.join(DATA_DIR, "analysis_index.db"))
+SEARCH_TOP_K           = int(os.getenv("SEARCH_TOP_K", 10))
+SEARCH_MAX_K           = int(os.getenv("SEARCH_MAX_K", 100))
+# Runs stay indexed after their job is deleted; analyses older than this many days are
+# pruned (0 keeps everything, so the index only grows)
+ANALYSIS_INDEX_RETENTION_DAYS = float(os.getenv("ANALYSIS_INDEX_RETENTION_DAYS", 0))
+
+# Final summary map-reduce: token budget per LLM call, parallel chunk calls,
+# and a cap on reduce levels before the final summary is forced
+SUMMARY_CHUNK_TOKENS  = int(os.getenv("SUMMARY_CHUNK_TOKENS", 3000))
+SUMMARY_WORKERS       = int(os.getenv("SUMMARY_WORKERS", 4))
+SUMMARY_MAX_LEVELS    = int(os.getenv("SUMMARY_MAX_LEVELS", 6))
+# Backend tried first for the final summary: "langchain" or "openai" (direct client)
+SUMMARY_BACKEND       = os.getenv("SUMMARY_BACKEND", "langchain")
+# Map/reduce chunk summaries keyed by their input, so re-summarizing after frame
+# removal only recomputes changed chunks (size and age limits as for the analysis cache)
+SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "1") == "1"
+SUMMARY_CACHE_PATH    = os.getenv("SUMMARY_CACHE_PATH", os.path.join(DATA_DIR, "summary_cache.db"))
+
+# Paginated frames/results API: default and maximum items per page
+PAGE_SIZE      = int(os.getenv("PAGE_SIZE", 50))
+MAX_PAGE_SIZE  = int(os.getenv("MAX_PAGE_SIZE", 200))
+
+# Chunked uploads: chunk size suggested to clients and the largest chunk accepted (bytes)
+UPLOAD_CHUNK_SIZE      = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_MAX_CHUNK_SIZE  = int(os.getenv("UPLOAD_MAX_CHUNK_SIZE", 64 * 1024 * 1024))
+# Incomplete uploads with no chunk for this long are expired with their partial file (seconds)
+UPLOAD_STALE_SECONDS   = int(os.getenv("UPLOAD_STALE_SECONDS", 24 * 3600))
+
+# Headless batch runner (src/batch.py): report directory and videos processed in parallel
+BATCH_OUTPUT_DIR  = os.getenv("BATCH_OUTPUT_DIR", os.path.join(DATA_DIR, "batch"))
+BATCH_WORKERS     = int(os.getenv("BATCH_WORKERS", 2))
+
+# Metrics: serve Prometheus text on /metrics; per-item progress is logged at most
+# once every PROGRESS_LOG_INTERVAL seconds instead of once per frame
+METRICS_ENABLED        = os.getenv("METRICS_ENABLED", "1") == "1"
+PROGRESS_LOG_INTERVAL  = float(os.getenv("PROGRESS_LOG_INTERVAL", 5))
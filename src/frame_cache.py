@@ -0,0 +1,224 @@
+# src/frame_cache.py
+# Persistent cache of extracted frames keyed by (video content hash, source frame number)
+#
+# Every frame written during extraction is hard-linked into the cache with its
+# thumbnail, timestamp and quality scores. Re-extracting the same video at
+# another interval links the cached JPEGs into the job instead of decoding and
+# encoding them again; only frames never extracted before are decoded. Files
+# are evicted least recently used first once the cache exceeds its disk budget.
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import (
+    BigInteger, Column, Float, Integer, MetaData, String, Table, Text,
+    create_engine, delete, event, func, select, update
+)
+from sqlalchemy.dialects.sqlite import insert
+
+import config
+from frame_quality import FrameQuality
+from thumbnails import thumb_path
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+_frames = Table(
+    "cached_frames", _metadata,
+    Column("video", String(64), primary_key=True),   # SHA-256 of the video file
+    Column("frame", Integer, primary_key=True),      # source frame number
+    Column("pos_msec", Float),                       # CAP_PROP_POS_MSEC when it was decoded
+    Column("size", BigInteger, nullable=False),      # bytes of the JPEG and thumbnail
+    Column("thumb_ext", String(8)),                  # ".webp" or ".jpg"; NULL without a thumbnail
+    Column("sharpness", Float),
+    Column("clipped", Float),
+    Column("haze", Float),
+    Column("last_used", Float, nullable=False, index=True),
+)
+_videos = Table(
+    "cached_videos", _metadata,
+    Column("path", Text, primary_key=True),
+    Column("size", BigInteger, nullable=False),
+    Column("mtime_ns", BigInteger, nullable=False),
+    Column("sha256", String(64), nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class CachedFrame:
+    frame: int
+    pos_msec: Optional[float]
+    thumb_ext: Optional[str]
+    quality: Optional[FrameQuality]   # None when cached with the quality gate off
+
+
+def _link(src: str, dst: str) -> None:
+    """Hard-link `src` to `dst` (copying across filesystems), replacing `dst`."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class FrameCache:
+    """Frame JPEGs on disk under `root`, indexed in SQLite, bounded to `max_bytes`."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        self.engine = create_engine(f"sqlite:///{os.path.join(root, 'index.db')}",
+                                    connect_args={"check_same_thread": False})
+
+        @event.listens_for(self.engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _):
+            # Parallel extraction workers add frames to the same cache
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute("PRAGMA busy_timeout=5000")
+            cur.close()
+
+        _metadata.create_all(self.engine)
+
+    def _dir(self, video: str) -> str:
+        return os.path.join(self.root, video[:2], video)
+
+    def _path(self, video: str, frame: int) -> str:
+        return os.path.join(self._dir(video), f"{frame}.jpg")
+
+    def video_key(self, video_path: str) -> str:
+        """SHA-256 of the video, remembered by path, size and mtime so it is hashed once."""
+        path = os.path.abspath(video_path)
+        st = os.stat(path)
+        with self.engine.connect() as conn:
+            row = conn.execute(select(_videos).where(_videos.c.path == path)).first()
+        if row is not None and row.size == st.st_size and row.mtime_ns == st.st_mtime_ns:
+            return row.sha256
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        values = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest()}
+        with self.engine.begin() as conn:
+            conn.execute(insert(_videos).values(path=path, **values)
+                         .on_conflict_do_update(index_elements=[_videos.c.path], set_=values))
+        return values["sha256"]
+
+    def entries(self, video: str, first: int = 0, last: Optional[int] = None) -> dict[int, CachedFrame]:
+        """Cached frames of a video numbered `first`..`last - 1` (to the end when `last` is None)."""
+        query = select(_frames).where(_frames.c.video == video, _frames.c.frame >= first)
+        if last is not None:
+            query = query.where(_frames.c.frame < last)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        return {r.frame: CachedFrame(r.frame, r.pos_msec, r.thumb_ext,
+                                     FrameQuality(r.sharpness, r.clipped, r.haze)
+                                     if r.sharpness is not None else None)
+                for r in rows}
+
+    def put(self, video: str, frame: int, frame_path: str, pos_msec: Optional[float] = None,
+            quality: Optional[FrameQuality] = None) -> None:
+        """Add a written frame (and its thumbnail, if any) without re-encoding it."""
+        directory = self._dir(video)
+        os.makedirs(directory, exist_ok=True)
+        _link(frame_path, self._path(video, frame))
+        size = os.path.getsize(frame_path)
+        thumb_ext = None
+        thumb = thumb_path(frame_path)
+        if os.path.isfile(thumb):
+            thumb_ext = os.path.splitext(thumb)[1]
+            _link(thumb, os.path.join(directory, f"{frame}{thumb_ext}"))
+            size += os.path.getsize(thumb)
+        values = {"pos_msec": pos_msec, "size": size, "thumb_ext": thumb_ext, "last_used": time.time(),
+                  "sharpness": quality.sharpness if quality else None,
+                  "clipped": quality.clipped if quality else None,
+                  "haze": quality.haze if quality else None}
+        with self.engine.begin() as conn:
+            conn.execute(insert(_frames).values(video=video, frame=frame, **values)
+                         .on_conflict_do_update(index_elements=[_frames.c.video, _frames.c.frame],
+                                                set_=values))
+
+    def set_quality(self, video: str, frame: int, quality: FrameQuality) -> None:
+        """Store scores computed later for a frame cached with the quality gate off."""
+        with self.engine.begin() as conn:
+            conn.execute(update(_frames).where(_frames.c.video == video, _frames.c.frame == frame)
+                         .values(sharpness=quality.sharpness, clipped=quality.clipped, haze=quality.haze))
+
+    def frame_path(self, video: str, frame: int) -> str:
+        return self._path(video, frame)
+
+    def materialize(self, video: str, entry: CachedFrame, outpath: str) -> bool:
+        """
+        Link a cached frame (and a thumbnail in the current format) to `outpath`.
+        Returns False when its file has gone, e.g. evicted by another process.
+        """
+        src = self._path(video, entry.frame)
+        try:
+            _link(src, outpath)
+        except FileNotFoundError:
+            return False
+        thumb = thumb_path(outpath)
+        if entry.thumb_ext and thumb.endswith(entry.thumb_ext):
+            os.makedirs(os.path.dirname(thumb), exist_ok=True)
+            try:
+                _link(os.path.join(self._dir(video), f"{entry.frame}{entry.thumb_ext}"), thumb)
+            except FileNotFoundError:
+                pass  # made on demand by thumbnails.ensure_thumbnail
+        with self.engine.begin() as conn:
+            conn.execute(update(_frames).where(_frames.c.video == video, _frames.c.frame == entry.frame)
+                         .values(last_used=time.time()))
+        return True
+
+    def size(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.coalesce(func.sum(_frames.c.size), 0))).scalar_one()
+
+    def evict(self) -> int:
+        """Delete least recently used frames until the cache fits its budget. Returns frames removed."""
+        if self.max_bytes <= 0:
+            return 0
+        removed = 0
+        with self.engine.begin() as conn:
+            excess = conn.execute(select(func.coalesce(func.sum(_frames.c.size), 0))).scalar_one() - self.max_bytes
+            if excess <= 0:
+                return 0
+            rows = conn.execute(select(_frames.c.video, _frames.c.frame, _frames.c.size, _frames.c.thumb_ext)
+                                .order_by(_frames.c.last_used)).all()
+            for row in rows:
+                if excess <= 0:
+                    break
+                for ext in (".jpg", row.thumb_ext):
+                    if ext:
+                        try:
+                            os.remove(os.path.join(self._dir(row.video), f"{row.frame}{ext}"))
+                        except FileNotFoundError:
+                            pass
+                conn.execute(delete(_frames).where(_frames.c.video == row.video, _frames.c.frame == row.frame))
+                excess -= row.size
+                removed += 1
+        logger.info('Frame cache evicted %d frames', removed)
+        return removed
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_frame_cache() -> Optional[FrameCache]:
+    """Process-wide frame cache, created on first use. None when disabled."""
+    global _cache
+    if not config.FRAME_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = FrameCache(config.FRAME_CACHE_DIR, config.FRAME_CACHE_MAX_MB * 1024 * 1024)
+        return _cache
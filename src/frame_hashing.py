@@ -0,0 +1,112 @@
+# src/frame_hashing.py
+# Perceptual hashing and near-duplicate lookup for extracted frames
+
+import logging
+from typing import Iterable, Optional
+
+import numpy as np
+import config
+from frame_store import get_frame_store
+from lazy import LazyModule
+
+cv2 = LazyModule("cv2")
+
+logger = logging.getLogger(__name__)
+
+
+def dhash(image_path: str, hash_size: int = 8) -> Optional[int]:
+    """
+    Difference hash of an image file as a `hash_size**2`-bit integer.
+    Returns None if the image cannot be read.
+    """
+    try:
+        data = get_frame_store().read(image_path).data
+    except OSError:
+        return None
+    # Reduced decode: the JPEG decoder skips most of the work for an 8x downscale
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+    Nearest-neighbour queries within a small radius only visit a handful of
+    nodes, so lookups stay cheap with thousands of frames.
+    """
+
+    def __init__(self):
+        self._root = None  # (hash, value, {distance: child})
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key: int, value) -> None:
+        """Insert `value` under hash `key`."""
+        self._size += 1
+        if self._root is None:
+            self._root = (key, value, {})
+            return
+        node = self._root
+        while True:
+            dist = hamming(key, node[0])
+            child = node[2].get(dist)
+            if child is None:
+                node[2][dist] = (key, value, {})
+                return
+            node = child
+
+    def nearest(self, key: int, max_distance: int) -> Optional[tuple[object, int]]:
+        """Return (value, distance) of the closest entry within `max_distance`, or None."""
+        best = None
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            dist = hamming(key, node[0])
+            if dist <= max_distance and (best is None or dist < best[1]):
+                best = (node[1], dist)
+                if dist == 0:
+                    break
+            # Triangle inequality: only children in [dist - r, dist + r] can match
+            radius = best[1] if best is not None else max_distance
+            for edge, child in node[2].items():
+                if dist - radius <= edge <= dist + radius:
+                    stack.append(child)
+        return best
+
+
+def find_duplicates(frames: Iterable[str], max_distance: Optional[int] = None) -> dict[str, str]:
+    """
+    Map each near-duplicate frame to the earlier representative it matches.
+    Frames are visited in order; a frame becomes a representative when no
+    existing representative lies within `max_distance` bits. Frames whose hash
+    cannot be computed are always treated as representatives.
+    """
+    max_distance = config.DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+    duplicates = {}
+    if max_distance < 0:
+        return duplicates
+
+    tree = BKTree()
+    for frame in frames:
+        key = dhash(frame)
+        if key is None:
+            continue
+        match = tree.nearest(key, max_distance)
+        if match is None:
+            tree.add(key, frame)
+        else:
+            duplicates[frame] = match[0]
+    logger.info('Perceptual hash index: %d representatives, %d duplicates',
+                len(tree), len(duplicates))
+    return duplicates
@@ -0,0 +1,72 @@
+# src/frame_quality.py
+# Blur, exposure and haze scoring of extracted frames, used to skip frames not worth analyzing
+
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import config
+from lazy import LazyModule
+
+cv2 = LazyModule("cv2")
+
+# Grey levels counted as crushed shadows or blown highlights
+_CLIP_LOW, _CLIP_HIGH = 4, 251
+# Dark-channel patch size in downsampled pixels
+_HAZE_PATCH = 7
+
+
+@dataclass(frozen=True)
+class FrameQuality:
+    """Scores of one frame, computed on a QUALITY_SIZE-wide downsampled copy."""
+    sharpness: float        # variance of the Laplacian; low for motion blur, rain smear and fog
+    clipped: float          # fraction of pixels crushed to black or blown to white (0..1)
+    haze: float             # mean dark-channel intensity; near 0 for clear outdoor scenes (0..1)
+    offset: int = 0         # source frames after the scheduled one that were kept instead
+
+    def passes(self) -> bool:
+        return (self.sharpness >= config.QUALITY_MIN_SHARPNESS
+                and self.clipped <= config.QUALITY_MAX_CLIPPED
+                and self.haze <= config.QUALITY_MAX_HAZE)
+
+    def as_dict(self) -> dict:
+        return {k: round(v, 4) if isinstance(v, float) else v for k, v in asdict(self).items()}
+
+
+def gate_enabled() -> bool:
+    return config.QUALITY_GATE in ("drop", "swap")
+
+
+def downsample(frame: np.ndarray) -> np.ndarray:
+    """Shrink a BGR frame to QUALITY_SIZE pixels wide; frames of one video stack into a batch."""
+    height, width = frame.shape[:2]
+    size = config.QUALITY_SIZE
+    if width <= size:
+        return frame
+    return cv2.resize(frame, (size, max(1, round(height * size / width))), interpolation=cv2.INTER_AREA)
+
+
+def score_batch(frames: np.ndarray) -> list[FrameQuality]:
+    """Score a (N, H, W, 3) uint8 batch of downsampled BGR frames in one vectorized pass."""
+    bgr = frames.astype(np.float32)
+    gray = bgr @ np.array([0.114, 0.587, 0.299], dtype=np.float32)
+
+    # 4-neighbour Laplacian over the interior of every frame at once
+    lap = (gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:]
+           - 4 * gray[:, 1:-1, 1:-1])
+    sharpness = lap.var(axis=(1, 2))
+
+    clipped = ((gray <= _CLIP_LOW) | (gray >= _CLIP_HIGH)).mean(axis=(1, 2))
+
+    # Dark channel prior: per-pixel minimum over colour channels, then over a local patch
+    dark = frames.min(axis=3)
+    pad = _HAZE_PATCH // 2
+    dark = np.pad(dark, ((0, 0), (pad, pad), (pad, pad)), mode="edge")
+    windows = np.lib.stride_tricks.sliding_window_view(dark, (_HAZE_PATCH, _HAZE_PATCH), axis=(1, 2))
+    haze = windows.min(axis=(-2, -1)).mean(axis=(1, 2)) / 255.0
+
+    return [FrameQuality(float(s), float(c), float(h)) for s, c, h in zip(sharpness, clipped, haze)]
+
+
+def score(frame: np.ndarray) -> FrameQuality:
+    """Scores of a single full-size BGR frame."""
+    return score_batch(downsample(frame)[np.newaxis])[0]
@@ -0,0 +1,233 @@
+# src/frame_store.py
+# Encoded frame bytes shared by extraction, frame serving and analysis
+#
+# Frames are written through this store: the JPEG (or thumbnail) bytes go to
+# disk as before and are also kept in a bounded in-memory LRU, so serving a
+# frame or uploading it for analysis right after extraction needs no file
+# reads. Entries pushed out of memory can spill into a memory-mapped ring
+# buffer on disk instead of being dropped. The store is per process; files
+# on disk stay the source of truth and are read through on a miss. Each entry
+# remembers the version (mtime, size, inode) of the file it was taken from and
+# is dropped once a stat shows the file changed, so frames rewritten or removed
+# by another server process are never served from a stale copy.
+
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import config
+import metrics
+
+
+# (st_mtime_ns, st_size, st_ino) of the file an entry's bytes came from
+FileVersion = tuple[int, int, int]
+
+
+@dataclass(frozen=True)
+class StoredFrame:
+    data: bytes
+    etag: str             # SHA-1 of the bytes, the strong ETag frames are served with
+    version: FileVersion  # of the file holding the bytes when they were stored
+
+
+def _key(path: str) -> str:
+    return os.path.abspath(path)
+
+
+def _version(st: os.stat_result) -> FileVersion:
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class _Spill:
+    """
+    Fixed-size ring buffer in an unlinked temporary file, mapped into memory.
+    Writes go round the buffer and overwrite the oldest spilled entries.
+    """
+
+    def __init__(self, directory: str, size: int):
+        os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.TemporaryFile(dir=directory, prefix="frame_store_")
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self.size = size
+        self._pos = 0
+        # key -> (offset, length, etag, file version), oldest first
+        self._entries: OrderedDict[str, tuple[int, int, str, FileVersion]] = OrderedDict()
+
+    def put(self, key: str, frame: StoredFrame) -> None:
+        length = len(frame.data)
+        if length > self.size:
+            return
+        self.discard(key)
+        if self._pos + length > self.size:
+            # Wrapping: what is left past the write position is the oldest data
+            self._drop_front(lambda offset: offset >= self._pos)
+            self._pos = 0
+        start, end = self._pos, self._pos + length
+        self._drop_front(lambda offset: start <= offset < end)
+        self._map[start:end] = frame.data
+        self._entries[key] = (start, length, frame.etag, frame.version)
+        self._pos = end
+
+    def _drop_front(self, overwritten) -> None:
+        while self._entries:
+            key, (offset, *_) = next(iter(self._entries.items()))
+            if not overwritten(offset):
+                break
+            del self._entries[key]
+
+    def pop(self, key: str) -> Optional[StoredFrame]:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        offset, length, etag, version = entry
+        return StoredFrame(self._map[offset:offset + length], etag, version)
+
+    def discard(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def keys(self) -> list[str]:
+        return list(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+
+class FrameStore:
+    """
+    Encoded images by path: an LRU of at most `max_bytes` in memory, plus an
+    optional memory-mapped spill of `spill_bytes` under `spill_dir`.
+    """
+
+    def __init__(self, max_bytes: int, spill_dir: Optional[str] = None, spill_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self._frames: OrderedDict[str, StoredFrame] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._spill = _Spill(spill_dir, spill_bytes) if spill_dir and spill_bytes > 0 else None
+
+    def get(self, path: str) -> Optional[StoredFrame]:
+        """
+        Stored bytes of a path, or None. Spilled entries move back into memory.
+        An entry whose file has since changed or gone is dropped (a "stale" miss).
+        """
+        key = _key(path)
+        try:
+            current = _version(os.stat(key))
+        except OSError:
+            current = None
+        with self._lock:
+            frame = self._frames.get(key)
+            result = "memory"
+            if frame is None and self._spill is not None:
+                frame = self._spill.pop(key)
+                result = "spill"
+                if frame is not None and frame.version == current:
+                    self._insert(key, frame)
+            if frame is not None and frame.version == current:
+                self._frames.move_to_end(key)
+                metrics.FRAME_STORE_LOOKUPS.inc(result=result)
+                return frame
+            if frame is not None:
+                self._remove(key)
+                result = "stale"
+            else:
+                result = "miss"
+        metrics.FRAME_STORE_LOOKUPS.inc(result=result)
+        return None
+
+    def put(self, path: str, data: bytes, version: Optional[FileVersion] = None) -> StoredFrame:
+        """Keep the bytes of a file that already holds them (`version` is read from the file if not given)."""
+        key = _key(path)
+        if version is None:
+            version = _version(os.stat(key))
+        frame = StoredFrame(bytes(data), hashlib.sha1(data).hexdigest(), version)
+        with self._lock:
+            self._insert(key, frame)
+        return frame
+
+    def _insert(self, key: str, frame: StoredFrame) -> None:
+        old = self._frames.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.data)
+        if self._spill is not None:
+            self._spill.discard(key)
+        if len(frame.data) > self.max_bytes:
+            return
+        self._frames[key] = frame
+        self._bytes += len(frame.data)
+        while self._bytes > self.max_bytes:
+            evicted_key, evicted = self._frames.popitem(last=False)
+            self._bytes -= len(evicted.data)
+            if self._spill is not None:
+                self._spill.put(evicted_key, evicted)
+
+    def write(self, path: str, data: bytes) -> StoredFrame:
+        """Write the bytes to `path` (replacing, never writing through, an existing file) and keep them."""
+        if os.path.lexists(path):
+            os.remove(path)
+        with open(path, "wb") as f:
+            f.write(data)
+            f.flush()
+            version = _version(os.fstat(f.fileno()))
+        return self.put(path, data, version)
+
+    def read(self, path: str) -> StoredFrame:
+        """Bytes of a path from the store, else from disk (and kept). Raises OSError if unreadable."""
+        frame = self.get(path)
+        if frame is not None:
+            return frame
+        with open(path, "rb") as f:
+            version = _version(os.fstat(f.fileno()))
+            return self.put(path, f.read(), version)
+
+    def discard(self, path: str) -> None:
+        """Forget a path whose file was removed or replaced by this process."""
+        with self._lock:
+            self._remove(_key(path))
+
+    def _remove(self, key: str) -> None:
+        frame = self._frames.pop(key, None)
+        if frame is not None:
+            self._bytes -= len(frame.data)
+        if self._spill is not None:
+            self._spill.discard(key)
+
+    def discard_dir(self, directory: str) -> None:
+        """Forget every path under a directory (a job's frames being deleted)."""
+        prefix = _key(directory) + os.sep
+        with self._lock:
+            keys = [k for k in self._frames if k.startswith(prefix)]
+            if self._spill is not None:
+                keys += [k for k in self._spill.keys() if k.startswith(prefix)]
+        for key in keys:
+            self.discard(key)
+
+    def __contains__(self, path: str) -> bool:
+        key = _key(path)
+        with self._lock:
+            return key in self._frames or (self._spill is not None and key in self._spill)
+
+    def size(self) -> int:
+        """Bytes held in memory (spilled entries excluded)."""
+        return self._bytes
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_frame_store() -> FrameStore:
+    """Process-wide frame store, created on first use. FRAME_STORE_MAX_MB <= 0 keeps nothing in memory."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FrameStore(max(0, config.FRAME_STORE_MAX_MB) * 1024 * 1024,
+                                config.FRAME_STORE_SPILL_DIR or None,
+                                max(0, config.FRAME_STORE_SPILL_MB) * 1024 * 1024)
+        return _store
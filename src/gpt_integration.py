@@ -1,49 +1,333 @@
 # Module for interfacing with your GPT API
-from openai import OpenAI
+import threading
+from tenacity import (
+    retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+)
+import config
+import metrics
 from config import OPENAI_API_KEY
+from services.rate_limiter import RateLimiter
+from services.analysis_cache import cache_key, get_cache
+from image_preprocessing import preprocess_image, preprocess_signature
+from frame_store import get_frame_store
 import base64
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Created on first use by get_client(); importing this module needs neither the
+# openai package loaded nor an API key
+client = None
+_client_lock = threading.Lock()
+
+# Shared by every thread that calls the API from this process
+rate_limiter = RateLimiter(config.OPENAI_RPM, config.OPENAI_TPM)
+
+MODEL = "gpt-4o"  # gpt-4o supports image inputs
+MAX_TOKENS = 500
+# Bump whenever the prompts below change so cached analyses are not reused
+PROMPT_VERSION = "1"
+
+SYSTEM_PROMPT = (
+    "You are a highly experienced mining site analysis assistant. "
+    "Evaluate images for features such as tailings, water discoloration, "
+    "erosion, and other environmental indicators."
+)
+BATCH_INSTRUCTIONS = (
+    "Analyze each image on its own; do not compare them. Respond with a JSON object "
+    '{"frames": [{"frame": <frame number>, "analysis": "<observations>"}]} '
+    "containing exactly one entry per frame, in order."
+)
+
+
+def get_client():
+    """Shared OpenAI client. Retries are handled below so they share the rate limiter."""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL, max_retries=0)
+    return client
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    """Retry on rate limiting, server errors and transport failures."""
+    import openai
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def _count_retry(retry_state) -> None:
+    metrics.OPENAI_RETRIES.inc(call=retry_state.kwargs.get("call", "analyze"))
+
+
+@retry(
+    retry=retry_if_exception(_is_retryable),
+    wait=wait_random_exponential(multiplier=config.OPENAI_RETRY_BASE_DELAY, max=30),
+    stop=stop_after_attempt(config.OPENAI_MAX_RETRIES + 1),
+    before_sleep=_count_retry,
+    reraise=True,
+)
+def _create_completion(estimated_tokens: int, call: str = "analyze", **kwargs):
+    """Rate-limited chat completion call, retried with backoff on 429/5xx."""
+    rate_limiter.acquire(estimated_tokens)
+    with metrics.OPENAI_REQUEST_SECONDS.time(call=call):
+        response = get_client().chat.completions.create(**kwargs)
+    if response.usage is not None:
+        rate_limiter.reconcile(estimated_tokens, response.usage.total_tokens)
+        metrics.OPENAI_TOKENS.inc(response.usage.prompt_tokens, call=call, kind="prompt")
+        metrics.OPENAI_TOKENS.inc(response.usage.completion_tokens, call=call, kind="completion")
+    return response
+
+
+def _analysis_key(image_bytes: bytes, context: str) -> str:
+    return cache_key(image_bytes, context, MODEL, f"{PROMPT_VERSION}:{preprocess_signature()}")
+
+
+def _image_part(image) -> dict:
+    image_data = base64.b64encode(image.data).decode("utf-8")
+    return {"type": "image_url", "image_url": {
+        "url": f"data:image/jpeg;base64,{image_data}",
+        "detail": image.detail,
+    }}
+
+
+def _cache_lookup(key: str):
+    """Cached analysis for `key`; cache failures are treated as misses."""
+    try:
+        cache = get_cache()
+        return cache.get(key) if cache is not None else None
+    except Exception as e:
+        logger.warning('Analysis cache lookup failed: %s', e)
+        return None
+
+
+def _cache_store(key: str, result: str) -> None:
+    """Persist a successful analysis; a cache failure must not lose the result."""
+    try:
+        cache = get_cache()
+        if cache is not None:
+            cache.put(key, result)
+    except Exception as e:
+        logger.warning('Analysis cache store failed: %s', e)
+
+
+def _prepare(image_path: str, image_bytes: bytes):
+    """Downscale/re-encode a frame for upload, recording its payload size and token estimate."""
+    with metrics.PREPROCESS_SECONDS.time():
+        image = preprocess_image(image_bytes)
+    metrics.IMAGE_PAYLOAD_BYTES.observe(len(image_bytes), kind="original")
+    metrics.IMAGE_PAYLOAD_BYTES.observe(len(image.data), kind="upload")
+    metrics.IMAGE_EST_TOKENS.observe(image.est_tokens)
+    logger.debug('Frame %s: %dx%d, %d → %d payload bytes, ~%d image tokens (detail=%s)',
+                 image_path, image.width, image.height, len(image_bytes),
+                 len(image.data), image.est_tokens, image.detail)
+    return image
 
-# Set your GPT API key.
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 def analyze_image(image_path: str, context: str) -> str:
     """
     Sends an image file path and context to the GPT API for analysis.
     Returns the API's response as a string.
     """
+    start = time.perf_counter()
+    outcome = "ok"
     try:
-        # Read and encode the image to base64
-        with open(image_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode("utf-8")
-        
+        # Frames just extracted or served are in memory; others are read from disk
+        image_bytes = get_frame_store().read(image_path).data
+
+        key = _analysis_key(image_bytes, context)
+        cached = _cache_lookup(key)
+        if cached is not None:
+            outcome = "cached"
+            return cached
+
+        # Downscale/re-encode before upload to cut payload size and vision tokens
+        image = _prepare(image_path, image_bytes)
+        estimated_tokens = config.ANALYZE_EST_TOKENS + image.est_tokens + MAX_TOKENS
+
         # Prepare the message with text and image
-        response = client.chat.completions.create(
-            model="gpt-4o",  # gpt-4o supports image inputs
+        response = _create_completion(
+            estimated_tokens,
+            model=MODEL,
             messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a highly experienced mining site analysis assistant. "
-                        "Evaluate images for features such as tailings, water discoloration, "
-                        "erosion, and other environmental indicators."
-                    )
-                },
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {
                     "role": "user",
                     "content": [
                         {"type": "text", "text": f"Site context: {context}. Provide environmental and mining-related observations."},
-                        {"type": "image_url", "image_url": {
-                            "url": f"data:image/jpeg;base64,{image_data}"
-                        }},
+                        _image_part(image),
                     ]
                 }
             ],
-            max_tokens=500,
+            max_tokens=MAX_TOKENS,
         )
-        
-        return response.choices[0].message.content
+
+        result = response.choices[0].message.content
+        # A refusal or empty completion is an error: never cached, saved or indexed as an analysis
+        if not result or not result.strip():
+            raise ValueError("empty response")
+        _cache_store(key, result)
+        return result
     except Exception as e:
+        outcome = "error"
+        metrics.ANALYZE_ERRORS.inc(error=type(e).__name__)
         return f"Error during API call: {e}"
+    finally:
+        metrics.ANALYZE_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+
+@dataclass
+class _BatchItem:
+    path: str
+    key: str        # analysis cache key
+    image: object   # image_preprocessing.PreparedImage
+
+
+def plan_batches(image_tokens: list[int], max_frames: Optional[int] = None,
+                 token_budget: Optional[int] = None) -> list[list[int]]:
+    """
+    Group consecutive images (given by estimated vision tokens) into requests of at
+    most `max_frames` images whose estimated prompt and reply fit `token_budget`.
+    Returns index lists; an image too large for the budget still gets its own request.
+    """
+    max_frames = max(1, max_frames or config.ANALYZE_BATCH_SIZE)
+    token_budget = token_budget or config.ANALYZE_BATCH_TOKENS
+    batches, current, used = [], [], config.ANALYZE_EST_TOKENS
+    for i, tokens in enumerate(image_tokens):
+        cost = tokens + MAX_TOKENS
+        if current and (len(current) >= max_frames or used + cost > token_budget):
+            batches.append(current)
+            current, used = [], config.ANALYZE_EST_TOKENS
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_response(content: Optional[str], count: int) -> dict[int, str]:
+    """
+    Per-frame analyses (1-based frame number → text) from a batched reply.
+    Malformed JSON yields {}; entries that are missing, empty or out of range are left out.
+    """
+    try:
+        data = json.loads(content or "")
+    except ValueError:
+        return {}
+    entries = data.get("frames") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return {}
+    parsed = {}
+    for position, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            continue
+        number = entry.get("frame", position)
+        analysis = entry.get("analysis")
+        if (isinstance(number, int) and not isinstance(number, bool) and 1 <= number <= count
+                and isinstance(analysis, str) and analysis.strip()):
+            parsed.setdefault(number, analysis.strip())
+    return parsed
+
+
+def _analyze_batch(items: list[_BatchItem], context: str) -> dict[str, str]:
+    """One request for several frames; frames the reply does not cover go through analyze_image."""
+    if len(items) == 1:
+        return {items[0].path: analyze_image(items[0].path, context)}
+
+    start = time.perf_counter()
+    content = [{"type": "text", "text": (
+        f"Site context: {context}. The {len(items)} images below are labelled Frame 1 to "
+        f"Frame {len(items)}. Provide environmental and mining-related observations for each."
+    )}]
+    for number, item in enumerate(items, 1):
+        content.append({"type": "text", "text": f"Frame {number}:"})
+        content.append(_image_part(item.image))
+    max_tokens = MAX_TOKENS * len(items)
+    estimated_tokens = (config.ANALYZE_EST_TOKENS + max_tokens
+                        + sum(item.image.est_tokens for item in items))
+    metrics.ANALYZE_BATCH_FRAMES.observe(len(items))
+
+    try:
+        response = _create_completion(
+            estimated_tokens,
+            call="analyze_batch",
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": f"{SYSTEM_PROMPT} {BATCH_INSTRUCTIONS}"},
+                {"role": "user", "content": content},
+            ],
+            max_tokens=max_tokens,
+            response_format={"type": "json_object"},
+        )
+        parsed = parse_batch_response(response.choices[0].message.content, len(items))
+    except Exception as e:
+        import openai
+        # A rejected request (payload too large, JSON mode unsupported) may still
+        # succeed one frame at a time; anything else would fail the same way again
+        if not isinstance(e, openai.BadRequestError):
+            elapsed = time.perf_counter() - start
+            for _ in items:
+                metrics.ANALYZE_ERRORS.inc(error=type(e).__name__)
+                metrics.ANALYZE_SECONDS.observe(elapsed, outcome="error")
+            return {item.path: f"Error during API call: {e}" for item in items}
+        logger.warning('Batched analysis of %d frames rejected, retrying one at a time: %s', len(items), e)
+        parsed = {}
+
+    results = {}
+    elapsed = time.perf_counter() - start
+    for number, item in enumerate(items, 1):
+        if number in parsed:
+            _cache_store(item.key, parsed[number])
+            results[item.path] = parsed[number]
+            metrics.ANALYZE_SECONDS.observe(elapsed, outcome="ok")
+    missing = [item for number, item in enumerate(items, 1) if number not in parsed]
+    if missing:
+        logger.warning('Batched reply covered %d of %d frames; analyzing %d singly',
+                       len(parsed), len(items), len(missing))
+        metrics.ANALYZE_BATCH_FALLBACKS.inc(len(missing))
+        for item in missing:
+            results[item.path] = analyze_image(item.path, context)
+    return results
+
+
+def analyze_images(image_paths: list[str], context: str) -> dict[str, str]:
+    """
+    Analyze several frames with as few requests as possible. Cached frames are
+    answered directly; the rest are packed into requests of up to
+    ANALYZE_BATCH_SIZE images within ANALYZE_BATCH_TOKENS (see plan_batches) that
+    ask for per-frame JSON. Frames a reply leaves out or garbles fall back to
+    analyze_image. Returns {path: analysis or error text} in input order.
+    """
+    results, pending = {}, []
+    for path in image_paths:
+        start = time.perf_counter()
+        try:
+            image_bytes = get_frame_store().read(path).data
+            key = _analysis_key(image_bytes, context)
+            cached = _cache_lookup(key)
+            if cached is None:
+                image = _prepare(path, image_bytes)
+        except Exception as e:
+            # An unreadable or undecodable frame fails alone, as in analyze_image
+            metrics.ANALYZE_ERRORS.inc(error=type(e).__name__)
+            metrics.ANALYZE_SECONDS.observe(time.perf_counter() - start, outcome="error")
+            results[path] = f"Error during API call: {e}"
+            continue
+        if cached is not None:
+            metrics.ANALYZE_SECONDS.observe(time.perf_counter() - start, outcome="cached")
+            results[path] = cached
+            continue
+        pending.append(_BatchItem(path, key, image))
+
+    for batch in plan_batches([item.image.est_tokens for item in pending]):
+        results.update(_analyze_batch([pending[i] for i in batch], context))
+    return {path: results[path] for path in image_paths}
 
 # To test this module independently, you can uncomment the section below.
 # if __name__ == "__main__":
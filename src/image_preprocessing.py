@@ -0,0 +1,72 @@
+# src/image_preprocessing.py
+# Downscale and re-encode frames before they are base64-encoded for the vision API
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import config
+from lazy import LazyModule
+
+cv2 = LazyModule("cv2")
+
+# Vision pricing: a fixed base cost plus a per-tile cost for 512px tiles (high detail)
+_BASE_TOKENS = 85
+_TILE_TOKENS = 170
+
+
+@dataclass
+class PreparedImage:
+    """JPEG payload ready for upload plus what it is expected to cost."""
+    data: bytes
+    width: int
+    height: int
+    detail: str
+    est_tokens: int
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "auto") -> int:
+    """
+    Estimate vision input tokens for an image of the given size.
+    Mirrors the API's resizing: fit within 2048x2048, then shortest side to 768.
+    """
+    if detail == "low" or width <= 0 or height <= 0:
+        return _BASE_TOKENS
+    scale = min(1.0, 2048 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    tiles = math.ceil(w / 512) * math.ceil(h / 512)
+    return _BASE_TOKENS + _TILE_TOKENS * tiles
+
+
+def preprocess_signature() -> str:
+    """Settings that change the uploaded image; part of the analysis cache key."""
+    return f"{config.IMAGE_MAX_EDGE}:{config.IMAGE_JPEG_QUALITY}:{config.IMAGE_DETAIL}"
+
+
+def preprocess_image(image_bytes: bytes) -> PreparedImage:
+    """
+    Downscale to IMAGE_MAX_EDGE on the long edge and re-encode at IMAGE_JPEG_QUALITY.
+    The original bytes are kept when the image is already small enough, when
+    re-encoding would not shrink it, or when it cannot be decoded.
+    """
+    detail = config.IMAGE_DETAIL
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return PreparedImage(image_bytes, 0, 0, detail, estimate_image_tokens(0, 0, detail))
+
+    height, width = image.shape[:2]
+    max_edge = config.IMAGE_MAX_EDGE
+    if max_edge <= 0 or max(width, height) <= max_edge:
+        return PreparedImage(image_bytes, width, height, detail,
+                             estimate_image_tokens(width, height, detail))
+
+    scale = max_edge / max(width, height)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    resized = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', resized, [cv2.IMWRITE_JPEG_QUALITY, config.IMAGE_JPEG_QUALITY])
+    data = encoded.tobytes() if ok and encoded.size < len(image_bytes) else image_bytes
+    if data is image_bytes:
+        size = (width, height)
+    return PreparedImage(data, size[0], size[1], detail, estimate_image_tokens(*size, detail))
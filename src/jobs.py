@@ -0,0 +1,491 @@
+# src/jobs.py
+# Per-job state (video, frames, analyses, cancellation) shared by every worker through SQLite
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Iterable, Optional
+
+from flask import request, session
+from sqlalchemy import (
+    BigInteger, Boolean, Column, Float, Index, Integer, MetaData, String, Table, Text,
+    create_engine, delete, event, exists, func, literal, select, update
+)
+
+import config
+from frame_store import get_frame_store
+
+_metadata = MetaData()
+_jobs = Table(
+    "jobs", _metadata,
+    Column("id", String(32), primary_key=True),
+    Column("created_at", Float, nullable=False),
+    Column("status", String(16), nullable=False, default="created"),
+    Column("video_path", Text),
+    Column("video_sha256", String(64)),
+    Column("cancel_extract", Boolean, nullable=False, default=False),
+    Column("cancel_analyze", Boolean, nullable=False, default=False),
+)
+_frames = Table(
+    "job_frames", _metadata,
+    Column("job_id", String(32), primary_key=True),
+    Column("path", Text, primary_key=True),
+    Column("position", Integer, nullable=False),
+    # Quality gate scores (see frame_quality.FrameQuality); NULL when the gate was off
+    Column("sharpness", Float),
+    Column("clipped", Float),
+    Column("haze", Float),
+    Column("quality_offset", Integer),
+    # Keyset pagination walks frames of a job in position order
+    Index("ix_job_frames_position", "job_id", "position"),
+)
+_results = Table(
+    "job_results", _metadata,
+    Column("job_id", String(32), primary_key=True),
+    Column("path", Text, primary_key=True),
+    Column("result", Text, nullable=False),
+    Column("duplicate_of", Text),
+)
+
+_uploads = Table(
+    "uploads", _metadata,
+    Column("id", String(32), primary_key=True),
+    Column("job_id", String(32), nullable=False),
+    Column("path", Text, nullable=False),
+    Column("filename", Text),
+    Column("size", BigInteger, nullable=False),
+    Column("offset", BigInteger, nullable=False, default=0),
+    Column("created_at", Float, nullable=False),
+    Column("updated_at", Float),   # last committed chunk; NULL in databases from before it was added
+    Column("sha256", String(64)),  # set once the upload is complete
+)
+
+# Progress messages of background runs (see streams.py), tailed by SSE responses.
+# Event IDs are the Last-Event-ID clients resume from, so they are never reused
+_events = Table(
+    "job_events", _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("job_id", String(32), nullable=False),
+    Column("run", String(32), nullable=False),
+    Column("event", String(16)),                # SSE event name; NULL for plain messages
+    Column("data", Text, nullable=False),
+    Index("ix_job_events_run", "run", "id"),
+    sqlite_autoincrement=True,
+)
+_streams = Table(
+    "job_streams", _metadata,
+    Column("run", String(32), primary_key=True),
+    Column("job_id", String(32), nullable=False),
+    Column("stream", String(16), nullable=False),  # "extract", "analyze" or "pipeline"
+    Column("done", Boolean, nullable=False, default=False),
+    Column("seen_at", Float, nullable=False),      # last time a client was following the run
+    Index("ix_job_streams_job", "job_id", "stream"),
+)
+
+STAGES = ("extract", "analyze")
+# Start of the result text analyze_image returns when the API call failed
+ERROR_PREFIX = "Error during API call"
+
+
+class JobStore:
+    """
+    SQLite-backed registry of jobs. Each job owns a directory under JOBS_DIR
+    holding its uploaded video and extracted frames, so concurrent operators and
+    multiple server processes never share frame files or results.
+    """
+
+    def __init__(self, db_path: str, jobs_dir: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.jobs_dir = jobs_dir
+        self.engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+
+        @event.listens_for(self.engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _):
+            # WAL lets readers (progress streams) run alongside the writer
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA busy_timeout=5000")
+            cur.close()
+
+        _metadata.create_all(self.engine)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Add columns introduced after a database was first created."""
+        with self.engine.begin() as conn:
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(jobs)")}
+            if "video_sha256" not in columns:
+                conn.exec_driver_sql("ALTER TABLE jobs ADD COLUMN video_sha256 VARCHAR(64)")
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(job_frames)")}
+            for name, kind in (("sharpness", "FLOAT"), ("clipped", "FLOAT"), ("haze", "FLOAT"),
+                               ("quality_offset", "INTEGER")):
+                if name not in columns:
+                    conn.exec_driver_sql(f"ALTER TABLE job_frames ADD COLUMN {name} {kind}")
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(uploads)")}
+            if "updated_at" not in columns:
+                conn.exec_driver_sql("ALTER TABLE uploads ADD COLUMN updated_at FLOAT")
+
+    # --- Jobs ---
+
+    def create(self, video_path: Optional[str] = None) -> str:
+        """Register a new job and create its frame directory. Returns the job ID."""
+        job_id = uuid.uuid4().hex
+        with self.engine.begin() as conn:
+            conn.execute(_jobs.insert().values(
+                id=job_id, created_at=time.time(), status="created", video_path=video_path,
+                cancel_extract=False, cancel_analyze=False))
+        os.makedirs(self.frame_dir(job_id), exist_ok=True)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Job row as a dict, or None if it does not exist."""
+        if not job_id:
+            return None
+        with self.engine.connect() as conn:
+            row = conn.execute(select(_jobs).where(_jobs.c.id == job_id)).first()
+        return dict(row._mapping) if row is not None else None
+
+    def delete(self, job_id: str) -> None:
+        """Remove a job, its rows and its directory."""
+        with self.engine.begin() as conn:
+            for table in (_results, _frames, _uploads, _events, _streams):
+                conn.execute(delete(table).where(table.c.job_id == job_id))
+            conn.execute(delete(_jobs).where(_jobs.c.id == job_id))
+        get_frame_store().discard_dir(self.job_dir(job_id))
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def frame_dir(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), "frames")
+
+    def set_status(self, job_id: str, status: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(update(_jobs).where(_jobs.c.id == job_id).values(status=status))
+
+    def set_video(self, job_id: str, video_path: str, sha256: Optional[str] = None) -> None:
+        """Attach the job's video and its content hash (used as a cache key by later stages)."""
+        with self.engine.begin() as conn:
+            conn.execute(update(_jobs).where(_jobs.c.id == job_id)
+                         .values(video_path=video_path, video_sha256=sha256))
+
+    # --- Uploads ---
+
+    def create_upload(self, job_id: str, path: str, size: int, filename: Optional[str] = None) -> str:
+        """Register a chunked upload of `size` bytes into `path`. Returns the upload ID."""
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(_uploads.insert().values(id=upload_id, job_id=job_id, path=path, filename=filename,
+                                                  size=size, offset=0, created_at=now, updated_at=now))
+        return upload_id
+
+    def get_upload(self, upload_id: str) -> Optional[dict]:
+        with self.engine.connect() as conn:
+            row = conn.execute(select(_uploads).where(_uploads.c.id == upload_id)).first()
+        return dict(row._mapping) if row is not None else None
+
+    def advance_upload(self, upload_id: str, expected: int, offset: int) -> bool:
+        """Move the committed offset from `expected` to `offset`; False if another writer got there first."""
+        with self.engine.begin() as conn:
+            result = conn.execute(update(_uploads)
+                                  .where(_uploads.c.id == upload_id, _uploads.c.offset == expected)
+                                  .values(offset=offset, updated_at=time.time()))
+        return result.rowcount == 1
+
+    def delete_upload(self, upload_id: str) -> Optional[dict]:
+        """Forget an upload. Returns its row, or None if it did not exist; the file is left alone."""
+        with self.engine.begin() as conn:
+            row = conn.execute(select(_uploads).where(_uploads.c.id == upload_id)).first()
+            conn.execute(delete(_uploads).where(_uploads.c.id == upload_id))
+        return dict(row._mapping) if row is not None else None
+
+    def expire_uploads(self, idle_seconds: float) -> list[dict]:
+        """Delete incomplete uploads with no chunk committed for `idle_seconds`. Returns their rows."""
+        cutoff = time.time() - idle_seconds
+        stale = (_uploads.c.sha256.is_(None)
+                 & (func.coalesce(_uploads.c.updated_at, _uploads.c.created_at) < cutoff))
+        with self.engine.begin() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(select(_uploads).where(stale))]
+            if rows:
+                conn.execute(delete(_uploads).where(_uploads.c.id.in_([r["id"] for r in rows])))
+        return rows
+
+    def complete_upload(self, upload_id: str, sha256: str) -> None:
+        """Record the finished upload's hash and make its file the job's video."""
+        upload = self.get_upload(upload_id)
+        with self.engine.begin() as conn:
+            conn.execute(update(_uploads).where(_uploads.c.id == upload_id).values(sha256=sha256))
+        self.set_video(upload["job_id"], upload["path"], sha256)
+
+    # --- Cancellation ---
+
+    def request_cancel(self, job_id: str, stage: str) -> None:
+        """Flag a stage ('extract' or 'analyze') of the job for cancellation."""
+        with self.engine.begin() as conn:
+            conn.execute(update(_jobs).where(_jobs.c.id == job_id).values({f"cancel_{stage}": True}))
+
+    def reset_cancel(self, job_id: str, *stages: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(update(_jobs).where(_jobs.c.id == job_id)
+                         .values({f"cancel_{s}": False for s in stages or STAGES}))
+
+    def is_cancelled(self, job_id: str, stages: Iterable[str]) -> bool:
+        columns = [_jobs.c[f"cancel_{s}"] for s in stages]
+        with self.engine.connect() as conn:
+            row = conn.execute(select(*columns).where(_jobs.c.id == job_id)).first()
+        return row is None or any(row)
+
+    # --- Frames ---
+
+    def frames(self, job_id: str) -> list[str]:
+        """Frame paths of the job in extraction order."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(_frames.c.path).where(_frames.c.job_id == job_id)
+                                .order_by(_frames.c.position))
+            return [r.path for r in rows]
+
+    def frames_page(self, job_id: str, after: Optional[int] = None, limit: int = 50) -> list[tuple[str, int]]:
+        """Up to `limit` (path, position) pairs after position `after`, in extraction order."""
+        query = select(_frames.c.path, _frames.c.position).where(_frames.c.job_id == job_id)
+        if after is not None:
+            query = query.where(_frames.c.position > after)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query.order_by(_frames.c.position).limit(limit))
+            return [(r.path, r.position) for r in rows]
+
+    def frame_quality(self, job_id: str, paths: Optional[Iterable[str]] = None) -> dict[str, dict]:
+        """Stored quality scores by frame path (all frames of the job, or only `paths`)."""
+        query = (select(_frames.c.path, _frames.c.sharpness, _frames.c.clipped, _frames.c.haze,
+                        _frames.c.quality_offset)
+                 .where(_frames.c.job_id == job_id, _frames.c.sharpness.is_not(None)))
+        if paths is not None:
+            query = query.where(_frames.c.path.in_(list(paths)))
+        with self.engine.connect() as conn:
+            return {r.path: {"sharpness": r.sharpness, "clipped": r.clipped, "haze": r.haze,
+                             "offset": r.quality_offset}
+                    for r in conn.execute(query)}
+
+    def add_frames(self, job_id: str, paths: Iterable[str], quality: Optional[dict] = None) -> None:
+        """
+        Append frames; positions follow the frame_{idx}.jpg numbering when present.
+        `quality` optionally maps paths to their frame_quality.FrameQuality scores.
+        """
+        quality = quality or {}
+        with self.engine.begin() as conn:
+            start = conn.execute(select(func.coalesce(func.max(_frames.c.position), -1))
+                                 .where(_frames.c.job_id == job_id)).scalar_one() + 1
+            rows = [{"job_id": job_id, "path": p, "position": _position(p, start + i),
+                     **_quality_columns(quality.get(p))}
+                    for i, p in enumerate(paths)]
+            if rows:
+                conn.execute(_frames.insert(), rows)
+
+    def clear_frames(self, job_id: str) -> None:
+        """Forget every frame and result of the job and empty its frame directory."""
+        with self.engine.begin() as conn:
+            for table in (_results, _frames):
+                conn.execute(delete(table).where(table.c.job_id == job_id))
+        frame_dir = self.frame_dir(job_id)
+        get_frame_store().discard_dir(frame_dir)
+        shutil.rmtree(frame_dir, ignore_errors=True)
+        os.makedirs(frame_dir, exist_ok=True)
+
+    def remove_frames(self, job_id: str, paths: Iterable[str]) -> None:
+        paths = list(paths)
+        if not paths:
+            return
+        with self.engine.begin() as conn:
+            for table in (_results, _frames):
+                conn.execute(delete(table).where(table.c.job_id == job_id, table.c.path.in_(paths)))
+
+    # --- Results ---
+
+    def results(self, job_id: str) -> dict[str, str]:
+        """Analyses of the job keyed by frame path, in frame order."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(_results.c.path, _results.c.result)
+                .join(_frames, (_frames.c.job_id == _results.c.job_id) & (_frames.c.path == _results.c.path))
+                .where(_results.c.job_id == job_id).order_by(_frames.c.position))
+            return {r.path: r.result for r in rows}
+
+    def results_page(self, job_id: str, after: Optional[int] = None, limit: int = 50,
+                     keyword: Optional[str] = None, errors: Optional[bool] = None) -> list[dict]:
+        """
+        Up to `limit` analyses after frame position `after`, in frame order, as dicts
+        with path, position, result and duplicate_of. `keyword` keeps results
+        containing it (case-insensitive); `errors` keeps only failed (True) or only
+        successful (False) analyses.
+        """
+        query = (select(_results.c.path, _frames.c.position, _results.c.result, _results.c.duplicate_of)
+                 .join(_frames, (_frames.c.job_id == _results.c.job_id) & (_frames.c.path == _results.c.path))
+                 .where(_results.c.job_id == job_id))
+        if after is not None:
+            query = query.where(_frames.c.position > after)
+        if keyword:
+            query = query.where(_results.c.result.icontains(keyword, autoescape=True))
+        if errors is not None:
+            failed = _results.c.result.startswith(ERROR_PREFIX, autoescape=True)
+            query = query.where(failed if errors else ~failed)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query.order_by(_frames.c.position).limit(limit))
+            return [dict(r._mapping) for r in rows]
+
+    def duplicates(self, job_id: str) -> dict[str, str]:
+        """Frames whose analysis was reused, mapped to their representative."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(_results.c.path, _results.c.duplicate_of)
+                                .where(_results.c.job_id == job_id, _results.c.duplicate_of.is_not(None)))
+            return {r.path: r.duplicate_of for r in rows}
+
+    def save_result(self, job_id: str, path: str, result: str, duplicate_of: Optional[str] = None) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(_results).where(_results.c.job_id == job_id, _results.c.path == path))
+            conn.execute(_results.insert().values(job_id=job_id, path=path, result=result,
+                                                  duplicate_of=duplicate_of))
+
+    def clear_results(self, job_id: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(_results).where(_results.c.job_id == job_id))
+
+    # --- Event streams ---
+
+    def start_stream(self, job_id: str, stream: str) -> str:
+        """Register a new run of one of the job's streams, dropping earlier runs. Returns the run ID."""
+        run = uuid.uuid4().hex
+        with self.engine.begin() as conn:
+            old = select(_streams.c.run).where(_streams.c.job_id == job_id, _streams.c.stream == stream)
+            conn.execute(delete(_events).where(_events.c.run.in_(old)))
+            conn.execute(delete(_streams).where(_streams.c.job_id == job_id, _streams.c.stream == stream))
+            conn.execute(_streams.insert().values(run=run, job_id=job_id, stream=stream, done=False,
+                                                  seen_at=time.time()))
+        return run
+
+    def append_event(self, job_id: str, run: str, data: str, event: Optional[str] = None) -> Optional[int]:
+        """
+        Add a message to a run. Returns its event ID, or None when the run no longer
+        exists: a newer run of the stream replaced it (on any process) or the job was deleted.
+        """
+        row = select(literal(job_id, String), literal(run, String), literal(event, String), literal(data, Text)
+                     ).where(exists().where(_streams.c.run == run))
+        with self.engine.begin() as conn:
+            result = conn.execute(_events.insert().from_select(["job_id", "run", "event", "data"], row))
+            return result.lastrowid if result.rowcount else None
+
+    def events_after(self, run: str, after: int = 0, limit: int = 500) -> list[tuple[int, Optional[str], str]]:
+        """Up to `limit` (id, event, data) messages of a run after event ID `after`, oldest first."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(_events.c.id, _events.c.event, _events.c.data)
+                                .where(_events.c.run == run, _events.c.id > after)
+                                .order_by(_events.c.id).limit(limit))
+            return [tuple(r) for r in rows]
+
+    def event_stream(self, job_id: str, event_id: int) -> Optional[dict]:
+        """Run an event of the job belongs to, as a dict with run, stream, done and last (event ID)."""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(_streams.c.run, _streams.c.stream, _streams.c.done)
+                .join(_events, _events.c.run == _streams.c.run)
+                .where(_events.c.id == event_id, _events.c.job_id == job_id)).first()
+            if row is None:
+                return None
+            last = conn.execute(select(func.max(_events.c.id)).where(_events.c.run == row.run)).scalar_one()
+        return {**row._mapping, "last": last}
+
+    def finish_stream(self, run: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(update(_streams).where(_streams.c.run == run).values(done=True))
+
+    def stream_done(self, run: str) -> bool:
+        """True once a run has ended (or no longer exists)."""
+        with self.engine.connect() as conn:
+            done = conn.execute(select(_streams.c.done).where(_streams.c.run == run)).scalar()
+        return done is None or done
+
+    def touch_stream(self, run: str) -> None:
+        """Record that a client is following the run."""
+        with self.engine.begin() as conn:
+            conn.execute(update(_streams).where(_streams.c.run == run).values(seen_at=time.time()))
+
+    def stream_seen_at(self, run: str) -> Optional[float]:
+        with self.engine.connect() as conn:
+            return conn.execute(select(_streams.c.seen_at).where(_streams.c.run == run)).scalar()
+
+
+def _quality_columns(quality) -> dict:
+    if quality is None:
+        return {"sharpness": None, "clipped": None, "haze": None, "quality_offset": None}
+    scores = quality.as_dict()
+    return {"sharpness": scores["sharpness"], "clipped": scores["clipped"], "haze": scores["haze"],
+            "quality_offset": scores["offset"]}
+
+
+def _position(path: str, default: int) -> int:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    idx = stem.rsplit("_", 1)[-1]
+    return int(idx) if idx.isdigit() else default
+
+
+class CancelToken:
+    """
+    Event-like cancellation flag for one or more stages of a job.
+    `is_set()` polls the job store at most every CANCEL_POLL_INTERVAL seconds, so an
+    abort posted to any server process reaches decoders and analysis workers. The
+    token is picklable and can be handed to extraction worker processes.
+    """
+
+    def __init__(self, job_id: str, stages: Iterable[str] = STAGES):
+        self.job_id = job_id
+        self.stages = tuple(stages)
+        self._set = False
+        self._checked = 0.0
+
+    def set(self) -> None:
+        self._set = True
+
+    def is_set(self) -> bool:
+        if self._set:
+            return True
+        now = time.monotonic()
+        if now - self._checked >= config.CANCEL_POLL_INTERVAL:
+            self._checked = now
+            self._set = get_store().is_cancelled(self.job_id, self.stages)
+        return self._set
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> JobStore:
+    """Process-wide job store, created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore(config.JOBS_DB_PATH, config.JOBS_DIR)
+        return _store
+
+
+def current_job_id(create: bool = True) -> Optional[str]:
+    """
+    Job of the current request: `?job=<id>` if given, else the one in the session.
+    A new job is created (and remembered in the session) when neither exists.
+    """
+    store = get_store()
+    job_id = request.args.get("job") or session.get("job_id")
+    if store.get(job_id) is None:
+        if not create:
+            return None
+        job_id = store.create()
+    session["job_id"] = job_id
+    return job_id
+
+
+def current_frame_dir() -> Optional[str]:
+    """Frame directory of the current request's job, or None without a job."""
+    job_id = current_job_id(create=False)
+    return get_store().frame_dir(job_id) if job_id else None
@@ -1,30 +1,98 @@
 # src/media.py
-# Blueprint for serving extracted frame image files
+# Blueprint for serving extracted frame images and their thumbnails
 
+import io
 import os
-from flask import Blueprint, send_from_directory, current_app
+from flask import Blueprint, current_app, request, send_file, url_for
 from werkzeug.utils import secure_filename
 import config
+from frame_store import get_frame_store
+from jobs import current_frame_dir
+from thumbnails import THUMB_DIRNAME, ensure_thumbnail, frame_for_thumb
 
 # Initialize a blueprint at '/frames' prefix
 media_bp = Blueprint('media', __name__, url_prefix='/frames')
 
+
+def send_cached(path: str):
+    """
+    Send an image from the frame store (reading it through from disk on a miss)
+    with a strong ETag, answering If-None-Match with 304. Returns None when the
+    image does not exist.
+    URLs carrying a ?v= version (see frame_url) are immutable and cached for
+    FRAME_CACHE_MAX_AGE; unversioned ones must be revalidated on every use.
+    Frames belong to a job's session, so shared caches may not store them.
+    """
+    try:
+        stored = get_frame_store().read(path)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        return None
+    response = send_file(io.BytesIO(stored.data), download_name=os.path.basename(path),
+                         etag=stored.etag, conditional=True, max_age=None)
+    response.cache_control.private = True
+    if request.args.get('v'):
+        response.cache_control.max_age = config.FRAME_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _frame_root() -> str:
+    return current_frame_dir() or config.FRAMES_DIR
+
+
 @media_bp.route('/<path:filename>')
 def serve_frame(filename):
     """
-    Route: Serve a sanitized frame image from the configured frames directory.
+    Route: Serve a sanitized full-resolution frame from the current job's frame
+    directory (falling back to the configured frames directory without a job).
     - Ensures only safe filenames are used
     - Returns HTTP 404 if the file does not exist
     """
     # Sanitize filename to prevent directory traversal
     safe_name = secure_filename(filename)
-    frame_root = config.FRAMES_DIR
-
-    # Construct full path and check existence
-    full_path = os.path.join(frame_root, safe_name)
-    if not os.path.isfile(full_path):
+    full_path = os.path.join(_frame_root(), safe_name)
+    response = send_cached(full_path)
+    if response is None:
         current_app.logger.warning('Frame not found: %s', full_path)
         return ('File not found', 404)
+    return response
+
 
-    # Serve the requested frame file
-    return send_from_directory(frame_root, safe_name)
+@media_bp.route('/thumb/<path:filename>')
+def serve_thumb(filename):
+    """
+    Route: Serve a frame thumbnail, generating it on first request for frames
+    extracted without one.
+    """
+    safe_name = secure_filename(filename)
+    frame_root = _frame_root()
+    thumb = os.path.join(frame_root, THUMB_DIRNAME, safe_name)
+    response = send_cached(thumb)
+    if response is None:
+        frame_path = os.path.join(frame_root, frame_for_thumb(safe_name))
+        if os.path.isfile(frame_path) and ensure_thumbnail(frame_path) == thumb:
+            response = send_cached(thumb)
+    if response is None:
+        current_app.logger.warning('Thumbnail not found: %s', thumb)
+        return ('File not found', 404)
+    return response
+
+
+@media_bp.app_template_global()
+def frame_url(frame_path: str, thumb: bool = False) -> str:
+    """
+    Versioned URL of a frame (or its thumbnail); the version changes whenever the
+    file is rewritten, so browsers can cache each URL indefinitely.
+    """
+    if thumb:
+        thumb_file = ensure_thumbnail(frame_path)
+        if thumb_file is not None:
+            return url_for('media.serve_thumb', filename=os.path.basename(thumb_file),
+                           v=os.stat(thumb_file).st_mtime_ns)
+    try:
+        version = os.stat(frame_path).st_mtime_ns
+    except OSError:
+        version = None
+    return url_for('media.serve_frame', filename=os.path.basename(frame_path), v=version)
@@ -0,0 +1,292 @@
+# src/metrics.py
+# In-process counters and histograms exposed as Prometheus text, plus throttled progress logging
+#
+# Every metric lives in this process's REGISTRY. Worker processes (parallel
+# extraction) send a snapshot of what they recorded back to the parent, which
+# merges it, so /metrics covers work done on their behalf.
+
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import config
+
+# Seconds; spans a fast JPEG encode up to a slow, retried API call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value
+                    for key, value in self._values.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing total, e.g. requests or tokens."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def merge(self, values: dict) -> None:
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self.snapshot().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, with sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # Per-bucket (non-cumulative) counts followed by sum and count
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 3)
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the with-block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[-1] if state else 0
+
+    def merge(self, values: dict) -> None:
+        with self._lock:
+            for key, other in values.items():
+                state = self._values.setdefault(key, [0] * len(other))
+                for i, v in enumerate(other):
+                    state[i] += v
+
+    def samples(self) -> Iterator[str]:
+        for key, state in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), state):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(state[-2])}"
+            yield f"{self.name}_count{labels} {state[-1]}"
+
+
+class Registry:
+    """Named metrics of this process."""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Picklable copy of every recorded value, for sending to another process."""
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def merge(self, snapshot: dict) -> None:
+        """Add values recorded elsewhere (see snapshot) to this registry."""
+        for name, values in snapshot.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: tuple = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+@contextmanager
+def recorded() -> Iterator[dict]:
+    """
+    Collect what the with-block records into a snapshot dict for a process-pool
+    worker to return to its parent. Only for worker processes: this process's
+    registry is cleared before and after.
+    """
+    REGISTRY.reset()
+    captured = {}
+    try:
+        yield captured
+    finally:
+        captured.update(REGISTRY.snapshot())
+        REGISTRY.reset()
+
+
+# --- Metric definitions ---
+
+# Extraction
+FRAMES_READ = counter("minewatch_frames_read_total", "Source video frames decoded or skipped")
+FRAMES_SAVED = counter("minewatch_frames_saved_total", "Frames kept and written to disk")
+FRAMES_DROPPED = counter("minewatch_frames_dropped_total", "Scheduled frames skipped by the quality gate")
+FRAMES_SWAPPED = counter("minewatch_frames_swapped_total",
+                         "Scheduled frames replaced by a better nearby frame by the quality gate")
+FRAMES_CACHED = counter("minewatch_frames_cached_total",
+                        "Frames reused from the persistent frame cache instead of decoded")
+FRAME_STORE_LOOKUPS = counter("minewatch_frame_store_lookups_total",
+                              "In-memory frame store lookups: where the bytes were found, or miss/stale", ("result",))
+FRAME_DECODE_SECONDS = histogram("minewatch_frame_decode_seconds",
+                                 "Time to grab and decode one kept or probed frame")
+FRAME_ENCODE_SECONDS = histogram("minewatch_frame_encode_seconds",
+                                 "Time to encode and write one image", ("kind",))
+
+# Frame analysis
+PREPROCESS_SECONDS = histogram("minewatch_image_preprocess_seconds",
+                               "Time to downscale and re-encode a frame before upload")
+IMAGE_PAYLOAD_BYTES = histogram("minewatch_image_payload_bytes",
+                                "Frame size before (original) and after (upload) preprocessing", ("kind",),
+                                buckets=(16384, 32768, 65536, 131072, 262144, 524288, 1048576, 2097152, 4194304))
+IMAGE_EST_TOKENS = histogram("minewatch_image_est_tokens", "Estimated vision tokens of an uploaded frame",
+                             buckets=(85, 255, 425, 765, 1105, 1445, 2000))
+ANALYZE_SECONDS = histogram("minewatch_analyze_seconds",
+                            "End-to-end analyze_image latency, including rate limiting and retries",
+                            ("outcome",))
+ANALYZE_ERRORS = counter("minewatch_analyze_errors_total", "Failed frame analyses", ("error",))
+ANALYZE_BATCH_FRAMES = histogram("minewatch_analyze_batch_frames", "Frames packed into one batched request",
+                                 buckets=(1, 2, 4, 8, 16))
+ANALYZE_BATCH_FALLBACKS = counter("minewatch_analyze_batch_fallbacks_total",
+                                  "Frames re-sent singly because a batched reply did not cover them")
+OPENAI_REQUEST_SECONDS = histogram("minewatch_openai_request_seconds",
+                                   "Latency of one chat completions request attempt", ("call",))
+OPENAI_RETRIES = counter("minewatch_openai_retries_total", "Chat completion attempts retried", ("call",))
+OPENAI_TOKENS = counter("minewatch_openai_tokens_total", "Tokens reported by the API", ("call", "kind"))
+
+# Progress streams
+STREAM_RUNS = counter("minewatch_stream_runs_total", "Background runs behind progress streams by outcome",
+                      ("stream", "outcome"))
+STREAM_CONNECTIONS = counter("minewatch_stream_connections_total",
+                             "Progress stream responses by server mode and whether they resumed a run",
+                             ("mode", "resumed"))
+
+# Final summary
+SUMMARY_SECONDS = histogram("minewatch_summary_seconds", "Total time to produce the final summary",
+                            ("backend", "mode"))
+SUMMARY_FIRST_TOKEN_SECONDS = histogram("minewatch_summary_first_token_seconds",
+                                        "Time until the first streamed summary token", ("backend",))
+SUMMARY_ERRORS = counter("minewatch_summary_errors_total", "Failed summary attempts", ("backend",))
+
+
+class ProgressLog:
+    """
+    Aggregated progress logging for per-item loops: at most one line every
+    PROGRESS_LOG_INTERVAL seconds ("Extracted 240 frames (57.3/s)") instead of
+    a line per item. Completion is left to the caller's own summary line.
+    """
+
+    def __init__(self, logger: logging.Logger, action: str, unit: str = "frames",
+                 total: Optional[int] = None, interval: Optional[float] = None):
+        self.logger = logger
+        self.action = action
+        self.unit = unit
+        self.total = total
+        self.interval = config.PROGRESS_LOG_INTERVAL if interval is None else interval
+        self.count = 0
+        self._start = self._last = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def update(self, n: int = 1) -> None:
+        with self._lock:
+            self.count += n
+            now = time.perf_counter()
+            if now - self._last < self.interval:
+                return
+            self._last = now
+            elapsed = now - self._start
+            of_total = f"/{self.total}" if self.total is not None else ""
+            self.logger.info('%s %d%s %s (%.1f/s)', self.action, self.count, of_total, self.unit,
+                             self.count / elapsed if elapsed > 0 else 0.0)
@@ -0,0 +1,187 @@
+# src/pipeline.py
+# Pipelined extraction and analysis: analysis workers consume frames while decoding continues
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+import config
+import gpt_integration
+from frame_hashing import BKTree, dhash
+from video_processing import ExtractionStats, iter_frames, iter_frames_adaptive
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # sentinel telling analysis workers the producer is finished
+
+
+def run_pipeline(video_path: str, output_dir: str, interval: Optional[int], context: str,
+                 mode: str = 'interval', workers: Optional[int] = None,
+                 analyze: Optional[Callable[[str, str], str]] = None,
+                 stop: Optional[threading.Event] = None,
+                 analyze_batch: Optional[Callable[[list[str], str], dict]] = None,
+                 video_sha256: Optional[str] = None) -> Iterator[tuple]:
+    """
+    Decode frames on a producer thread and analyze them on worker threads as they appear.
+
+    Frames pass through a bounded queue (PIPELINE_QUEUE_SIZE), so a slow API applies
+    backpressure to the decoder instead of piling frames up in memory. Near-duplicate
+    frames are detected as they are produced and reuse their representative's result.
+    With `analyze_batch` (see gpt_integration.analyze_images; the default when no
+    analyzer is given) a worker sends whatever frames are queued, up to
+    ANALYZE_BATCH_SIZE, in one call, so batches fill up exactly when the API is
+    the bottleneck.
+
+    Yields events in the order they happen:
+        ('extracted', frame, quality)                 # quality is a FrameQuality, or None with the gate off
+        ('analyzed', frame, result, representative)   # representative is None unless deduplicated
+        ('error', message)                            # extraction failed; no 'done' follows
+        ('done', extraction_stats) or ('cancelled', extraction_stats)
+    Closing the generator or setting `stop` (any object with is_set()/set(), such as
+    threading.Event or jobs.CancelToken) stops decoding and pending analysis.
+    `video_sha256` is the video's known hash, used as its frame cache key.
+    """
+    workers = workers or config.ANALYZE_WORKERS
+    if analyze is None and analyze_batch is None:
+        analyze_batch = gpt_integration.analyze_images
+    analyze = analyze or gpt_integration.analyze_image
+    batch_size = config.ANALYZE_BATCH_SIZE if analyze_batch is not None else 1
+    stop = stop or threading.Event()
+    stats = ExtractionStats()
+    frames_q = queue.Queue(maxsize=config.PIPELINE_QUEUE_SIZE)
+    events_q = queue.Queue()
+
+    def put_frame(item):
+        # Block on a full queue but keep checking for cancellation
+        while not stop.is_set():
+            try:
+                frames_q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        tree = BKTree()
+        max_distance = config.DEDUP_MAX_DISTANCE
+        if mode == 'adaptive':
+            frames = iter_frames_adaptive(video_path, output_dir, stats=stats, stop=stop.is_set,
+                                          video_sha256=video_sha256)
+        else:
+            frames = iter_frames(video_path, output_dir, interval, stats, stop=stop.is_set,
+                                 video_sha256=video_sha256)
+        try:
+            for frame in frames:
+                if stop.is_set():
+                    break
+                events_q.put(('extracted', frame, stats.quality.get(frame)))
+                key = dhash(frame) if max_distance >= 0 else None
+                match = tree.nearest(key, max_distance) if key is not None else None
+                if match is not None:
+                    events_q.put(('duplicate', frame, match[0]))
+                    continue
+                if key is not None:
+                    tree.add(key, frame)
+                if not put_frame(frame):
+                    break
+        except (FileNotFoundError, IOError) as e:
+            events_q.put(('error', str(e)))
+        finally:
+            frames.close()
+            for _ in range(workers):
+                put_frame(_STOP)
+            events_q.put(('extraction_done',))
+
+    def consume():
+        try:
+            while not stop.is_set():
+                try:
+                    frame = frames_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if frame is _STOP:
+                    break
+                # Take frames that are already waiting, without holding up the first one
+                batch, finished = [frame], False
+                while len(batch) < batch_size:
+                    try:
+                        frame = frames_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if frame is _STOP:
+                        finished = True
+                        break
+                    batch.append(frame)
+                if len(batch) == 1:
+                    results = {batch[0]: analyze(batch[0], context)}
+                else:
+                    results = analyze_batch(batch, context)
+                for frame in batch:
+                    events_q.put(('result', frame, results[frame]))
+                if finished:
+                    break
+        finally:
+            events_q.put(('worker_done',))
+
+    threads = [threading.Thread(target=produce, name='pipeline-extract', daemon=True)]
+    threads += [threading.Thread(target=consume, name=f'pipeline-analyze-{i}', daemon=True)
+                for i in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    results, followers = {}, {}
+    live_workers, extracting = workers, True
+    first_result = None
+    error = None
+    try:
+        while extracting or live_workers:
+            try:
+                event = events_q.get(timeout=0.2)
+            except queue.Empty:
+                # Let an externally set stop flag end the run even while workers are busy
+                if stop.is_set():
+                    break
+                continue
+            kind = event[0]
+            if kind == 'extracted':
+                yield event
+            elif kind == 'duplicate':
+                _, frame, rep = event
+                if rep in results:
+                    yield ('analyzed', frame, results[rep], rep)
+                else:
+                    followers.setdefault(rep, []).append(frame)
+            elif kind == 'result':
+                _, frame, result = event
+                if first_result is None:
+                    first_result = time.perf_counter() - start
+                    logger.info('Pipeline: first analysis after %.2fs', first_result)
+                results[frame] = result
+                yield ('analyzed', frame, result, None)
+                for dup in followers.pop(frame, []):
+                    yield ('analyzed', dup, result, frame)
+            elif kind == 'error':
+                error = event[1]
+                yield event
+            elif kind == 'extraction_done':
+                extracting = False
+            elif kind == 'worker_done':
+                live_workers -= 1
+        if stop.is_set():
+            logger.info('Pipeline cancelled after %d frames extracted, %d analyzed',
+                        stats.frames_saved, len(results))
+            yield ('cancelled', stats)
+            return
+        if error is not None:
+            # Frames extracted before the failure were still analyzed, but the run is not complete
+            logger.warning('Pipeline failed after %d frames extracted, %d analyzed: %s',
+                           stats.frames_saved, len(results), error)
+            return
+        logger.info('Pipeline complete in %.2fs: %d frames extracted, %d sent for analysis',
+                    time.perf_counter() - start, stats.frames_saved, len(results))
+        yield ('done', stats)
+    finally:
+        stop.set()
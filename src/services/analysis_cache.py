@@ -0,0 +1,139 @@
+# services/analysis_cache.py
+# Persistent content-addressed caches for analyze_image results and summary chunks (SQLite via SQLAlchemy)
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import (
+    Column, Float, MetaData, String, Table, Text,
+    create_engine, delete, event, func, select, update
+)
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+_entries = Table(
+    "analysis_cache", _metadata,
+    Column("key", String(64), primary_key=True),
+    Column("result", Text, nullable=False),
+    Column("created_at", Float, nullable=False, index=True),
+    Column("last_used", Float, nullable=False, index=True),
+)
+
+
+def cache_key(image_bytes: bytes, context: str, model: str, prompt_version: str) -> str:
+    """SHA-256 over everything that changes the model's answer."""
+    h = hashlib.sha256()
+    for part in (model.encode(), prompt_version.encode(), (context or "").encode()):
+        h.update(len(part).to_bytes(8, "big"))
+        h.update(part)
+    h.update(image_bytes)
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """
+    SQLite-backed result cache with LRU size and age-based eviction.
+    Hit/miss counters are kept per process for logging and metrics.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_age: float):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+        @event.listens_for(self.engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _):
+            # Batch worker processes and server processes may write the same cache file
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA busy_timeout=5000")
+            cur.close()
+
+        _metadata.create_all(self.engine)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached result for `key`, or None on a miss or expired entry."""
+        now = time.time()
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(_entries.c.result, _entries.c.created_at).where(_entries.c.key == key)
+            ).first()
+            if row is not None and (self.max_age <= 0 or now - row.created_at <= self.max_age):
+                conn.execute(update(_entries).where(_entries.c.key == key).values(last_used=now))
+            else:
+                row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row.result if row is not None else None
+
+    def put(self, key: str, result: str) -> None:
+        """Store a successful result and evict old or excess entries."""
+        now = time.time()
+        with self.engine.begin() as conn:
+            conn.execute(delete(_entries).where(_entries.c.key == key))
+            conn.execute(_entries.insert().values(key=key, result=result, created_at=now, last_used=now))
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float) -> None:
+        if self.max_age > 0:
+            conn.execute(delete(_entries).where(_entries.c.created_at < now - self.max_age))
+        if self.max_entries > 0:
+            count = conn.execute(select(func.count()).select_from(_entries)).scalar_one()
+            if count > self.max_entries:
+                oldest = (select(_entries.c.key).order_by(_entries.c.last_used)
+                          .limit(count - self.max_entries))
+                conn.execute(delete(_entries).where(_entries.c.key.in_(oldest)))
+
+    def stats(self) -> dict:
+        """Current hit/miss counters and entry count."""
+        with self.engine.connect() as conn:
+            size = conn.execute(select(func.count()).select_from(_entries)).scalar_one()
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[AnalysisCache]:
+    """Process-wide cache, created on first use. None when caching is disabled."""
+    global _cache
+    if not config.ANALYSIS_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnalysisCache(config.ANALYSIS_CACHE_PATH,
+                                   config.ANALYSIS_CACHE_MAX_ENTRIES,
+                                   config.ANALYSIS_CACHE_MAX_AGE_DAYS * 86400)
+        return _cache
+
+
+_summary_cache = None
+
+
+def get_summary_cache() -> Optional[AnalysisCache]:
+    """Process-wide cache of intermediate summary chunks. None when disabled."""
+    global _summary_cache
+    if not config.SUMMARY_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _summary_cache is None:
+            _summary_cache = AnalysisCache(config.SUMMARY_CACHE_PATH,
+                                           config.ANALYSIS_CACHE_MAX_ENTRIES,
+                                           config.ANALYSIS_CACHE_MAX_AGE_DAYS * 86400)
+        return _summary_cache
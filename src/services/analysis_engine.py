@@ -0,0 +1,63 @@
+# services/analysis_engine.py
+# Bounded-concurrency frame analysis that yields results as they complete
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional
+
+import config
+import gpt_integration
+from metrics import ProgressLog
+
+logger = logging.getLogger(__name__)
+
+
+def analyze_concurrently(frames: Iterable[str], context: str,
+                         workers: Optional[int] = None,
+                         analyze: Optional[Callable[[str, str], str]] = None,
+                         stop=None,
+                         analyze_batch: Optional[Callable[[list[str], str], dict]] = None,
+                         batch_size: Optional[int] = None) -> Iterator[tuple[str, str]]:
+    """
+    Analyze frames on a thread pool and yield (frame, result) in completion order.
+
+    Rate limiting and retries live in gpt_integration, so `workers` only bounds
+    how many requests are in flight. With `analyze_batch` (a callable like
+    gpt_integration.analyze_images, used when neither analyzer is given) each
+    task covers up to `batch_size` (ANALYZE_BATCH_SIZE) frames, which are
+    yielded together; a batch size of 1 analyzes frames one by one with
+    `analyze`. Closing the generator, or setting `stop` (any object with
+    is_set()), cancels frames that have not started yet and stops waiting on
+    the ones in flight.
+    """
+    workers = workers or config.ANALYZE_WORKERS
+    if analyze is None and analyze_batch is None:
+        analyze_batch = gpt_integration.analyze_images
+    analyze = analyze or gpt_integration.analyze_image
+    batch_size = batch_size or config.ANALYZE_BATCH_SIZE
+    frames = list(frames)
+    if analyze_batch is not None and batch_size > 1:
+        groups = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+        task = lambda group: analyze_batch(group, context)
+    else:
+        groups = [[f] for f in frames]
+        task = lambda group: {group[0]: analyze(group[0], context)}
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analyze')
+    try:
+        futures = {pool.submit(task, group): group for group in groups}
+        logger.info('Analyzing %d frames in %d batches with %d workers', len(frames), len(futures), workers)
+        progress = ProgressLog(logger, 'Analyzed', total=len(frames))
+        pending = set(futures)
+        while pending:
+            if stop is not None and stop.is_set():
+                logger.info('Analysis cancelled with %d batches outstanding', len(pending))
+                return
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                results = future.result()
+                for f in futures[future]:
+                    progress.update()
+                    yield f, results[f]
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,240 @@
+# services/analysis_index.py
+# Persistent full-text index of frame analyses across every run (SQLite FTS5, BM25 ranking)
+#
+# Analyses are added as they are produced, so the index never needs a full
+# rebuild. Each run keeps the entries of its latest analysis, and runs outlive
+# their jobs: deleting a job leaves its analyses searchable. Entries only leave
+# the index when a user removes frames as bad, or when they are older than
+# ANALYSIS_INDEX_RETENTION_DAYS (off by default, so the index grows without it).
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Iterable, Optional
+
+from sqlalchemy import (
+    Column, Float, Index, Integer, MetaData, String, Table, Text,
+    create_engine, delete, event, func, select, text
+)
+from sqlalchemy.dialects.sqlite import insert
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_metadata = MetaData()
+_runs = Table(
+    "index_runs", _metadata,
+    Column("id", String(64), primary_key=True),   # job ID, or "batch:<report dir>"
+    Column("source", String(16), nullable=False),  # "web" or "batch"
+    Column("video_path", Text),
+    Column("video_sha256", String(64)),
+    Column("created_at", Float, nullable=False),
+)
+_analyses = Table(
+    "index_analyses", _metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("run_id", String(64), nullable=False),
+    Column("frame", Text, nullable=False),
+    Column("context", Text, nullable=False, default=""),
+    Column("result", Text, nullable=False),
+    Column("indexed_at", Float, nullable=False),
+    Index("ux_index_analyses_frame", "run_id", "frame", unique=True),
+)
+
+# External-content FTS5 table over index_analyses, kept in sync by triggers.
+# Porter stemming lets "overflow" match "overflowing"; analyses weigh more than contexts.
+_FTS_SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS analysis_fts USING fts5(
+        result, context, content='index_analyses', content_rowid='id',
+        tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS index_analyses_ai AFTER INSERT ON index_analyses BEGIN
+        INSERT INTO analysis_fts(rowid, result, context) VALUES (new.id, new.result, new.context);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS index_analyses_ad AFTER DELETE ON index_analyses BEGIN
+        INSERT INTO analysis_fts(analysis_fts, rowid, result, context)
+        VALUES ('delete', old.id, old.result, old.context);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS index_analyses_au AFTER UPDATE ON index_analyses BEGIN
+        INSERT INTO analysis_fts(analysis_fts, rowid, result, context)
+        VALUES ('delete', old.id, old.result, old.context);
+        INSERT INTO analysis_fts(rowid, result, context) VALUES (new.id, new.result, new.context);
+    END""",
+)
+_RESULT_WEIGHT, _CONTEXT_WEIGHT = 1.0, 0.3
+
+_SEARCH = text("""
+    SELECT a.run_id, a.frame, a.context, a.result, a.indexed_at,
+           r.source, r.video_path,
+           bm25(analysis_fts, :result_weight, :context_weight) AS score,
+           snippet(analysis_fts, 0, '[', ']', '…', 16) AS snippet
+    FROM analysis_fts
+    JOIN index_analyses a ON a.id = analysis_fts.rowid
+    LEFT JOIN index_runs r ON r.id = a.run_id
+    WHERE analysis_fts MATCH :match AND (:run_id IS NULL OR a.run_id = :run_id)
+    ORDER BY score
+    LIMIT :k
+""")
+
+
+def match_expression(query: str) -> Optional[str]:
+    """
+    FTS5 query for free text: every word quoted (so punctuation and keywords like
+    NOT cannot break the syntax) and OR-ed, leaving relevance to BM25.
+    Returns None when the text has no searchable words.
+    """
+    words = re.findall(r"\w+", query or "")
+    if not words:
+        return None
+    return " OR ".join(f'"{w}"' for w in dict.fromkeys(w.lower() for w in words))
+
+
+# Expired entries are looked for at most this often (seconds)
+_PRUNE_INTERVAL = 3600.0
+
+
+class AnalysisIndex:
+    """
+    Runs, frames, contexts and analyses with a BM25-ranked full-text search.
+    With `retention_days` > 0, entries older than that are pruned as new runs are recorded.
+    """
+
+    def __init__(self, path: str, retention_days: float = 0.0):
+        self.retention_days = retention_days
+        self._next_prune = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+        @event.listens_for(self.engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _):
+            # Server processes and batch workers index into the same file
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA busy_timeout=5000")
+            cur.close()
+
+        _metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            for statement in _FTS_SCHEMA:
+                conn.exec_driver_sql(statement)
+
+    def add_run(self, run_id: str, source: str = "web", video_path: Optional[str] = None,
+                video_sha256: Optional[str] = None) -> None:
+        """Record (or update) where a run's frames came from."""
+        values = {"source": source, "video_path": video_path, "video_sha256": video_sha256}
+        with self.engine.begin() as conn:
+            conn.execute(insert(_runs).values(id=run_id, created_at=time.time(), **values)
+                         .on_conflict_do_update(index_elements=[_runs.c.id], set_=values))
+        if self.retention_days > 0 and time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + _PRUNE_INTERVAL
+            self.prune(self.retention_days * 86400)
+
+    def prune(self, max_age: float) -> int:
+        """Drop analyses indexed more than `max_age` seconds ago, and runs left without any. Returns analyses dropped."""
+        cutoff = time.time() - max_age
+        with self.engine.begin() as conn:
+            dropped = conn.execute(delete(_analyses).where(_analyses.c.indexed_at < cutoff)).rowcount
+            conn.execute(delete(_runs).where(
+                _runs.c.created_at < cutoff,
+                ~select(_analyses.c.id).where(_analyses.c.run_id == _runs.c.id).exists()))
+        if dropped:
+            logger.info('Pruned %d analyses older than %.0f days from the search index', dropped, max_age / 86400)
+        return dropped
+
+    def add(self, run_id: str, frame: str, result: str, context: str = "") -> None:
+        """Index one analysis; a frame analyzed again in the same run replaces its entry."""
+        self.add_many(run_id, [(frame, result)], context)
+
+    def add_many(self, run_id: str, entries: Iterable[tuple[str, str]], context: str = "") -> None:
+        """Index (frame, result) pairs of one run in a single transaction."""
+        now = time.time()
+        rows = [{"run_id": run_id, "frame": frame, "context": context or "", "result": result,
+                 "indexed_at": now} for frame, result in entries]
+        if not rows:
+            return
+        stmt = insert(_analyses)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[_analyses.c.run_id, _analyses.c.frame],
+            set_={c: stmt.excluded[c] for c in ("context", "result", "indexed_at")})
+        with self.engine.begin() as conn:
+            conn.execute(stmt, rows)
+
+    def remove(self, run_id: str, frames: Optional[Iterable[str]] = None) -> None:
+        """Drop the given frames of a run, or the whole run."""
+        query = delete(_analyses).where(_analyses.c.run_id == run_id)
+        if frames is not None:
+            frames = list(frames)
+            if not frames:
+                return
+            query = query.where(_analyses.c.frame.in_(frames))
+        with self.engine.begin() as conn:
+            conn.execute(query)
+            if frames is None:
+                conn.execute(delete(_runs).where(_runs.c.id == run_id))
+
+    def search(self, query: str, k: Optional[int] = None, run_id: Optional[str] = None) -> list[dict]:
+        """
+        Top-`k` analyses most relevant to `query`, best first, as dicts with run_id,
+        frame, context, result, source, video_path, score (BM25; lower
+        is better) and a snippet with matches in [brackets].
+        """
+        match = match_expression(query)
+        if match is None:
+            return []
+        k = max(1, min(k or config.SEARCH_TOP_K, config.SEARCH_MAX_K))
+        with self.engine.connect() as conn:
+            rows = conn.execute(_SEARCH, {"match": match, "run_id": run_id, "k": k,
+                                          "result_weight": _RESULT_WEIGHT,
+                                          "context_weight": _CONTEXT_WEIGHT})
+            return [dict(r._mapping) for r in rows]
+
+    def count(self, run_id: Optional[str] = None) -> int:
+        query = select(func.count()).select_from(_analyses)
+        if run_id is not None:
+            query = query.where(_analyses.c.run_id == run_id)
+        with self.engine.connect() as conn:
+            return conn.execute(query).scalar_one()
+
+    def rebuild(self) -> None:
+        """Regenerate the full-text index from the stored analyses (after manual edits)."""
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO analysis_fts(analysis_fts) VALUES ('rebuild')")
+            conn.exec_driver_sql("INSERT INTO analysis_fts(analysis_fts) VALUES ('optimize')")
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[AnalysisIndex]:
+    """Process-wide index, created on first use. None when indexing is disabled."""
+    global _index
+    if not config.ANALYSIS_INDEX_ENABLED:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = AnalysisIndex(config.ANALYSIS_INDEX_PATH, config.ANALYSIS_INDEX_RETENTION_DAYS)
+        return _index
+
+
+def index_run(run_id: str, source: str, video_path: Optional[str] = None,
+              video_sha256: Optional[str] = None) -> None:
+    """Record a run in the process-wide index, if enabled. Failures are logged, never raised."""
+    try:
+        index = get_index()
+        if index is not None:
+            index.add_run(run_id, source, video_path, video_sha256)
+    except Exception as e:
+        logger.warning('Search index run %s not recorded: %s', run_id, e)
+
+
+def index_analysis(run_id: str, frame: str, result: str, context: str = "") -> None:
+    """Add one analysis to the process-wide index, if enabled. Failures are logged, never raised."""
+    try:
+        index = get_index()
+        if index is not None:
+            index.add(run_id, frame, result, context)
+    except Exception as e:
+        logger.warning('Search indexing failed for %s: %s', frame, e)
@@ -1,38 +1,319 @@
 # services/llm_service.py
-import openai
-from langchain import OpenAI, LLMChain, PromptTemplate
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Iterator, Optional
+
+import config
+import metrics
+from services.analysis_cache import cache_key, get_summary_cache
+
+logger = logging.getLogger(__name__)
 
 # LangChain setup
 _template = """You are a mining site expert.
-Summarize the following analyses into a final conclusion:
+Summarize the following analyses into a final conclusion.
+Keep the frame citations in square brackets for every conclusion:
+
+{combined_analyses}
+"""
+# Map step: condense one budget-sized chunk of frame analyses
+_map_template = """You are a mining site expert.
+Condense the following drone frame analyses into key findings.
+Cite the supporting frames in square brackets for every finding, e.g. [frame_3, frame_7]:
+
+{combined_analyses}
+"""
+# Reduce step: merge partial summaries produced by the map step or an earlier reduce
+_reduce_template = """You are a mining site expert.
+Merge the following partial summaries into one set of key findings.
+Keep the frame citations in square brackets for every finding:
 
 {combined_analyses}
 """
-_prompt = PromptTemplate(
-    input_variables=["combined_analyses"],
-    template=_template
-)
-_llm = OpenAI(model_name="gpt-4", temperature=0)
-_chain = LLMChain(llm=_llm, prompt=_prompt)
+_templates = {"final": _template, "map": _map_template, "reduce": _reduce_template}
+SUMMARY_MODEL = "gpt-4"
+# Bump whenever the templates above change so cached chunk summaries are not reused
+SUMMARY_PROMPT_VERSION = "1"
+
+# LangChain, the OpenAI client and the tokenizer are loaded on first use (get_llm,
+# get_client, count_tokens), so importing this module is cheap and needs no API key
+_llm = None
+_chains = {}
+_client = None
+_encoding = None
+_lock = threading.Lock()
+
+
+def get_llm():
+    """Shared LangChain chat model."""
+    global _llm
+    with _lock:
+        if _llm is None:
+            from langchain_community.chat_models import ChatOpenAI
+            _llm = ChatOpenAI(model_name=SUMMARY_MODEL, temperature=0, openai_api_key=config.OPENAI_API_KEY,
+                              openai_api_base=config.OPENAI_BASE_URL)
+        return _llm
+
+
+def _get_chain(kind: str):
+    """LLMChain for one prompt kind, built on the shared chat model."""
+    llm = get_llm()
+    with _lock:
+        chain = _chains.get(kind)
+        if chain is None or chain.llm is not llm:
+            from langchain.chains import LLMChain
+            from langchain_core.prompts import PromptTemplate
+            prompt = PromptTemplate(input_variables=["combined_analyses"], template=_templates[kind])
+            chain = _chains[kind] = LLMChain(llm=llm, prompt=prompt)
+        return chain
+
+
+def get_client():
+    """Shared OpenAI client for the direct fallback."""
+    global _client
+    with _lock:
+        if _client is None:
+            from openai import OpenAI
+            _client = OpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL)
+        return _client
+
+
+def _get_encoding():
+    """tiktoken encoder, or False when tiktoken is not installed (it is optional)."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text` (exact with tiktoken, ~4 characters per token otherwise)."""
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def frame_label(path: str) -> str:
+    """Short frame name used for citations, e.g. 'frame_12'."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def cited_entries(analysis_results: dict[str, str]) -> list[str]:
+    """
+    One '[frames] analysis' line per distinct analysis, in frame order.
+    Frames that share an identical result (e.g. near-duplicates) share one entry.
+    """
+    grouped = {}
+    for path, text in analysis_results.items():
+        grouped.setdefault(text, []).append(frame_label(path))
+    return [f"[{', '.join(labels)}] {text}" for text, labels in grouped.items()]
+
+
+def _is_cut_point(entry: str, cost: int, budget: int) -> bool:
+    """
+    Content-defined chunk boundary: decided by the entry's own hash, with odds
+    proportional to its size so chunks average about half the budget. Because a
+    boundary never depends on neighbouring entries, removing frames only changes
+    the chunks that held them and their cached summaries stay valid elsewhere.
+    """
+    h = int.from_bytes(hashlib.sha256(entry.encode()).digest()[:8], "big") / 2 ** 64
+    return h < 2 * cost / budget
+
+
+def chunk_entries(entries: list[str], budget: int) -> list[list[str]]:
+    """Split consecutive entries at content-defined cut points, keeping chunks within `budget` tokens."""
+    chunks, current, used = [], [], 0
+    for entry in entries:
+        cost = count_tokens(entry)
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(entry)
+        used += cost
+        if _is_cut_point(entry, cost, budget):
+            chunks.append(current)
+            current, used = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass
+class SummaryStats:
+    """Timing of one streamed summary, in seconds since the request started."""
+    backend: str = ""
+    tokens: int = 0
+    first_token: Optional[float] = None
+    elapsed: float = 0.0
+
+
+# --- Backends: one blocking call and one streaming call per backend ---
+
+def _run_chain(kind: str, combined: str) -> str:
+    return _get_chain(kind).run(combined_analyses=combined)
+
+
+def _stream_chain(kind: str, combined: str) -> Iterator[str]:
+    for chunk in get_llm().stream(_templates[kind].format(combined_analyses=combined)):
+        if chunk.content:
+            yield chunk.content
+
+
+def _messages(kind: str, combined: str) -> list[dict]:
+    return [
+        {"role": "system", "content": "You are a mining site expert."},
+        {"role": "user", "content": _templates[kind].format(combined_analyses=combined)},
+    ]
+
+
+def _run_openai(kind: str, combined: str, max_tokens: int = 300) -> str:
+    with metrics.OPENAI_REQUEST_SECONDS.time(call="summary"):
+        resp = get_client().chat.completions.create(
+            model=SUMMARY_MODEL, messages=_messages(kind, combined), max_tokens=max_tokens)
+    if resp.usage is not None:
+        metrics.OPENAI_TOKENS.inc(resp.usage.prompt_tokens, call="summary", kind="prompt")
+        metrics.OPENAI_TOKENS.inc(resp.usage.completion_tokens, call="summary", kind="completion")
+    return resp.choices[0].message.content
+
+
+def _stream_openai(kind: str, combined: str, max_tokens: int = 300) -> Iterator[str]:
+    stream = get_client().chat.completions.create(
+        model=SUMMARY_MODEL, messages=_messages(kind, combined), max_tokens=max_tokens, stream=True)
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+BACKENDS = {
+    "langchain": (_run_chain, _stream_chain),
+    "openai": (_run_openai, _stream_openai),
+}
+
+
+def cached(summarize: Callable[[str, str], str], backend: str) -> Callable[[str, str], str]:
+    """
+    Wrap a summarize(kind, text) call with the persistent chunk summary cache,
+    keyed by the backend, model, prompt version, kind and exact input text.
+    Cache failures fall through to the LLM.
+    """
+    cache = get_summary_cache()
+    if cache is None:
+        return summarize
+
+    def call(kind: str, combined: str) -> str:
+        key = cache_key(combined.encode(), kind, f"{backend}:{SUMMARY_MODEL}", SUMMARY_PROMPT_VERSION)
+        try:
+            hit = cache.get(key)
+        except Exception as e:
+            logger.warning('Summary cache lookup failed: %s', e)
+            hit = None
+        if hit is not None:
+            return hit
+        result = summarize(kind, combined)
+        try:
+            cache.put(key, result)
+        except Exception as e:
+            logger.warning('Summary cache store failed: %s', e)
+        return result
+
+    return call
+
+
+def reduce_entries(entries: list[str], summarize: Callable[[str, str], str]) -> list[str]:
+    """
+    Shrink entries until they fit one SUMMARY_CHUNK_TOKENS budget.
+
+    Entries are packed into chunks that are summarized in parallel (map), and the
+    partial summaries are packed and summarized again (reduce) until they fit. Each
+    level shrinks the input by roughly the chunk fan-out, so latency grows with
+    log(frames). Frame citations are carried through every level for provenance.
+    `summarize(kind, text)` performs one LLM call; kind is 'map' or 'reduce'.
+    """
+    budget = config.SUMMARY_CHUNK_TOKENS
+    level = 0
+    with ThreadPoolExecutor(max_workers=config.SUMMARY_WORKERS) as pool:
+        while (len(entries) > 1 and level < config.SUMMARY_MAX_LEVELS
+               and count_tokens("\n".join(entries)) > budget):
+            chunks = chunk_entries(entries, budget)
+            kind = "map" if level == 0 else "reduce"
+            logger.info('Summary level %d: %d entries → %d %s calls', level, len(entries), len(chunks), kind)
+            entries = list(pool.map(lambda chunk: summarize(kind, "\n".join(chunk)), chunks))
+            level += 1
+    return entries
+
+
+def map_reduce_summary(entries: list[str], summarize=None) -> str:
+    """Summarize entries hierarchically (see reduce_entries), ending with one 'final' call."""
+    summarize = summarize or _run_chain
+    return summarize("final", "\n".join(reduce_entries(entries, summarize)))
+
+
+def _summarize(analysis_results: dict[str, str], backend: str, summarize) -> str:
+    start = time.perf_counter()
+    try:
+        entries = reduce_entries(cited_entries(analysis_results), cached(summarize, backend))
+        result = summarize("final", "\n".join(entries))
+    except Exception:
+        metrics.SUMMARY_ERRORS.inc(backend=backend)
+        raise
+    metrics.SUMMARY_SECONDS.observe(time.perf_counter() - start, backend=backend, mode="blocking")
+    return result
+
 
 def summarize_with_chain(analysis_results: dict[str, str]) -> str:
-    combined = "\n".join(analysis_results.values())
-    return _chain.run(combined_analyses=combined)
+    return _summarize(analysis_results, "langchain", _run_chain)
 
 #OpenAI fallback
 def summarize_with_openai(analysis_results: dict[str, str], max_tokens=300) -> str:
-    combined = "\n".join(analysis_results.values())
-    prompt = (
-        "You are a mining site expert.\n"
-        "Summarize the following analyses into a final conclusion:\n\n"
-        + combined
-    )
-    resp = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a mining site expert."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=max_tokens
-    )
-    return resp.choices[0].message.content
+    return _summarize(analysis_results, "openai", partial(_run_openai, max_tokens=max_tokens))
+
+
+def stream_summary(analysis_results: dict[str, str], backend: Optional[str] = None,
+                   stats: Optional[SummaryStats] = None) -> Iterator[str]:
+    """
+    Yield the final conclusion piece by piece as the model generates it.
+
+    Map/reduce levels run as blocking calls; only the final call is streamed. With
+    no explicit `backend`, SUMMARY_BACKEND is tried first and the direct OpenAI
+    backend takes over if it fails before producing any output. `stats` receives
+    time-to-first-token and total generation time.
+    """
+    stats = stats if stats is not None else SummaryStats()
+    start = time.perf_counter()
+    order = [backend] if backend else list(dict.fromkeys([config.SUMMARY_BACKEND, "openai"]))
+    entries = cited_entries(analysis_results)
+    for name in order:
+        run, stream = BACKENDS[name]
+        stats.backend = name
+        try:
+            combined = "\n".join(reduce_entries(entries, cached(run, name)))
+            for piece in stream("final", combined):
+                if stats.first_token is None:
+                    stats.first_token = time.perf_counter() - start
+                stats.tokens += 1
+                yield piece
+            break
+        except Exception as e:
+            metrics.SUMMARY_ERRORS.inc(backend=name)
+            # Switching backends mid-answer would garble the output
+            if stats.tokens or name == order[-1]:
+                raise
+            logger.warning('Summary via %s failed (%s); falling back to %s',
+                           name, e, order[order.index(name) + 1])
+    stats.elapsed = time.perf_counter() - start
+    metrics.SUMMARY_SECONDS.observe(stats.elapsed, backend=stats.backend, mode="stream")
+    if stats.first_token is not None:
+        metrics.SUMMARY_FIRST_TOKEN_SECONDS.observe(stats.first_token, backend=stats.backend)
+    logger.info('Summary via %s: first token after %.2fs, %d chunks in %.2fs',
+                stats.backend, stats.first_token or 0.0, stats.tokens, stats.elapsed)
@@ -0,0 +1,33 @@
+// final.js
+// Renders the final conclusion token by token from the /final_stream SSE endpoint
+
+document.addEventListener('DOMContentLoaded', () => {
+  const output = document.getElementById('final-conclusion');
+  const status = document.getElementById('final-status');
+  if (!output || !status) return;
+
+  const source = new EventSource(output.dataset.streamUrl);
+
+  // Append each generated piece as it arrives
+  source.addEventListener('token', (e) => {
+    output.textContent += e.data;
+  });
+
+  // Show timing once generation is finished
+  source.addEventListener('done', (e) => {
+    source.close();
+    try {
+      const stats = JSON.parse(e.data);
+      status.textContent = `First token after ${stats.ttft.toFixed(1)}s, ` +
+                           `complete in ${stats.elapsed.toFixed(1)}s`;
+    } catch (err) {
+      status.textContent = '';
+    }
+  });
+
+  // Server-reported failure (named "error" event carries data)
+  source.addEventListener('error', (e) => {
+    source.close();
+    status.textContent = e.data || 'Connection lost while summarizing.';
+  });
+});
@@ -10,15 +10,99 @@ document.addEventListener('DOMContentLoaded', () => {
   const extractBtn     = document.getElementById('extract-btn');
   const analyzeBtn     = document.getElementById('analyze-btn');
   const preRemoveBtn = document.getElementById('pre-remove-btn');
+  const pipelineBtn    = document.getElementById('pipeline-btn');
   const viewLinks      = Array.from(document.querySelectorAll('a'));
 
   // Enable or disable page controls during upload/extraction
   function setPageDisabled(disabled) {
-    [fileInput, extractBtn, analyzeBtn, preRemoveBtn].forEach(el => el && (el.disabled = disabled));
+    [fileInput, extractBtn, analyzeBtn, preRemoveBtn, pipelineBtn].forEach(el => el && (el.disabled = disabled));
     viewLinks.forEach(a => a.style.pointerEvents = disabled ? 'none' : '');
   }
 
-  let xhrUpload;
+  // --- Chunked, resumable upload (see uploads.py) ---
+  const CHUNK_RETRIES = 5;
+  let uploadAbort = null;  // AbortController of the running upload
+
+  // SHA-256 hex of a chunk; null where WebCrypto is unavailable (plain http on a LAN)
+  async function sha256Hex(blob) {
+    if (!(window.crypto && crypto.subtle)) return null;
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+  }
+
+  async function uploadStatus(uploadId, signal) {
+    const resp = await fetch(`/upload/${uploadId}`, { signal });
+    return resp.ok ? resp.json() : null;
+  }
+
+  // Upload a file chunk by chunk, resuming an earlier attempt at the same file
+  async function uploadChunked(file, signal, onProgress) {
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    const savedId   = localStorage.getItem(resumeKey);
+    let state = savedId ? await uploadStatus(savedId, signal) : null;
+    if (!state || state.complete) {
+      const resp = await fetch('/upload/init', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size }),
+        signal
+      });
+      state = await resp.json();
+      if (!resp.ok) throw new Error(state.message);
+      localStorage.setItem(resumeKey, state.upload_id);
+    }
+
+    const chunkSize = state.chunk_size || 8 * 1024 * 1024;
+    let offset   = state.offset;
+    let failures = 0;
+    onProgress(offset / file.size);
+
+    while (true) {
+      const chunk   = file.slice(offset, offset + chunkSize);
+      const headers = { 'Content-Type': 'application/octet-stream' };
+      const digest  = await sha256Hex(chunk);
+      if (digest) headers['X-Chunk-SHA256'] = digest;
+
+      let resp, body;
+      try {
+        resp = await fetch(`/upload/${state.upload_id}?offset=${offset}`,
+                           { method: 'PUT', headers, body: chunk, signal });
+        body = await resp.json();
+      } catch (err) {
+        // Dropped connection: back off, then ask the server where to continue
+        if (signal.aborted || ++failures > CHUNK_RETRIES) throw err;
+        await new Promise(r => setTimeout(r, 1000 * 2 ** failures));
+        const current = await uploadStatus(state.upload_id, signal).catch(() => null);
+        if (current) offset = current.offset;
+        continue;
+      }
+
+      if (resp.status === 409 || resp.status === 422) {
+        // Offset out of sync or corrupted chunk: resend from the committed offset
+        if (body.complete) break;
+        if (++failures > CHUNK_RETRIES) throw new Error(body.message);
+        offset = body.offset;
+        continue;
+      }
+      if (!resp.ok) throw new Error(body.message);
+
+      failures = 0;
+      offset   = body.offset;
+      onProgress(offset / file.size);
+      if (body.complete) break;
+    }
+    localStorage.removeItem(resumeKey);
+  }
+
+  // Restore the upload controls after an upload ends
+  function resetUploadUI() {
+    setPageDisabled(false);
+    fileInput.value            = '';
+    fileInput.style.display    = '';
+    cancelUpload.style.display = 'none';
+    progressBar.style.display  = 'none';
+    progressBar.value          = 0;
+  }
 
   if (fileInput && progressBar && statusText) {
     // Handle new file selection and upload
@@ -29,69 +113,29 @@ document.addEventListener('DOMContentLoaded', () => {
       setPageDisabled(true);
       fileInput.style.display    = 'none';
       cancelUpload.style.display = 'inline-block';
+      progressBar.style.display  = 'block';
 
-      // Prepare form data and start XHR upload
-      const formData = new FormData();
-      formData.append('video', file);
-      xhrUpload = new XMLHttpRequest();
-      xhrUpload.open('POST', '/upload', true);
-
-      // Update progress bar
-      xhrUpload.upload.onprogress = (e) => {
-        if (e.lengthComputable) {
-          progressBar.style.display = 'block';
-          progressBar.value = Math.round((e.loaded / e.total) * 100);
-        }
-      };
-
-      // Handle upload completion
-      xhrUpload.onload = () => {
-        setPageDisabled(false);
-        fileInput.value            = '';
-        fileInput.style.display    = '';
-        cancelUpload.style.display = 'none';
-        progressBar.style.display  = 'none';
-        progressBar.value          = 0;
-
-        if (xhrUpload.status === 200) {
-          try {
-            const resp = JSON.parse(xhrUpload.responseText);
-            statusText.textContent = resp.success
-              ? resp.message
-              : 'Upload failed: ' + resp.message;
-          } catch (err) {
-            console.error('Upload JSON parse error', err);
-            statusText.textContent = 'Unexpected server response.';
-          }
-        } else {
-          statusText.textContent = 'Upload error: ' + xhrUpload.statusText;
-        }
-        setTimeout(() => { statusText.textContent = ''; }, 3000);
-      };
-
-      // Handle network errors
-      xhrUpload.onerror = () => {
-        setPageDisabled(false);
-        fileInput.style.display    = '';
-        cancelUpload.style.display = 'none';
-        progressBar.style.display  = 'none';
-        progressBar.value          = 0;
-        statusText.textContent     = 'Upload network error.';
-      };
-
-      xhrUpload.send(formData);
+      uploadAbort = new AbortController();
+      uploadChunked(file, uploadAbort.signal, (fraction) => {
+        progressBar.value = Math.round(fraction * 100);
+      })
+        .then(() => { statusText.textContent = 'Video uploaded successfully'; })
+        .catch((err) => {
+          if (uploadAbort.signal.aborted) return;
+          console.error('Upload error', err);
+          statusText.textContent = 'Upload error: ' + err.message + ' (select the file again to resume)';
+        })
+        .finally(() => {
+          resetUploadUI();
+          setTimeout(() => { statusText.textContent = ''; }, 3000);
+        });
     });
 
-    // Allow user to cancel an ongoing upload
+    // Allow user to cancel an ongoing upload; selecting the same file later resumes it
     cancelUpload.addEventListener('click', () => {
-      if (xhrUpload) xhrUpload.abort();
-      statusText.textContent     = 'Upload canceled.';
-      setPageDisabled(false);
-      fileInput.value            = '';
-      fileInput.style.display    = '';
-      cancelUpload.style.display = 'none';
-      progressBar.style.display  = 'none';
-      progressBar.value          = 0;
+      if (uploadAbort) uploadAbort.abort();
+      statusText.textContent = 'Upload canceled.';
+      resetUploadUI();
     });
   } else {
     console.warn('Upload elements not found in DOM');
@@ -99,9 +143,99 @@ document.addEventListener('DOMContentLoaded', () => {
 
   // --- Frame Extraction Section (SSE) ---
   const intervalInput = document.getElementById('interval');
+  const adaptiveInput = document.getElementById('adaptive-sampling');
   const extractProg   = document.getElementById('extract-progress');
   let extracting      = false;
 
+  // --- Frame Preview (paged from /api/frames) ---
+  const previewGrid = document.getElementById('preview-grid');
+  let previewCursor = null;
+  let previewDone   = true;
+  let previewBusy   = false;
+
+  // Append the next page of frame thumbnails to the preview grid
+  function loadPreviewPage() {
+    if (previewBusy || previewDone) return;
+    previewBusy = true;
+    const params = previewCursor ? `?cursor=${encodeURIComponent(previewCursor)}` : '';
+    fetch(`/api/frames${params}`)
+      .then(response => response.json())
+      .then(page => {
+        page.items.forEach(frame => {
+          const item = document.createElement('div');
+          item.classList.add('frame-item');
+
+          const cb = document.createElement('input');
+          cb.type        = 'checkbox';
+          cb.value       = frame.name;
+          cb.classList.add('frame-checkbox');
+
+          // Thumbnail in the grid; full resolution opens on click
+          const link = document.createElement('a');
+          link.href   = frame.url;
+          link.target = '_blank';
+
+          const img = document.createElement('img');
+          img.src      = frame.thumb;
+          img.width    = 160;
+          img.loading  = 'lazy';
+          img.decoding = 'async';
+
+          link.appendChild(img);
+          item.append(cb, link);
+          previewGrid.appendChild(item);
+        });
+        previewCursor = page.next_cursor;
+        previewDone   = !previewCursor;
+      })
+      .finally(() => { previewBusy = false; });
+  }
+
+  // Reset the preview grid and load pages as its end scrolls into view
+  function showPreview() {
+    const removeB = document.getElementById('pre-remove-btn');
+    previewGrid.innerHTML = '';
+    previewCursor = null;
+    previewDone   = false;
+    loadPreviewPage();
+
+    if (!previewGrid.dataset.wired) {
+      previewGrid.dataset.wired = '1';
+      const sentinel = document.createElement('div');
+      previewGrid.after(sentinel);
+      new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) loadPreviewPage();
+      }, { rootMargin: '600px' }).observe(sentinel);
+
+      // Wire up the Remove button in preview
+      removeB.addEventListener('click', () => {
+        const checked = Array.from(previewGrid.querySelectorAll('.frame-checkbox:checked'));
+        if (!checked.length) return alert('Select frames first.');
+        removeB.disabled = true;
+
+        fetch('/remove_frames', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ frames: checked.map(cb => cb.value) })
+        })
+        .then(r => r.json())
+        .then(data => {
+          if (data.success) {
+            checked.forEach(cb => cb.closest('.frame-item').remove());
+          } else {
+            alert('Remove error: ' + data.message);
+          }
+        })
+        .catch(() => alert('Network error during removal'))
+        .finally(() => { removeB.disabled = false; });
+      });
+    }
+
+    // Enable remove and analyze buttons
+    removeB.disabled    = false;
+    analyzeBtn.disabled = false;
+  }
+
   if (extractBtn && intervalInput && extractProg) {
     extractBtn.addEventListener('click', (e) => {
       e.preventDefault();
@@ -117,6 +251,7 @@ document.addEventListener('DOMContentLoaded', () => {
       }
 
       const interval = intervalInput.value.trim();
+      const mode     = adaptiveInput && adaptiveInput.checked ? 'adaptive' : 'interval';
       extractProg.textContent = '';
 
       setPageDisabled(true);
@@ -131,7 +266,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
       // Start Server-Sent Events connection
       try {
-        const src = new EventSource(`/extract?interval=${encodeURIComponent(interval)}`);
+        const src = new EventSource(`/extract?interval=${encodeURIComponent(interval)}&mode=${mode}`);
         window._sseSource = src;
 
         src.onmessage = (evt) => {
@@ -146,72 +281,26 @@ document.addEventListener('DOMContentLoaded', () => {
 
             document.getElementById('preview-section').style.display = 'block';
 
-            // Fetch and render frame thumbnails
-            fetch('/preview_frames')
-              .then(response => response.json())
-              .then(json => {
-                const grid     = document.getElementById('preview-grid');
-                const removeB  = document.getElementById('pre-remove-btn');
-                const analyzeB = analyzeBtn
-
-                grid.innerHTML = '';
-
-                json.frames.forEach(name => {
-                  const item = document.createElement('div');
-                  item.classList.add('frame-item');
-
-                  const cb = document.createElement('input');
-                  cb.type        = 'checkbox';
-                  cb.value       = name;
-                  cb.classList.add('frame-checkbox');
-
-                  const img = document.createElement('img');
-                  img.src     = `/frames/${name}`;
-                  img.width   = 160;
-                  img.loading = 'lazy';
-
-                  item.append(cb, img);
-                  grid.appendChild(item);
-                });
-
-                // Enable remove and analyze buttons
-                removeB.disabled  = false;
-                analyzeB.disabled = false;
-
-                // Wire up the Remove button in preview
-                removeB.addEventListener('click', () => {
-                  const toRemove = Array.from(
-                    grid.querySelectorAll('.frame-checkbox:checked')
-                  ).map(cb => cb.value);
-
-                  if (!toRemove.length) return alert('Select frames first.');
-                  removeB.disabled = true;
-
-                  fetch('/remove_frames', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ frames: toRemove })
-                  })
-                  .then(r => r.json())
-                  .then(data => {
-                    if (data.success) {
-                      toRemove.forEach(name => {
-                        const el = grid.querySelector(`.frame-checkbox[value="${name}"]`).closest('.frame-item');
-                        el.remove();
-                      });
-                    } else {
-                      alert('Remove error: ' + data.message);
-                    }
-                  })
-                  .catch(() => alert('Network error during removal'))
-                  .finally(() => { removeB.disabled = false; });
-                });
-              });
+            showPreview();
           }
         };
 
-        // Handle SSE errors
+        // Sent once the run is over; also ends aborted or failed runs
+        src.addEventListener('end', () => {
+          src.close();
+          if (extracting) {
+            setPageDisabled(false);
+            extractBtn.textContent = 'Extract Frames';
+            extracting = false;
+          }
+        });
+
+        // Handle SSE errors; the browser reconnects and resumes from the last event by itself
         src.onerror = (err) => {
+          if (src.readyState === EventSource.CONNECTING) {
+            extractProg.textContent += "Connection lost, reconnecting…\n";
+            return;
+          }
           console.error('SSE error:', err);
           extractProg.textContent += "Error in extraction stream\n";
           window._sseSource.close();
@@ -270,7 +359,20 @@ document.addEventListener('DOMContentLoaded', () => {
         }
       };
 
+      src.addEventListener('end', () => {
+        src.close();
+        if (analyzing) {
+          setPageDisabled(false);
+          analyzeBtn.textContent  = 'Run Analysis';
+          analyzing               = false;
+        }
+      });
+
       src.onerror = (err) => {
+        if (src.readyState === EventSource.CONNECTING) {
+          analysisProg.textContent += "Connection lost, reconnecting…\n";
+          return;
+        }
         console.error('SSE error:', err);
         analysisProg.textContent += "Error in analysis stream\n";
         window._analysisSource.close();
@@ -283,6 +385,77 @@ document.addEventListener('DOMContentLoaded', () => {
     console.warn('Analysis elements not found in DOM');
   }
 
+  // --- Pipelined Extract & Analyze Section (SSE) ---
+  let pipelining = false;
+
+  if (pipelineBtn && analysisProg && intervalInput) {
+    pipelineBtn.addEventListener('click', (e) => {
+      e.preventDefault();
+
+      if (pipelining) {
+        // cancel: stops decoding and pending analysis for this job
+        if (window._pipelineSource) window._pipelineSource.close();
+        fetch('/analyze/abort', { method: 'POST' });
+        setPageDisabled(false);
+        pipelineBtn.textContent = 'Extract & Analyze';
+        pipelining              = false;
+        return;
+      }
+
+      const context  = document.getElementById('context').value.trim();
+      const interval = intervalInput.value.trim();
+      const mode     = adaptiveInput && adaptiveInput.checked ? 'adaptive' : 'interval';
+      extractProg.textContent  = '';
+      analysisProg.textContent = '';
+
+      setPageDisabled(true);
+      pipelineBtn.disabled    = false;
+      pipelineBtn.textContent = 'Stop';
+      pipelining              = true;
+
+      if (window._pipelineSource) window._pipelineSource.close();
+      const src = new EventSource(
+        `/pipeline?interval=${encodeURIComponent(interval)}&mode=${mode}&context=${encodeURIComponent(context)}`
+      );
+      window._pipelineSource = src;
+
+      src.onmessage = (evt) => {
+        // Extraction progress and analysis results go to their own panes
+        const pane = evt.data.startsWith('Extracted frame') ? extractProg : analysisProg;
+        pane.textContent += evt.data + "\n";
+        if (evt.data.startsWith("Analysis complete")) {
+          window._pipelineSource.close();
+          setPageDisabled(false);
+          pipelineBtn.textContent = 'Extract & Analyze';
+          pipelining              = false;
+          window.location.href    = '/results';
+        }
+      };
+
+      src.addEventListener('end', () => {
+        src.close();
+        if (pipelining) {
+          setPageDisabled(false);
+          pipelineBtn.textContent = 'Extract & Analyze';
+          pipelining              = false;
+        }
+      });
+
+      src.onerror = (err) => {
+        if (src.readyState === EventSource.CONNECTING) {
+          analysisProg.textContent += "Connection lost, reconnecting…\n";
+          return;
+        }
+        console.error('SSE error:', err);
+        analysisProg.textContent += "Error in pipeline stream\n";
+        window._pipelineSource.close();
+        setPageDisabled(false);
+        pipelineBtn.textContent = 'Extract & Analyze';
+        pipelining              = false;
+      };
+    });
+  }
+
 
   // --- Frame Removal Section ---
   const removeFramesBtn = document.getElementById('remove-frames-btn');
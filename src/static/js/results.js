@@ -0,0 +1,139 @@
+// results.js
+// Loads analysis results page by page from /api/results as the user scrolls
+
+document.addEventListener('DOMContentLoaded', () => {
+  const grid      = document.getElementById('results-grid');
+  const status    = document.getElementById('results-status');
+  const sentinel  = document.getElementById('results-sentinel');
+  const filter    = document.getElementById('results-filter');
+  const keyword   = document.getElementById('filter-q');
+  const which     = document.getElementById('filter-status');
+  const removeBtn = document.getElementById('remove-frames-btn');
+  if (!grid || !sentinel) return;
+
+  let cursor  = null;   // next_cursor of the last page, null before the first page
+  let done    = false;  // no more pages for the current filter
+  let loading = false;
+  let generation = 0;   // bumped on filter change so stale responses are dropped
+
+  // Build one result card; text goes through textContent, never innerHTML
+  function renderItem(item) {
+    const el = document.createElement('div');
+    el.classList.add('frame-item');
+
+    const cb = document.createElement('input');
+    cb.type  = 'checkbox';
+    cb.name  = 'selected_frames';
+    cb.value = item.name;
+    cb.classList.add('frame-checkbox');
+
+    // Thumbnail in the grid; full resolution opens on click
+    const link = document.createElement('a');
+    link.href   = item.url;
+    link.target = '_blank';
+    link.classList.add('frame-link');
+    const img = document.createElement('img');
+    img.src      = item.thumb;
+    img.alt      = `Frame ${item.name}`;
+    img.width    = 200;
+    img.loading  = 'lazy';
+    img.decoding = 'async';
+    link.appendChild(img);
+
+    const desc = document.createElement('div');
+    desc.classList.add('result-description');
+    const title = document.createElement('strong');
+    title.textContent = item.name;
+    desc.append(title, document.createElement('br'));
+    if (item.duplicate_of) {
+      // Near-duplicate: result reused from its representative frame
+      const note = document.createElement('em');
+      note.classList.add('duplicate-note');
+      note.textContent = `Duplicate of ${item.duplicate_of}`;
+      desc.append(note, document.createElement('br'));
+    }
+    const text = document.createElement('span');
+    text.textContent = item.result;
+    if (item.error) text.classList.add('result-error');
+    desc.appendChild(text);
+
+    el.append(cb, link, desc);
+    return el;
+  }
+
+  // Fetch the next page for the current filter and append it
+  function loadPage() {
+    if (loading || done) return;
+    loading = true;
+    const gen = generation;
+    const params = new URLSearchParams();
+    if (cursor) params.set('cursor', cursor);
+    if (keyword && keyword.value.trim()) params.set('q', keyword.value.trim());
+    if (which && which.value) params.set('status', which.value);
+    status.textContent = 'Loading…';
+
+    fetch(`${grid.dataset.apiUrl}?${params}`)
+      .then(r => r.json())
+      .then(page => {
+        if (gen !== generation) return;
+        page.items.forEach(item => grid.appendChild(renderItem(item)));
+        cursor = page.next_cursor;
+        done   = !cursor;
+        status.textContent = grid.children.length ? '' : 'No results yet.';
+      })
+      .catch(() => { if (gen === generation) status.textContent = 'Failed to load results.'; })
+      .finally(() => {
+        if (gen !== generation) return;
+        loading = false;
+        // Keep filling while the sentinel is still on screen
+        if (!done && sentinel.getBoundingClientRect().top < window.innerHeight) loadPage();
+      });
+  }
+
+  // Start over with the current filter values
+  function reset() {
+    generation += 1;
+    grid.innerHTML = '';
+    cursor  = null;
+    done    = false;
+    loading = false;
+    loadPage();
+  }
+
+  new IntersectionObserver(entries => {
+    if (entries.some(e => e.isIntersecting)) loadPage();
+  }, { rootMargin: '600px' }).observe(sentinel);
+
+  if (filter) {
+    let timer;
+    filter.addEventListener('submit', e => { e.preventDefault(); reset(); });
+    keyword && keyword.addEventListener('input', () => { clearTimeout(timer); timer = setTimeout(reset, 300); });
+    which && which.addEventListener('change', reset);
+  }
+
+  // Remove checked frames from the job and from the grid
+  if (removeBtn) {
+    removeBtn.addEventListener('click', () => {
+      const checked = Array.from(grid.querySelectorAll('.frame-checkbox:checked'));
+      if (!checked.length) return alert('Select frames first.');
+      removeBtn.disabled = true;
+      fetch('/remove_frames', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ frames: checked.map(cb => cb.value) })
+      })
+        .then(r => r.json())
+        .then(data => {
+          if (data.success) {
+            checked.forEach(cb => cb.closest('.frame-item').remove());
+          } else {
+            alert('Remove error: ' + data.message);
+          }
+        })
+        .catch(() => alert('Network error during removal'))
+        .finally(() => { removeBtn.disabled = false; });
+    });
+  }
+
+  loadPage();
+});
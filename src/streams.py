@@ -0,0 +1,256 @@
+# src/streams.py
+# Progress streams (SSE) decoupled from the requests that follow them
+#
+# Extraction, analysis and pipeline runs execute in a background thread and append
+# their messages to the job store; a stream response only tails that log. Clients
+# can therefore reconnect on any server process and resume from Last-Event-ID, and
+# under the async server (asgi.py) following a run costs no worker thread. Every
+# follower refreshes the run's seen_at time; a run that no client has followed for
+# SSE_DISCONNECT_GRACE seconds is cancelled. Starting a stream replaces its earlier
+# run; a replaced run still executing on another process finds out when its next
+# message is refused (or from the watchdog) and cancels itself.
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional, Union
+
+from flask import Response, request
+
+import config
+import metrics
+from jobs import CancelToken, get_store
+
+logger = logging.getLogger(__name__)
+
+# WSGI environ key set by asgi.py. Stream responses then only name the run in
+# RUN_HEADER, and the ASGI server follows it as a coroutine
+ASYNC_ENVIRON_KEY = "minewatch.async_streams"
+RUN_HEADER = "X-Minewatch-Stream"
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Seconds to wait for a replaced run of the same stream to stop
+_REPLACE_TIMEOUT = 10.0
+# Events read from the store per poll
+_POLL_EVENTS = 500
+
+# A message is its data, or (event name, data)
+Message = Union[str, tuple[str, str]]
+
+
+@dataclass
+class _Run:
+    job_id: str
+    stream: str
+    run: str
+    cancel: CancelToken
+    thread: Optional[threading.Thread] = None
+    latest: int = 0           # ID of the last event appended
+    abandoned: bool = False   # cancelled because no client followed it
+    superseded: bool = False  # cancelled because a newer run replaced it or the job was deleted
+
+
+# Runs executing in this process, by run ID
+_runs: dict[str, _Run] = {}
+_runs_lock = threading.Lock()
+_watchdog: Optional[threading.Thread] = None
+
+
+def format_event(data: str, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Format one SSE message; multi-line data is split across data: fields."""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    if event:
+        lines.append(f"event: {event}")
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+
+def start(job_id: str, stream: str, work: Callable[[], Iterator[Message]], cancel: CancelToken) -> str:
+    """
+    Run `work()` in a background thread, storing each message it yields as an event
+    of a new run of the job's `stream`; `cancel` must be the token the work polls.
+    A run of the same stream still executing in this process is cancelled first.
+    Returns the run ID.
+    """
+    with _runs_lock:
+        previous = [r for r in _runs.values() if r.job_id == job_id and r.stream == stream]
+    for old in previous:
+        old.cancel.set()
+        old.thread.join(_REPLACE_TIMEOUT)
+        if old.thread.is_alive():
+            logger.warning('Replaced %s run %s of job %s is still stopping', stream, old.run, job_id)
+
+    run = _Run(job_id, stream, get_store().start_stream(job_id, stream), cancel)
+    run.thread = threading.Thread(target=_execute, args=(run, work), daemon=True,
+                                  name=f"{stream}-{run.run[:8]}")
+    with _runs_lock:
+        _runs[run.run] = run
+    _ensure_watchdog()
+    run.thread.start()
+    return run.run
+
+
+def _execute(run: _Run, work: Callable[[], Iterator[Message]]) -> None:
+    store = get_store()
+    outcome = "completed"
+    messages = iter(work())
+    try:
+        for message in messages:
+            if run.superseded:
+                continue  # the work is winding down; nobody can read its messages any more
+            event, data = message if isinstance(message, tuple) else (None, message)
+            event_id = store.append_event(run.job_id, run.run, data, event)
+            if event_id is None:
+                _supersede(run)
+            else:
+                run.latest = event_id
+        if run.superseded:
+            outcome = "superseded"
+        elif run.abandoned:
+            outcome = "abandoned"
+        elif run.cancel.is_set():
+            outcome = "cancelled"
+    except Exception as e:
+        outcome = "error"
+        logger.exception('%s run %s of job %s failed', run.stream, run.run, run.job_id)
+        if not run.superseded:
+            store.set_status(run.job_id, 'error')
+            run.latest = store.append_event(run.job_id, run.run, f"ERROR: {e}") or run.latest
+    finally:
+        if hasattr(messages, "close"):
+            messages.close()
+        store.finish_stream(run.run)
+        with _runs_lock:
+            _runs.pop(run.run, None)
+        metrics.STREAM_RUNS.inc(stream=run.stream, outcome=outcome)
+
+
+def _supersede(run: _Run) -> None:
+    logger.info('%s run %s of job %s was replaced by a newer run; cancelling', run.stream, run.run, run.job_id)
+    run.superseded = True
+    run.cancel.set()
+
+
+def _ensure_watchdog() -> None:
+    global _watchdog
+    with _runs_lock:
+        if _watchdog is None or not _watchdog.is_alive():
+            _watchdog = threading.Thread(target=_watch, name="stream-watchdog", daemon=True)
+            _watchdog.start()
+
+
+def _watch() -> None:
+    """
+    Cancel runs of this process that no client has followed for SSE_DISCONNECT_GRACE
+    seconds, and runs that were replaced while they had nothing to report.
+    """
+    store = get_store()
+    while True:
+        grace = config.SSE_DISCONNECT_GRACE
+        time.sleep(min(1.0, max(0.05, grace / 4)) if grace > 0 else 1.0)
+        with _runs_lock:
+            runs = [r for r in _runs.values() if not r.abandoned and not r.superseded]
+        for run in runs:
+            try:
+                seen_at = store.stream_seen_at(run.run)
+            except Exception as e:
+                logger.warning('Stream watchdog check failed for run %s: %s', run.run, e)
+                continue
+            if seen_at is None:
+                _supersede(run)
+            elif grace > 0 and time.time() - seen_at > grace:
+                logger.info('No client has followed %s run %s of job %s for %.0fs; cancelling',
+                            run.stream, run.run, run.job_id, grace)
+                run.abandoned = True
+                run.cancel.set()
+
+
+class Tail:
+    """
+    Incremental SSE rendering of a run from event ID `after`: new events with their
+    IDs, a heartbeat comment once the stream has been idle for SSE_HEARTBEAT_INTERVAL,
+    and an `end` event after the run's last message. Polling marks the run as followed.
+    """
+
+    def __init__(self, run: str, after: int = 0):
+        self.run = run
+        self.after = after
+        self.done = False
+        self._store = get_store()
+        self._sent_at = time.monotonic()
+        self._touched_at = float("-inf")
+
+    def opening(self) -> str:
+        """First chunk of a response: the reconnection delay for EventSource."""
+        return f"retry: {config.SSE_RETRY_MS}\n\n"
+
+    def poll(self) -> str:
+        """Text to send now, possibly empty. Sets `done` once the run is over and fully sent."""
+        now = time.monotonic()
+        grace = config.SSE_DISCONNECT_GRACE
+        if grace > 0 and now - self._touched_at >= grace / 3:
+            self._store.touch_stream(self.run)
+            self._touched_at = now
+
+        chunks = []
+        with _runs_lock:
+            local = _runs.get(self.run)
+        # A run executing here says when it has new events; others are read from the store
+        if local is None or local.latest > self.after:
+            # Checked before reading events, so a finished run's last events are never missed
+            finished = local is None and self._store.stream_done(self.run)
+            events = self._store.events_after(self.run, self.after, _POLL_EVENTS)
+            for event_id, event, data in events:
+                chunks.append(format_event(data, event, event_id))
+                self.after = event_id
+            if finished and len(events) < _POLL_EVENTS:
+                chunks.append(format_event("", "end"))
+                self.done = True
+        if not chunks and now - self._sent_at >= config.SSE_HEARTBEAT_INTERVAL:
+            chunks.append(": keepalive\n\n")
+        if chunks:
+            self._sent_at = now
+        return "".join(chunks)
+
+
+def iter_sse(run: str, after: int = 0) -> Iterator[str]:
+    """Follow a run from a WSGI worker thread until it ends or the client goes away."""
+    tail = Tail(run, after)
+    yield tail.opening()
+    while True:
+        text = tail.poll()
+        if text:
+            yield text
+        if tail.done:
+            return
+        time.sleep(config.SSE_POLL_INTERVAL)
+
+
+def stream_response(job_id: str, stream: str, start_run: Callable[[], str]) -> Response:
+    """
+    SSE response following a run of the job's `stream`. A request carrying
+    Last-Event-ID (sent by EventSource when it reconnects) resumes the run that event
+    belongs to; otherwise `start_run()` starts a new one and returns its ID. Resuming
+    a run that has ended with nothing left to send answers 204, which tells the
+    client to stop reconnecting.
+    """
+    last_id = request.headers.get('Last-Event-ID')
+    if last_id:
+        try:
+            after = int(last_id)
+        except ValueError:
+            return Response(status=204)
+        found = get_store().event_stream(job_id, after)
+        if found is None or found['stream'] != stream or (found['done'] and found['last'] <= after):
+            return Response(status=204)
+        run = found['run']
+    else:
+        run, after = start_run(), 0
+
+    async_mode = bool(request.environ.get(ASYNC_ENVIRON_KEY))
+    metrics.STREAM_CONNECTIONS.inc(mode="async" if async_mode else "sync",
+                                   resumed="true" if last_id else "false")
+    if async_mode:
+        return Response(mimetype='text/event-stream', headers={**SSE_HEADERS, RUN_HEADER: f"{run} {after}"})
+    return Response(iter_sse(run, after), mimetype='text/event-stream', headers=SSE_HEADERS)
@@ -0,0 +1,83 @@
+# src/thumbnails.py
+# Small preview images stored next to extracted frames for the results and preview grids
+
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+import config
+from frame_store import get_frame_store
+from lazy import LazyModule
+
+cv2 = LazyModule("cv2")
+
+logger = logging.getLogger(__name__)
+
+THUMB_DIRNAME = "thumbs"
+
+
+def _encode_params() -> tuple[str, list[int]]:
+    if config.THUMB_FORMAT == "webp":
+        return ".webp", [cv2.IMWRITE_WEBP_QUALITY, config.THUMB_QUALITY]
+    return ".jpg", [cv2.IMWRITE_JPEG_QUALITY, config.THUMB_QUALITY]
+
+
+def thumb_path(frame_path: str) -> str:
+    """Thumbnail location for a frame: <frame dir>/thumbs/<frame stem>.<webp|jpg>."""
+    stem = os.path.splitext(os.path.basename(frame_path))[0]
+    ext, _ = _encode_params()
+    return os.path.join(os.path.dirname(frame_path), THUMB_DIRNAME, stem + ext)
+
+
+def frame_for_thumb(thumb_file: str) -> str:
+    """Frame file name a thumbnail was made from (frames are always written as .jpg)."""
+    return os.path.splitext(os.path.basename(thumb_file))[0] + ".jpg"
+
+
+def write_thumbnail(frame: np.ndarray, frame_path: str) -> Optional[str]:
+    """
+    Downscale an already decoded frame to THUMB_MAX_EDGE and write its thumbnail.
+    Returns the thumbnail path, or None if encoding failed.
+    """
+    height, width = frame.shape[:2]
+    scale = config.THUMB_MAX_EDGE / max(width, height)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    ext, params = _encode_params()
+    ok, encoded = cv2.imencode(ext, frame, params)
+    if not ok:
+        logger.warning('Thumbnail encoding (%s) failed for %s', ext, frame_path)
+        return None
+    path = thumb_path(frame_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    get_frame_store().write(path, encoded.tobytes())
+    return path
+
+
+def ensure_thumbnail(frame_path: str) -> Optional[str]:
+    """
+    Thumbnail path for a frame, creating it from the frame file when it is missing
+    or older than the frame. Returns None when the frame cannot be read.
+    """
+    path = thumb_path(frame_path)
+    try:
+        if os.stat(path).st_mtime_ns >= os.stat(frame_path).st_mtime_ns:
+            return path
+    except FileNotFoundError:
+        pass
+    # Decode at reduced size when the thumbnail is far smaller than the frame
+    frame = cv2.imread(frame_path, cv2.IMREAD_REDUCED_COLOR_2)
+    if frame is None:
+        return None
+    return write_thumbnail(frame, frame_path)
+
+
+def remove_thumbnail(frame_path: str) -> None:
+    path = thumb_path(frame_path)
+    get_frame_store().discard(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
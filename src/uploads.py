@@ -0,0 +1,218 @@
+# src/uploads.py
+# Blueprint for chunked, resumable video uploads written straight into the job directory
+
+import hashlib
+import os
+import threading
+import time
+
+from flask import Blueprint, current_app, jsonify, request, session
+from werkzeug.utils import secure_filename
+
+import config
+from jobs import get_store
+
+uploads_bp = Blueprint('uploads', __name__, url_prefix='/upload')
+
+# Running SHA-256 of in-progress uploads, so completion does not re-read the file.
+# Lost on restart or when chunks land on another process; the file is hashed then.
+# Entries of uploads that complete, are aborted or go stale are dropped.
+_hashers: dict[str, tuple[int, "hashlib._Hash"]] = {}
+_locks: dict[str, threading.Lock] = {}
+_used: dict[str, float] = {}   # last time this process handled a chunk of the upload
+_registry_lock = threading.Lock()
+# Stale uploads are looked for at most this often (seconds)
+_SWEEP_INTERVAL = 60.0
+_next_sweep = 0.0
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _upload_lock(upload_id: str) -> threading.Lock:
+    with _registry_lock:
+        _used[upload_id] = time.monotonic()
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _forget(upload_id: str) -> None:
+    """Drop the in-process state of an upload."""
+    with _registry_lock:
+        _hashers.pop(upload_id, None)
+        _locks.pop(upload_id, None)
+        _used.pop(upload_id, None)
+
+
+def _expire_stale() -> None:
+    """
+    Expire uploads idle for UPLOAD_STALE_SECONDS: their rows and partial files, and
+    the state this process keeps for them (also for rows expired by another process).
+    """
+    global _next_sweep
+    now = time.monotonic()
+    with _registry_lock:
+        if now < _next_sweep:
+            return
+        _next_sweep = now + _SWEEP_INTERVAL
+        idle = [u for u, used in _used.items() if now - used > config.UPLOAD_STALE_SECONDS]
+    for upload_id in idle:
+        _forget(upload_id)
+    for upload in get_store().expire_uploads(config.UPLOAD_STALE_SECONDS):
+        _forget(upload['id'])
+        _remove_partial(upload['path'])
+        current_app.logger.info('Upload %s expired at %d/%d bytes', upload['id'], upload['offset'], upload['size'])
+
+
+def _remove_partial(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _status(upload: dict, **extra):
+    return jsonify({'success': True, 'upload_id': upload['id'], 'job': upload['job_id'],
+                    'offset': upload['offset'], 'size': upload['size'],
+                    'complete': upload['sha256'] is not None, 'sha256': upload['sha256'], **extra})
+
+
+@uploads_bp.route('/init', methods=['POST'])
+def init_upload():
+    """
+    Route: Start a chunked upload. Body: {"filename": ..., "size": <bytes>}.
+    Creates a new job and returns its upload ID, the offset to start from and
+    the preferred chunk size.
+    """
+    _expire_stale()
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get('size'))
+        if size <= 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Expected {"filename": ..., "size": <bytes>}'}), 400
+
+    store = get_store()
+    job_id = store.create()
+    session['job_id'] = job_id
+    filename = secure_filename(data.get('filename') or '')
+    ext = os.path.splitext(filename)[1] or '.mp4'
+    dest = os.path.join(store.job_dir(job_id), f"video{ext}")
+    # Create the file up front; chunks are written into it in place
+    open(dest, 'wb').close()
+    upload_id = store.create_upload(job_id, dest, size, filename)
+    current_app.logger.info('Upload %s started for job %s: %s (%d bytes)', upload_id, job_id, filename, size)
+    return _status(store.get_upload(upload_id), chunk_size=config.UPLOAD_CHUNK_SIZE)
+
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Route: Committed offset of an upload, used by clients to resume after a dropped connection."""
+    upload = get_store().get_upload(upload_id)
+    if upload is None:
+        return jsonify({'success': False, 'message': 'Unknown upload'}), 404
+    # The upload ID is the client's handle on its job, e.g. after a browser restart
+    session['job_id'] = upload['job_id']
+    return _status(upload)
+
+
+@uploads_bp.route('/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    Route: Append one chunk. The raw request body is the chunk; `?offset=` must
+    equal the committed offset (409 with the current offset otherwise) and an
+    optional X-Chunk-SHA256 header is verified before the offset advances.
+    The body is streamed into the video file, never buffered whole.
+    """
+    _expire_stale()
+    store = get_store()
+    upload = store.get_upload(upload_id)
+    if upload is None:
+        return jsonify({'success': False, 'message': 'Unknown upload'}), 404
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'offset is required'}), 400
+    length = request.content_length
+    if length is None or length <= 0 or length > config.UPLOAD_MAX_CHUNK_SIZE:
+        return jsonify({'success': False,
+                        'message': f'Chunk must be 1..{config.UPLOAD_MAX_CHUNK_SIZE} bytes with Content-Length'}), 400
+
+    with _upload_lock(upload_id):
+        upload = store.get_upload(upload_id)
+        if offset != upload['offset'] or upload['sha256'] is not None:
+            return jsonify({'success': False, 'message': 'Offset mismatch',
+                            'offset': upload['offset'], 'complete': upload['sha256'] is not None}), 409
+        if offset + length > upload['size']:
+            return jsonify({'success': False, 'message': 'Chunk extends past the declared size'}), 400
+
+        chunk_hash = hashlib.sha256()
+        # Continue the whole-file hash only if it covers exactly the bytes before this chunk
+        covered, file_hash = _hashers.get(upload_id, (0, hashlib.sha256()))
+        running = file_hash.copy() if covered == offset else None
+        written = 0
+        with open(upload['path'], 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                block = request.stream.read(min(1 << 20, length - written))
+                if not block:
+                    break
+                f.write(block)
+                chunk_hash.update(block)
+                if running is not None:
+                    running.update(block)
+                written += len(block)
+            expected = request.headers.get('X-Chunk-SHA256')
+            corrupt = bool(expected) and expected.lower() != chunk_hash.hexdigest()
+            if written != length or corrupt:
+                # Drop the partial or corrupt chunk; the client resends from `offset`
+                f.truncate(offset)
+                current_app.logger.warning('Upload %s: rejected chunk at %d (%d/%d bytes, checksum mismatch: %s)',
+                                           upload_id, offset, written, length, corrupt)
+                return jsonify({'success': False, 'message': 'Incomplete chunk or checksum mismatch',
+                                'offset': offset}), 422
+
+        new_offset = offset + written
+        if not store.advance_upload(upload_id, offset, new_offset):
+            return jsonify({'success': False, 'message': 'Offset mismatch',
+                            'offset': store.get_upload(upload_id)['offset']}), 409
+        if running is not None:
+            with _registry_lock:
+                _hashers[upload_id] = (new_offset, running)
+
+        if new_offset == upload['size']:
+            sha256 = _finish_hash(upload_id, upload['path'], new_offset)
+            store.complete_upload(upload_id, sha256)
+            current_app.logger.info('Upload %s complete: %s (sha256 %s)', upload_id, upload['path'], sha256)
+    return _status(store.get_upload(upload_id))
+
+
+@uploads_bp.route('/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Route: Abandon an incomplete upload, removing its partial file. The job is kept."""
+    store = get_store()
+    with _upload_lock(upload_id):
+        upload = store.get_upload(upload_id)
+        if upload is None:
+            _forget(upload_id)
+            return jsonify({'success': False, 'message': 'Unknown upload'}), 404
+        if upload['sha256'] is not None:
+            return jsonify({'success': False, 'message': 'Upload is already complete'}), 409
+        store.delete_upload(upload_id)
+        _remove_partial(upload['path'])
+    _forget(upload_id)
+    current_app.logger.info('Upload %s aborted at %d/%d bytes', upload_id, upload['offset'], upload['size'])
+    return jsonify({'success': True, 'upload_id': upload_id})
+
+
+def _finish_hash(upload_id: str, path: str, size: int) -> str:
+    """Whole-file SHA-256, from the running hash when it covers every byte."""
+    with _registry_lock:
+        covered, h = _hashers.get(upload_id, (0, None))
+    _forget(upload_id)
+    return h.hexdigest() if h is not None and covered == size else file_sha256(path)
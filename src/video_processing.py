@@ -0,0 +1,556 @@
+# src/video_processing.py
+# Frame extraction engine used by the /extract route and offline tooling
+
+from __future__ import annotations
+
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+import config
+import frame_quality
+import metrics
+from frame_quality import FrameQuality
+from lazy import LazyModule
+from frame_cache import get_frame_cache
+from frame_store import get_frame_store
+from thumbnails import thumb_path, write_thumbnail
+
+# OpenCV is imported on first use rather than when the web app starts
+cv2 = LazyModule("cv2")
+
+logger = logging.getLogger(__name__)
+
+# Polled between frames; returning True ends decoding early
+StopCheck = Optional[Callable[[], bool]]
+
+
+@dataclass
+class ExtractionStats:
+    """Counters collected while a video is being decoded."""
+    frames_read: int = 0      # frames advanced past (grabbed or skipped by seeking)
+    frames_saved: int = 0     # frames retrieved, encoded and written
+    frames_dropped: int = 0   # scheduled frames skipped by the quality gate
+    frames_swapped: int = 0   # scheduled frames replaced by a better nearby frame
+    frames_cached: int = 0    # saved frames linked from the frame cache instead of decoded
+    elapsed: float = 0.0      # wall-clock seconds spent extracting
+    # Quality scores of written frames by path (only while the quality gate is on)
+    quality: dict[str, FrameQuality] = field(default_factory=dict)
+
+    @property
+    def fps(self) -> float:
+        """Source frames processed per second of wall-clock time."""
+        return self.frames_read / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _normalize_interval(interval: Optional[int]) -> int:
+    """Fallback to the configured default for missing or non-positive intervals."""
+    try:
+        interval = int(interval)
+    except (TypeError, ValueError):
+        return config.FRAME_INTERVAL
+    return interval if interval > 0 else config.FRAME_INTERVAL
+
+
+def open_video(video_path: str) -> cv2.VideoCapture:
+    """
+    Open a video for decoding.
+    Raises FileNotFoundError if the path is missing and IOError if OpenCV cannot read it.
+    """
+    if not os.path.isfile(video_path):
+        raise FileNotFoundError(f"Video not found: {video_path}")
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        cap.release()
+        raise IOError(f"Cannot open video: {video_path}")
+    return cap
+
+
+def _write_frame(frame: np.ndarray, outpath: str) -> None:
+    """
+    Write a kept frame as JPEG through the frame store, so serving and analysis
+    get its bytes from memory, plus its thumbnail when enabled.
+    """
+    # Files left by an earlier run may be hard links into the frame cache; never write through them
+    thumb = thumb_path(outpath)
+    if os.path.lexists(thumb):
+        os.remove(thumb)
+    with metrics.FRAME_ENCODE_SECONDS.time(kind="frame"):
+        ok, encoded = cv2.imencode(".jpg", frame)
+        if not ok:
+            raise IOError(f"JPEG encoding failed for {outpath}")
+        get_frame_store().write(outpath, encoded.tobytes())
+    if config.THUMBNAILS_ENABLED:
+        with metrics.FRAME_ENCODE_SECONDS.time(kind="thumbnail"):
+            write_thumbnail(frame, outpath)
+
+
+def _record(stats: ExtractionStats) -> None:
+    metrics.FRAMES_READ.inc(stats.frames_read)
+    metrics.FRAMES_SAVED.inc(stats.frames_saved)
+    metrics.FRAMES_DROPPED.inc(stats.frames_dropped)
+    metrics.FRAMES_SWAPPED.inc(stats.frames_swapped)
+    metrics.FRAMES_CACHED.inc(stats.frames_cached)
+
+
+def _select_frame(cap: cv2.VideoCapture, frame: np.ndarray, search: int, stats: ExtractionStats,
+                  pos_msec: Optional[float] = None
+                  ) -> tuple[Optional[np.ndarray], int, Optional[FrameQuality], Optional[float]]:
+    """
+    Apply the quality gate to a scheduled frame. A frame that fails is replaced by
+    the sharpest passing frame among the next `search` frames ("swap" mode), or
+    dropped when none passes. Returns (frame or None, extra frames read, scores,
+    timestamp of the returned frame). The candidates are decoded first and scored
+    together as one downsampled batch, so up to `search` full frames are held.
+    """
+    if not frame_quality.gate_enabled():
+        return frame, 0, None, pos_msec
+    quality = frame_quality.score(frame)
+    if quality.passes():
+        return frame, 0, quality, pos_msec
+
+    candidates, searched = [], 0
+    if config.QUALITY_GATE == "swap":
+        while searched < search and cap.grab():
+            searched += 1
+            ok, candidate = cap.retrieve()
+            if not ok:
+                break
+            candidates.append((candidate, cap.get(cv2.CAP_PROP_POS_MSEC)))
+    best, best_quality, best_msec = None, None, None
+    if candidates:
+        scores = frame_quality.score_batch(np.stack([frame_quality.downsample(c) for c, _ in candidates]))
+        for offset, ((candidate, msec), candidate_quality) in enumerate(zip(candidates, scores), start=1):
+            if candidate_quality.passes() and (best_quality is None
+                                               or candidate_quality.sharpness > best_quality.sharpness):
+                best, best_quality, best_msec = candidate, replace(candidate_quality, offset=offset), msec
+    if best is None:
+        stats.frames_dropped += 1
+        return None, searched, quality, pos_msec
+    stats.frames_swapped += 1
+    return best, searched, best_quality, best_msec
+
+
+def _cached_quality(cache, video: str, entry) -> Optional[FrameQuality]:
+    """Scores of a cached frame, computed from its JPEG if it was cached with the gate off."""
+    if entry.quality is not None:
+        return entry.quality
+    image = cv2.imread(cache.frame_path(video, entry.frame))
+    if image is None:
+        return None
+    quality = frame_quality.score(image)
+    cache.set_quality(video, entry.frame, quality)
+    return quality
+
+
+def _cached_choice(cache, video: str, entries: dict, pos: int, search: int
+                   ) -> tuple[str, Optional[object], Optional[FrameQuality]]:
+    """
+    Decide a slot from the frame cache alone: ("hit", entry, scores) to reuse a
+    cached frame, ("drop", None, scores) when the cached scheduled frame fails
+    the drop-mode gate, or ("miss", None, None) when the video must be decoded.
+    Replacements are only taken from the cache when the scheduled frame itself
+    is cached and known to fail, so a swap never skips a frame it has not seen.
+    """
+    entry = entries.get(pos)
+    if entry is None:
+        return "miss", None, None
+    if not frame_quality.gate_enabled():
+        return "hit", entry, None
+    quality = _cached_quality(cache, video, entry)
+    if quality is None:
+        return "miss", None, None
+    if quality.passes():
+        return "hit", entry, quality
+    if config.QUALITY_GATE == "drop":
+        return "drop", None, quality
+    best, best_quality = None, None
+    for offset in range(1, search + 1):
+        candidate = entries.get(pos + offset)
+        candidate_quality = _cached_quality(cache, video, candidate) if candidate else None
+        if candidate_quality is not None and candidate_quality.passes() and (
+                best_quality is None or candidate_quality.sharpness > best_quality.sharpness):
+            best, best_quality = candidate, replace(candidate_quality, offset=offset)
+    if best is None:
+        return "miss", None, None
+    return "hit", best, best_quality
+
+
+def _iter_segment(cap: cv2.VideoCapture, output_dir: str, interval: int,
+                  first: int, last: Optional[int], total: int,
+                  stats: ExtractionStats, stop: StopCheck = None,
+                  cache=None, video: Optional[str] = None) -> Iterator[str]:
+    """
+    Yield kept frames `first`..`last - 1` (kept-frame numbering) from an open capture.
+    `last=None` reads to the end of the stream, so a short CAP_PROP_FRAME_COUNT
+    never truncates the tail of the video.
+
+    With a frame cache (and the video's hash), slots whose frame was extracted
+    before are linked from the cache; the capture is only moved, by grabbing or
+    seeking, to the slots that still have to be decoded, and every decoded frame
+    is added to the cache.
+    """
+    use_seek = interval >= config.EXTRACT_SEEK_THRESHOLD and total > 0
+    search = min(config.QUALITY_SEARCH_FRAMES, interval - 1)
+    entries = {}
+    if cache is not None:
+        end = last * interval + search if last is not None else None
+        entries = cache.entries(video, first * interval, end)
+    idx = first
+    pos = first * interval
+    cap_pos = 0          # source frame the capture returns next
+    counted = pos        # source frames before this one are in stats.frames_read
+
+    def count(upto: int) -> None:
+        nonlocal counted
+        if upto > counted:
+            stats.frames_read += upto - counted
+            counted = upto
+
+    def move_to(target: int) -> bool:
+        """Position the capture at `target`, seeking over long gaps and grabbing over short ones."""
+        nonlocal cap_pos
+        if target == cap_pos:
+            return True
+        if target < cap_pos or use_seek or target - cap_pos >= config.EXTRACT_SEEK_THRESHOLD:
+            if (use_seek and target >= total) or not cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                return False
+            cap_pos = target
+            count(target)
+            return True
+        while cap_pos < target:
+            if not cap.grab():
+                return False
+            cap_pos += 1
+            count(cap_pos)
+        return True
+
+    while last is None or idx < last:
+        if stop is not None and stop():
+            break
+        outpath = os.path.join(output_dir, f"frame_{idx}.jpg")
+        slot_frames = min(interval, max(total - pos, 1)) if total > 0 else interval
+
+        decision, entry, quality = ("miss", None, None)
+        if entries:
+            decision, entry, quality = _cached_choice(cache, video, entries, pos, search)
+        if decision == "hit" and cache.materialize(video, entry, outpath):
+            # The job's files are now the cached ones; bytes of an earlier run are stale
+            store = get_frame_store()
+            store.discard(outpath)
+            store.discard(thumb_path(outpath))
+            idx += 1
+            stats.frames_saved += 1
+            stats.frames_cached += 1
+            if quality is not None:
+                if quality.offset:
+                    stats.frames_swapped += 1
+                stats.quality[outpath] = quality
+            count(pos + slot_frames)
+            pos += interval
+            yield outpath
+            continue
+        if decision == "drop":
+            idx += 1
+            stats.frames_dropped += 1
+            count(pos + slot_frames)
+            pos += interval
+            continue
+
+        if not move_to(pos):
+            break
+        t0 = time.perf_counter()
+        if not cap.grab():
+            break
+        ok, frame = cap.retrieve()
+        if not ok:
+            break
+        cap_pos += 1
+        pos_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+        metrics.FRAME_DECODE_SECONDS.observe(time.perf_counter() - t0)
+
+        # Replacements come from this frame's own interval, so slots never overlap
+        frame, searched, quality, pos_msec = _select_frame(cap, frame, search, stats, pos_msec)
+        cap_pos += searched
+        count(cap_pos)
+        if use_seek:
+            count(pos + slot_frames)
+        # Slot numbering is kept even when a frame is dropped, so segments still line up
+        idx += 1
+        if frame is not None:
+            _write_frame(frame, outpath)
+            stats.frames_saved += 1
+            if quality is not None:
+                stats.quality[outpath] = quality
+            if cache is not None:
+                cache.put(video, pos + (quality.offset if quality else 0), outpath, pos_msec, quality)
+            yield outpath
+        pos += interval
+
+
+def _video_key(cache, video_path: str, video_sha256: Optional[str]) -> Optional[str]:
+    """Frame cache key of the video: the hash recorded at upload, else the file's own."""
+    if cache is None:
+        return None
+    return video_sha256 or cache.video_key(video_path)
+
+
+def iter_frames(video_path: str, output_dir: str = config.FRAMES_DIR,
+                interval: Optional[int] = None,
+                stats: Optional[ExtractionStats] = None,
+                stop: StopCheck = None,
+                video_sha256: Optional[str] = None) -> Iterator[str]:
+    """
+    Yield the path of every `interval`-th frame as it is written to `output_dir`.
+
+    Frames that are dropped are only grabbed (demuxed/decoded, never converted
+    to BGR). For large intervals the capture seeks straight to the next kept
+    frame instead, which skips whole GOPs on long 4K footage. Frames found in
+    the frame cache are reused without decoding; pass the video's
+    `video_sha256` when it is already known so the file is not hashed again.
+    Decoding ends early once `stop()` returns True.
+    """
+    interval = _normalize_interval(interval)
+    stats = stats if stats is not None else ExtractionStats()
+    cap = open_video(video_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    start = time.perf_counter()
+    cache = get_frame_cache()
+    try:
+        video = _video_key(cache, video_path, video_sha256)
+        yield from _iter_segment(cap, output_dir, interval, 0, None, total, stats, stop, cache, video)
+    finally:
+        cap.release()
+        if cache is not None:
+            cache.evict()
+        stats.elapsed = time.perf_counter() - start
+        _record(stats)
+        logger.info('Extracted %d frames (%d from cache) from %d read in %.2fs (%.1f frames/sec)',
+                    stats.frames_saved, stats.frames_cached, stats.frames_read, stats.elapsed, stats.fps)
+
+
+def _change_signature(frame: np.ndarray) -> np.ndarray:
+    """Downsampled grayscale thumbnail used to score change between frames."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    size = config.ADAPTIVE_THUMB_SIZE
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def change_score(previous: np.ndarray, current: np.ndarray) -> float:
+    """Mean absolute difference of two signatures, normalised to 0..1."""
+    return float(np.abs(current - previous).mean()) / 255.0
+
+
+def iter_frames_adaptive(video_path: str, output_dir: str = config.FRAMES_DIR,
+                         min_spacing: Optional[int] = None,
+                         max_spacing: Optional[int] = None,
+                         threshold: Optional[float] = None,
+                         stats: Optional[ExtractionStats] = None,
+                         stop: StopCheck = None,
+                         video_sha256: Optional[str] = None) -> Iterator[str]:
+    """
+    Yield frames only when the scene has changed enough since the last kept frame.
+
+    After a frame is kept, the next `min_spacing - 1` frames are just grabbed.
+    From then on every `ADAPTIVE_PROBE_STEP`-th frame is retrieved and scored
+    against the last kept frame; the first one above `threshold` is kept, and a
+    frame is always kept once `max_spacing` frames have passed. Hovering shots
+    collapse to a few frames while fast pass-overs are still sampled densely.
+    """
+    min_spacing = max(1, min_spacing or config.ADAPTIVE_MIN_SPACING)
+    max_spacing = max(min_spacing, max_spacing or config.ADAPTIVE_MAX_SPACING)
+    threshold = config.ADAPTIVE_THRESHOLD if threshold is None else threshold
+    probe_step = max(1, min(config.ADAPTIVE_PROBE_STEP, min_spacing))
+    stats = stats if stats is not None else ExtractionStats()
+    cap = open_video(video_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    # Kept frames go into the frame cache for later interval runs; scene
+    # detection itself needs every probed frame decoded, so nothing is read from it
+    cache = get_frame_cache()
+    last_signature = None
+    since_kept = idx = 0
+    try:
+        video = _video_key(cache, video_path, video_sha256)
+        while cap.grab():
+            if stop is not None and stop():
+                break
+            stats.frames_read += 1
+            due = last_signature is None or since_kept >= max_spacing
+            probe = since_kept >= min_spacing and (since_kept - min_spacing) % probe_step == 0
+            since_kept += 1
+            if not (due or probe):
+                continue
+
+            t0 = time.perf_counter()
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            metrics.FRAME_DECODE_SECONDS.observe(time.perf_counter() - t0)
+            signature = _change_signature(frame)
+            if not due and change_score(last_signature, signature) < threshold:
+                continue
+            quality = frame_quality.score(frame) if frame_quality.gate_enabled() else None
+            if quality is not None and not quality.passes():
+                # Not kept; later probes keep looking for a usable frame
+                stats.frames_dropped += 1
+                continue
+
+            outpath = os.path.join(output_dir, f"frame_{idx}.jpg")
+            _write_frame(frame, outpath)
+            stats.frames_saved += 1
+            if quality is not None:
+                stats.quality[outpath] = quality
+            if cache is not None:
+                cache.put(video, stats.frames_read - 1, outpath, cap.get(cv2.CAP_PROP_POS_MSEC), quality)
+            last_signature = signature
+            since_kept = 1
+            idx += 1
+            yield outpath
+    finally:
+        cap.release()
+        if cache is not None:
+            cache.evict()
+        stats.elapsed = time.perf_counter() - start
+        _record(stats)
+        logger.info('Adaptive sampling kept %d of %d frames in %.2fs (%.1f frames/sec)',
+                    stats.frames_saved, stats.frames_read, stats.elapsed, stats.fps)
+
+
+def _extract_segment(video_path: str, output_dir: str, interval: int,
+                     first: int, last: Optional[int],
+                     stop: StopCheck = None,
+                     video: Optional[str] = None) -> tuple[int, list[str], ExtractionStats, dict]:
+    """
+    Process-pool worker: decode one segment and return (first, paths, stats,
+    metrics snapshot) so the parent's metrics include the segment's timings.
+    `video` is the video's hash for the frame cache (None skips the cache).
+    """
+    stats = ExtractionStats()
+    cache = get_frame_cache() if video is not None else None
+    with metrics.recorded() as recorded:
+        cap = open_video(video_path)
+        try:
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            paths = list(_iter_segment(cap, output_dir, interval, first, last, total, stats, stop,
+                                       cache, video))
+        finally:
+            cap.release()
+    return first, paths, stats, recorded
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """Worker count for parallel extraction; 0 or less means one per CPU core."""
+    workers = config.EXTRACT_WORKERS if workers is None else workers
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def plan_segments(total_frames: int, interval: int, workers: int) -> list[tuple[int, Optional[int]]]:
+    """
+    Split the kept frames of a video into contiguous (first, last) ranges.
+    The final range is open-ended so it always reads through to EOF.
+    """
+    kept = -(-total_frames // interval) if total_frames > 0 else 0
+    min_kept = max(1, config.EXTRACT_MIN_SEGMENT_FRAMES // interval)
+    count = min(workers * config.EXTRACT_SEGMENTS_PER_WORKER, kept // min_kept)
+    if count <= 1:
+        return [(0, None)]
+    bounds = [kept * i // count for i in range(count + 1)]
+    segments = [(bounds[i], bounds[i + 1]) for i in range(count)]
+    segments[-1] = (segments[-1][0], None)
+    return segments
+
+
+def iter_frames_parallel(video_path: str, output_dir: str = config.FRAMES_DIR,
+                         interval: Optional[int] = None,
+                         workers: Optional[int] = None,
+                         stats: Optional[ExtractionStats] = None,
+                         stop: StopCheck = None,
+                         video_sha256: Optional[str] = None
+                         ) -> Iterator[tuple[int, int, list[str]]]:
+    """
+    Decode time ranges of the video in a process pool.
+    Yields (segments_done, segments_total, paths) as each segment finishes; paths
+    keep the global `frame_{idx}.jpg` numbering so merged output matches iter_frames.
+    `stop` is sent to the workers, so it must be picklable (e.g. jobs.CancelToken.is_set).
+    """
+    interval = _normalize_interval(interval)
+    workers = resolve_workers(workers)
+    stats = stats if stats is not None else ExtractionStats()
+
+    cap = open_video(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    os.makedirs(output_dir, exist_ok=True)
+
+    segments = plan_segments(total, interval, workers)
+    start = time.perf_counter()
+    cache = get_frame_cache()
+    video = _video_key(cache, video_path, video_sha256)
+    # Spawned workers avoid forking a multi-threaded web server process
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(segments)), mp_context=ctx) as pool:
+            futures = [pool.submit(_extract_segment, video_path, output_dir, interval, first, last, stop, video)
+                       for first, last in segments]
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    _, paths, segment, recorded = future.result()
+                    metrics.REGISTRY.merge(recorded)
+                    stats.frames_read += segment.frames_read
+                    stats.frames_saved += segment.frames_saved
+                    stats.frames_dropped += segment.frames_dropped
+                    stats.frames_swapped += segment.frames_swapped
+                    stats.frames_cached += segment.frames_cached
+                    stats.quality.update(segment.quality)
+                    yield done, len(segments), paths
+            finally:
+                for future in futures:
+                    future.cancel()
+    finally:
+        if cache is not None:
+            cache.evict()
+        stats.elapsed = time.perf_counter() - start
+        _record(stats)
+        logger.info('Extracted %d frames from %d read in %.2fs across %d segments (%.1f frames/sec)',
+                    stats.frames_saved, stats.frames_read, stats.elapsed, len(segments), stats.fps)
+
+
+def frame_sort_key(path: str) -> int:
+    """Order frame paths by the numeric index in `frame_{idx}.jpg`."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return int(stem.rsplit('_', 1)[-1])
+
+
+def extract_frames(video_path: str, output_dir: str = config.FRAMES_DIR,
+                   interval: Optional[int] = None,
+                   stats: Optional[ExtractionStats] = None,
+                   video_sha256: Optional[str] = None) -> list[str]:
+    """
+    Extract every `interval`-th frame of `video_path` into `output_dir`.
+    Returns the list of written frame paths in order.
+    """
+    return list(iter_frames(video_path, output_dir, interval, stats, video_sha256=video_sha256))
+
+
+def extract_frames_parallel(video_path: str, output_dir: str = config.FRAMES_DIR,
+                            interval: Optional[int] = None, workers: Optional[int] = None,
+                            stats: Optional[ExtractionStats] = None,
+                            video_sha256: Optional[str] = None) -> list[str]:
+    """
+    Parallel counterpart of extract_frames().
+    Returns the merged frame paths in the same order as a serial run.
+    """
+    frames = []
+    for _, _, paths in iter_frames_parallel(video_path, output_dir, interval, workers, stats,
+                                            video_sha256=video_sha256):
+        frames.extend(paths)
+    return sorted(frames, key=frame_sort_key)
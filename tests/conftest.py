@@ -0,0 +1,23 @@
+import pytest
+import frame_cache
+import services.analysis_index as analysis_index
+
+
+# 🔧 Fixture: every test indexes into its own database, never the app's data/ index.
+# The environment variable reaches batch and extraction worker processes.
+@pytest.fixture(autouse=True)
+def isolated_index(tmp_path, monkeypatch):
+    path = str(tmp_path / "analysis_index.db")
+    monkeypatch.setenv("ANALYSIS_INDEX_PATH", path)
+    monkeypatch.setattr(analysis_index.config, "ANALYSIS_INDEX_PATH", path)
+    monkeypatch.setattr(analysis_index, "_index", None)
+
+
+# 🔧 Fixture: every test caches extracted frames in its own directory, so extraction
+# really decodes the video instead of linking frames an earlier run left in data/
+@pytest.fixture(autouse=True)
+def isolated_frame_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "frame_cache")
+    monkeypatch.setenv("FRAME_CACHE_DIR", path)
+    monkeypatch.setattr(frame_cache.config, "FRAME_CACHE_DIR", path)
+    monkeypatch.setattr(frame_cache, "_cache", None)
@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+import pytest
+from openai import OpenAI
+
+import src.gpt_integration as gpt_integration
+from src.image_preprocessing import estimate_image_tokens, preprocess_image
+from src.services.analysis_cache import AnalysisCache
+from src.services.analysis_engine import analyze_concurrently
+from src.services.rate_limiter import TokenBucket
+
+TEST_OUTPUT_DIR = "tests/output_analysis_frames"
+
+
+class StubChatCompletions(BaseHTTPRequestHandler):
+    """
+    Minimal /chat/completions stub: optional 429s first, then a fixed reply after a delay.
+    JSON-mode (batched) requests get one entry per image unless `malformed` is set.
+    """
+    fail_first = 0
+    delay = 0.0
+    calls = 0
+    malformed = False
+    empty = False  # reply with null content, as for a refusal
+    images = []  # images attached to each answered request
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with StubChatCompletions.lock:
+            StubChatCompletions.calls += 1
+            fail = StubChatCompletions.calls <= StubChatCompletions.fail_first
+        if fail:
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}})
+            return
+        time.sleep(StubChatCompletions.delay)
+        count = sum(1 for m in body["messages"] if isinstance(m["content"], list)
+                    for part in m["content"] if part["type"] == "image_url")
+        StubChatCompletions.images.append(count)
+        content = None if StubChatCompletions.empty else "stub analysis"
+        if body.get("response_format", {}).get("type") == "json_object":
+            content = "not json" if StubChatCompletions.malformed else json.dumps(
+                {"frames": [{"frame": i, "analysis": f"stub analysis {i}"} for i in range(1, count + 1)]})
+        self._send(200, {
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+# 🔧 Fixture: local stub server with gpt_integration pointed at it
+@pytest.fixture
+def stub_server(monkeypatch):
+    StubChatCompletions.fail_first = 0
+    StubChatCompletions.delay = 0.0
+    StubChatCompletions.calls = 0
+    StubChatCompletions.malformed = False
+    StubChatCompletions.empty = False
+    StubChatCompletions.images = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubChatCompletions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    monkeypatch.setattr(gpt_integration, "client", OpenAI(api_key="test", base_url=base_url, max_retries=0))
+    monkeypatch.setattr(gpt_integration._create_completion.retry, "wait", lambda retry_state: 0)
+    monkeypatch.setattr(gpt_integration, "get_cache", lambda: None)
+    yield StubChatCompletions
+    server.shutdown()
+
+
+# 🔧 Fixture: a handful of dummy frame files
+@pytest.fixture
+def frames():
+    os.makedirs(TEST_OUTPUT_DIR, exist_ok=True)
+    paths = []
+    for i in range(8):
+        path = os.path.join(TEST_OUTPUT_DIR, f"frame_{i}.jpg")
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8dummy\xff\xd9")
+        paths.append(path)
+    yield paths
+    shutil.rmtree(TEST_OUTPUT_DIR)
+
+
+# ✅ Test 1: A 429 is retried and the frame still gets its analysis
+def test_analyze_image_retries_rate_limit(stub_server, frames):
+    stub_server.fail_first = 2
+    assert gpt_integration.analyze_image(frames[0], "open pit") == "stub analysis"
+    assert stub_server.calls == 3
+
+
+# ✅ Test 2: Frames run concurrently and every frame is yielded once
+def test_analyze_concurrently_overlaps_requests(stub_server, frames):
+    stub_server.delay = 0.2
+    start = time.perf_counter()
+    results = dict(analyze_concurrently(frames, "open pit", workers=8,
+                                        analyze=gpt_integration.analyze_image))
+    elapsed = time.perf_counter() - start
+    assert set(results) == set(frames)
+    assert all(r == "stub analysis" for r in results.values())
+    assert elapsed < 0.2 * len(frames) / 2
+
+
+# ✅ Test 3: Token bucket blocks once its burst capacity is spent
+def test_token_bucket_throttles():
+    bucket = TokenBucket(per_minute=600, capacity=2)  # 10 tokens/sec
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() > 0.05
+
+
+# ✅ Test 4: Repeat analyses are served from the persistent cache, errors are never cached
+def test_analysis_cache_hits_and_skips_errors(stub_server, frames, tmp_path, monkeypatch):
+    cache = AnalysisCache(str(tmp_path / "cache.db"), max_entries=100, max_age=3600)
+    monkeypatch.setattr(gpt_integration, "get_cache", lambda: cache)
+
+    stub_server.fail_first = gpt_integration.config.OPENAI_MAX_RETRIES + 1
+    assert gpt_integration.analyze_image(frames[0], "open pit").startswith("Error during API call")
+    assert gpt_integration.analyze_image(frames[0], "open pit") == "stub analysis"
+    calls = stub_server.calls
+    assert gpt_integration.analyze_image(frames[0], "open pit") == "stub analysis"
+    assert stub_server.calls == calls
+    assert gpt_integration.analyze_image(frames[0], "alluvial") == "stub analysis"
+    assert stub_server.calls == calls + 1
+    assert cache.stats() == {"hits": 1, "misses": 3, "entries": 2}
+
+
+# ✅ Test 5: The cache evicts least recently used entries beyond its size limit
+def test_analysis_cache_evicts_lru(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache.db"), max_entries=2, max_age=0)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+
+
+# ✅ Test 6: Token estimates follow the vision tiling rules
+def test_estimate_image_tokens():
+    assert estimate_image_tokens(1024, 1024, "high") == 765
+    assert estimate_image_tokens(2048, 4096, "auto") == 1105
+    assert estimate_image_tokens(3840, 2160, "low") == 85
+
+
+# ✅ Test 7: 4K frames are downscaled to the configured long edge before upload
+def test_preprocess_image_downscales_large_frames():
+    rng = np.random.default_rng(0)
+    frame = cv2.resize((rng.random((54, 96, 3)) * 255).astype(np.uint8), (3840, 2160))
+    original = cv2.imencode(".jpg", frame)[1].tobytes()
+    prepared = preprocess_image(original)
+    assert max(prepared.width, prepared.height) == gpt_integration.config.IMAGE_MAX_EDGE
+    assert len(prepared.data) < len(original)
+    assert prepared.est_tokens < estimate_image_tokens(3840, 2160)
+
+
+# ✅ Test 8: Frames are packed into batched requests and mapped back to their own analyses
+def test_analyze_images_batches_requests(stub_server, frames, monkeypatch):
+    monkeypatch.setattr(gpt_integration.config, "ANALYZE_BATCH_SIZE", 3)
+    results = gpt_integration.analyze_images(frames, "open pit")
+    assert list(results) == frames
+    assert stub_server.images == [3, 3, 2]
+    assert [results[f] for f in frames[:3]] == ["stub analysis 1", "stub analysis 2", "stub analysis 3"]
+    assert results[frames[7]] == "stub analysis 2"
+
+
+# ⚠️ Test 9: A malformed batched reply falls back to one request per frame
+def test_analyze_images_falls_back_to_single(stub_server, frames, monkeypatch):
+    monkeypatch.setattr(gpt_integration.config, "ANALYZE_BATCH_SIZE", 4)
+    stub_server.malformed = True
+    results = gpt_integration.analyze_images(frames[:4], "open pit")
+    assert all(r == "stub analysis" for r in results.values())
+    assert stub_server.images == [4, 1, 1, 1, 1]
+
+
+# ✅ Test 10: Batches stay within the frame count and token budget
+def test_plan_batches_respects_budget(monkeypatch):
+    monkeypatch.setattr(gpt_integration.config, "ANALYZE_EST_TOKENS", 100)
+    per_frame = 1000 + gpt_integration.MAX_TOKENS
+    assert gpt_integration.plan_batches([1000] * 5, max_frames=2, token_budget=10**6) == [[0, 1], [2, 3], [4]]
+    assert gpt_integration.plan_batches([1000] * 5, max_frames=8, token_budget=100 + 2 * per_frame) == \
+        [[0, 1], [2, 3], [4]]
+    # A frame larger than the budget still gets a request of its own
+    assert gpt_integration.plan_batches([50000, 10], max_frames=8, token_budget=8000) == [[0], [1]]
+
+
+# ✅ Test 11: Partial or odd batched replies keep only usable entries
+def test_parse_batch_response():
+    parse = gpt_integration.parse_batch_response
+    assert parse('{"frames": [{"frame": 2, "analysis": "b"}, {"frame": 1, "analysis": "a"}]}', 2) == {1: "a", 2: "b"}
+    assert parse('{"frames": [{"analysis": "a"}, {"frame": 9, "analysis": "x"}, {"frame": 2, "analysis": " "}]}', 2) == {1: "a"}
+    assert parse("Frame 1: tailings", 1) == {}
+
+
+# ✅ Test 12: The engine yields every frame of a batch as soon as the batch returns
+def test_analyze_concurrently_with_batches(stub_server, frames):
+    results = dict(analyze_concurrently(frames, "open pit", workers=2,
+                                        analyze_batch=gpt_integration.analyze_images, batch_size=4))
+    assert set(results) == set(frames)
+    assert sorted(stub_server.images) == [4, 4]
+
+
+# ⚠️ Test 13: An undecodable frame gets an error entry instead of aborting the batched run
+def test_analyze_images_isolates_undecodable_frame(stub_server, frames, monkeypatch):
+    with open(frames[1], "wb") as f:
+        f.write(b"corrupt")
+    real_preprocess = gpt_integration.preprocess_image
+
+    def preprocess(image_bytes):
+        if image_bytes == b"corrupt":
+            raise cv2.error("imdecode: corrupt JPEG data")
+        return real_preprocess(image_bytes)
+
+    monkeypatch.setattr(gpt_integration, "preprocess_image", preprocess)
+    errors = gpt_integration.metrics.ANALYZE_ERRORS.value(error="error")
+    results = dict(analyze_concurrently(frames[:4], "open pit", workers=2,
+                                        analyze_batch=gpt_integration.analyze_images, batch_size=4))
+    assert set(results) == set(frames[:4])
+    assert results[frames[1]].startswith("Error during API call: ") and "corrupt JPEG" in results[frames[1]]
+    assert all(results[f].startswith("stub analysis") for f in (frames[0], frames[2], frames[3]))
+    assert gpt_integration.metrics.ANALYZE_ERRORS.value(error="error") == errors + 1
+    assert stub_server.images == [3]
+
+
+# ⚠️ Test 14: An empty completion becomes an error entry and is not cached
+def test_empty_completion_is_an_error(stub_server, frames, monkeypatch):
+    stored = []
+    monkeypatch.setattr(gpt_integration, "_cache_store", lambda key, result: stored.append(result))
+    stub_server.empty = True
+    errors = gpt_integration.metrics.ANALYZE_ERRORS.value(error="ValueError")
+    assert gpt_integration.analyze_image(frames[0], "open pit") == "Error during API call: empty response"
+    assert stored == []
+    assert gpt_integration.metrics.ANALYZE_ERRORS.value(error="ValueError") == errors + 1
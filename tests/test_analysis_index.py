@@ -0,0 +1,155 @@
+import os
+import time
+import cv2
+import numpy as np
+import pytest
+import app as app_module  # the module object serving requests
+import services.analysis_index as app_analysis_index
+from src.jobs import get_store
+from src.services.analysis_index import AnalysisIndex, match_expression
+
+
+# 🔧 Fixture: empty index in a temporary database
+@pytest.fixture
+def index(tmp_path):
+    return AnalysisIndex(str(tmp_path / "index.db"))
+
+
+# 🔧 Fixture: the app indexing into a temporary database
+@pytest.fixture
+def app_index(tmp_path, monkeypatch):
+    index = AnalysisIndex(str(tmp_path / "app_index.db"))
+    monkeypatch.setattr(app_analysis_index, "_index", index)
+    monkeypatch.setattr(app_analysis_index.config, "ANALYSIS_INDEX_ENABLED", True)
+    return index
+
+
+# ✅ Test 1: The most relevant analyses across runs come first, with stemming
+def test_search_ranks_across_runs(index):
+    index.add_run("flight-1", video_path="/videos/north.mp4")
+    index.add_run("flight-2", video_path="/videos/south.mp4")
+    index.add("flight-1", "f1/frame_0.jpg", "Tailings pond overflowing; severe erosion along the berm.", "Gold, open pit")
+    index.add("flight-1", "f1/frame_1.jpg", "Haul road dry, no visible issues.", "Gold, open pit")
+    index.add("flight-2", "f2/frame_0.jpg", "Minor erosion on the eastern slope.", "Nickel, laterite")
+
+    hits = index.search("tailing overflow erosion", k=5)
+    assert [h["frame"] for h in hits] == ["f1/frame_0.jpg", "f2/frame_0.jpg"]
+    assert hits[0]["video_path"] == "/videos/north.mp4"
+    assert "[Tailings]" in hits[0]["snippet"]
+    assert hits[0]["score"] <= hits[1]["score"]
+
+    assert [h["frame"] for h in index.search("erosion", run_id="flight-2")] == ["f2/frame_0.jpg"]
+    assert index.search("nickel")[0]["run_id"] == "flight-2"
+
+
+# ✅ Test 2: Re-analyzed frames replace their entry and removed frames disappear
+def test_updates_and_removal(index):
+    index.add("run", "frame_0.jpg", "turbid water")
+    index.add("run", "frame_0.jpg", "clear water")
+    index.add("run", "frame_1.jpg", "turbid runoff")
+    assert index.count("run") == 2
+    assert [h["frame"] for h in index.search("turbid")] == ["frame_1.jpg"]
+
+    index.remove("run", ["frame_1.jpg"])
+    assert index.search("turbid") == []
+    index.remove("run")
+    assert index.count() == 0
+
+
+# ⚠️ Test 3: Free text never breaks the FTS5 query syntax
+def test_query_sanitizing(index):
+    index.add("run", "frame_0.jpg", "Water NOT discolored near the outlet")
+    assert match_expression("  ?!  ") is None
+    assert index.search("?!") == []
+    assert match_expression('pond "AND" NOT(') == '"pond" OR "and" OR "not"'
+    assert len(index.search('discolored AND "outlet" NOT(')) == 1
+
+
+# ✅ Test 4: Top-k queries over tens of thousands of analyses take milliseconds
+def test_search_scales(index):
+    rng = np.random.default_rng(0)
+    words = ["tailings", "erosion", "pond", "haul", "road", "berm", "slope", "water", "dust", "vegetation"]
+    entries = [(f"frame_{i}.jpg", " ".join(rng.choice(words, 12)) + f" marker{i}") for i in range(20000)]
+    index.add_many("bulk", entries, "Gold")
+
+    start = time.perf_counter()
+    hits = index.search("marker12345 tailings", k=10)
+    elapsed = time.perf_counter() - start
+    assert hits[0]["frame"] == "frame_12345.jpg"
+    assert len(hits) == 10
+    assert elapsed < 0.5
+
+
+# ✅ Test 5: /analyze_stream indexes results as they arrive and /api/search finds them
+def test_analyze_stream_indexes_incrementally(app_index, monkeypatch):
+    results = {"frame_0.jpg": "Tailings seepage near the spillway", "frame_1.jpg": "Dense vegetation, no disturbance"}
+    fake = lambda path, context: results[os.path.basename(path)]
+    monkeypatch.setattr(app_module, "analyze_image", fake)
+    monkeypatch.setattr(app_module, "analyze_images",
+                        lambda paths, context: {p: fake(p, context) for p in paths})
+
+    store = get_store()
+    job_id = store.create()
+    client = app_module.app.test_client()
+    try:
+        with client.session_transaction() as sess:
+            sess['job_id'] = job_id
+        rng = np.random.default_rng(1)
+        paths = []
+        for i in range(2):
+            path = os.path.join(store.frame_dir(job_id), f"frame_{i}.jpg")
+            cv2.imwrite(path, cv2.resize((rng.random((8, 8, 3)) * 255).astype(np.uint8), (64, 64)))
+            paths.append(path)
+        store.add_frames(job_id, paths)
+
+        body = client.get('/analyze_stream?context=Copper').get_data(as_text=True)
+        assert "Analysis complete" in body
+        assert app_index.count(job_id) == 2
+
+        items = client.get('/api/search?q=spillway seepage&k=5').get_json()['items']
+        assert items[0]['job'] == job_id and items[0]['name'] == "frame_0.jpg"
+        assert items[0]['context'] == "Copper" and items[0]['url']
+        assert client.get('/api/search').status_code == 400
+    finally:
+        store.delete(job_id)
+
+
+# ⚠️ Test 6: A failing index does not fail frame removal
+def test_remove_frames_survives_index_failure(app_index, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("database disk image is malformed")
+
+    monkeypatch.setattr(app_index, "remove", broken)
+    store = get_store()
+    job_id = store.create()
+    client = app_module.app.test_client()
+    try:
+        with client.session_transaction() as sess:
+            sess['job_id'] = job_id
+        path = os.path.join(store.frame_dir(job_id), "frame_0.jpg")
+        cv2.imwrite(path, np.zeros((16, 16, 3), np.uint8))
+        store.add_frames(job_id, [path])
+
+        response = client.post('/remove_frames', json={'frames': ["frame_0.jpg"]})
+        assert response.status_code == 200 and response.get_json()['success']
+        assert store.frames(job_id) == [] and not os.path.exists(path)
+    finally:
+        store.delete(job_id)
+
+
+# ✅ Test 7: Entries older than the retention period are pruned with their emptied runs
+def test_retention_prunes_old_runs(tmp_path, monkeypatch):
+    path = str(tmp_path / "retained.db")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now - 40 * 86400)
+    AnalysisIndex(path).add_run("old-job", "web")
+    AnalysisIndex(path).add("old-job", "frame_0.jpg", "Acid drainage below the waste dump")
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    index = AnalysisIndex(path, retention_days=30)
+    index.add_run("new-job", "web")  # recording a run prunes expired entries
+    index.add("new-job", "frame_0.jpg", "Acid drainage in the pit lake")
+
+    assert index.count("old-job") == 0 and index.count() == 1
+    assert [hit["run_id"] for hit in index.search("acid drainage")] == ["new-job"]
+    assert index.prune(30 * 86400) == 0
@@ -1,8 +1,13 @@
 import unittest
 import os
 import json
-import shutil
-from src.app import app, extracted_frames as global_extracted_frames, analysis_results as global_analysis_results
+import hashlib
+from unittest import mock
+import cv2
+import numpy as np
+from src.app import app
+from src.jobs import get_store
+import uploads  # the module object the app registered
 
 class TestFrameRemoval(unittest.TestCase):
 
@@ -11,71 +16,51 @@ class TestFrameRemoval(unittest.TestCase):
         self.app_context = app.app_context()
         self.app_context.push()
 
-        # Configure a specific test frames directory
-        # app.root_path is the directory where app.py is located (src/)
-        self.frames_base_dir_name = 'data' # This is relative to app.root_path
-        self.frames_sub_dir_name = 'frames_test' # Use a different subdir to avoid conflict with actual 'data/frames'
-        
-        # Construct the full path to the test frames directory
-        self.test_frames_dir = os.path.join(app.root_path, self.frames_base_dir_name, self.frames_sub_dir_name)
-        
-        # Ensure the base 'data' directory exists
-        os.makedirs(os.path.join(app.root_path, self.frames_base_dir_name), exist_ok=True)
-        # Clean up and create the specific test frames directory
-        if os.path.exists(self.test_frames_dir):
-            shutil.rmtree(self.test_frames_dir)
-        os.makedirs(self.test_frames_dir)
+        # Each test gets its own job, so frames live in that job's directory
+        self.store = get_store()
+        self.job_id = self.store.create()
+        with self.client.session_transaction() as sess:
+            sess['job_id'] = self.job_id
+        self.test_frames_dir = self.store.frame_dir(self.job_id)
 
         self.dummy_frames_basenames = [f'test_frame{i}.jpg' for i in range(1, 4)] # test_frame1.jpg, test_frame2.jpg, test_frame3.jpg
-        
-        # These paths are relative to app.root_path, as stored in app.py globals
+
+        # Frame paths as stored in the job registry
         self.dummy_frames_paths_keys = [
-            os.path.join(self.frames_base_dir_name, self.frames_sub_dir_name, bn) 
+            os.path.join(self.test_frames_dir, bn)
             for bn in self.dummy_frames_basenames
         ]
 
-        # Create dummy files in the test directory
+        # Create dummy files in the job's frame directory
         for key_path in self.dummy_frames_paths_keys:
-            # physical_path is app.root_path + key_path
-            physical_path = os.path.join(app.root_path, key_path)
-            with open(physical_path, 'w') as f:
+            with open(key_path, 'w') as f:
                 f.write("dummy content") # Add some content to ensure it's a file
 
-        # Populate globals
-        # Make sure to assign to the imported global lists directly, not just class members
-        global_extracted_frames[:] = self.dummy_frames_paths_keys # Use slicing to modify in place
-        global_analysis_results.clear()
+        # Register the frames and an analysis for each with the job
+        self.store.add_frames(self.job_id, self.dummy_frames_paths_keys)
         for path_key in self.dummy_frames_paths_keys:
-            global_analysis_results[path_key] = f"analysis_for_{os.path.basename(path_key)}"
-        
-        # Store original values of app.py's frame/analysis containers for restoration
-        # This is important because app.py's remove_frames_route directly modifies the global variables
-        # We need to ensure that the test setup correctly points to these global variables
-        # And that it uses the *test-specific* paths for files.
-
-        # The current setup for global_extracted_frames and global_analysis_results
-        # correctly modifies the imported lists/dicts from app.py.
-        # The paths stored in these globals will be like 'data/frames_test/test_frame1.jpg'.
-        # The remove_frames_route in app.py uses os.path.join(app.root_path, frame_path_key)
-        # so it will correctly resolve to /app/src/data/frames_test/test_frame1.jpg if app.root_path is /app/src/
+            self.store.save_result(self.job_id, path_key, f"analysis_for_{os.path.basename(path_key)}")
 
     def tearDown(self):
-        if os.path.exists(self.test_frames_dir):
-            shutil.rmtree(self.test_frames_dir)
-        
-        # Clear globals after test
-        global_extracted_frames[:] = []
-        global_analysis_results.clear()
-        
+        # Removes the job's rows and its directory
+        self.store.delete(self.job_id)
         self.app_context.pop()
 
+    @property
+    def job_frames(self):
+        return self.store.frames(self.job_id)
+
+    @property
+    def job_results(self):
+        return self.store.results(self.job_id)
+
     def test_successful_removal_one_frame(self):
         frames_to_remove_basenames = [self.dummy_frames_basenames[0]]
         frame_path_key_to_remove = self.dummy_frames_paths_keys[0]
-        physical_path_to_remove = os.path.join(app.root_path, frame_path_key_to_remove)
+        physical_path_to_remove = frame_path_key_to_remove
 
-        initial_extracted_count = len(global_extracted_frames)
-        initial_analysis_count = len(global_analysis_results)
+        initial_extracted_count = len(self.job_frames)
+        initial_analysis_count = len(self.job_results)
 
         response = self.client.post('/remove_frames', json={'frames': frames_to_remove_basenames})
         data = json.loads(response.data)
@@ -86,21 +71,21 @@ class TestFrameRemoval(unittest.TestCase):
 
         self.assertFalse(os.path.exists(physical_path_to_remove))
         self.assertIn(frame_path_key_to_remove, self.dummy_frames_paths_keys) # Check it was a valid key
-        self.assertNotIn(frame_path_key_to_remove, global_extracted_frames)
-        self.assertNotIn(frame_path_key_to_remove, global_analysis_results)
+        self.assertNotIn(frame_path_key_to_remove, self.job_frames)
+        self.assertNotIn(frame_path_key_to_remove, self.job_results)
         
-        self.assertEqual(len(global_extracted_frames), initial_extracted_count - 1)
-        self.assertEqual(len(global_analysis_results), initial_analysis_count - 1)
+        self.assertEqual(len(self.job_frames), initial_extracted_count - 1)
+        self.assertEqual(len(self.job_results), initial_analysis_count - 1)
 
         # Check other files still exist
-        self.assertTrue(os.path.exists(os.path.join(app.root_path, self.dummy_frames_paths_keys[1])))
+        self.assertTrue(os.path.exists(self.dummy_frames_paths_keys[1]))
 
     def test_successful_removal_multiple_frames(self):
         frames_to_remove_basenames = self.dummy_frames_basenames[:2] # remove first two
         paths_keys_to_remove = self.dummy_frames_paths_keys[:2]
         
-        initial_extracted_count = len(global_extracted_frames)
-        initial_analysis_count = len(global_analysis_results)
+        initial_extracted_count = len(self.job_frames)
+        initial_analysis_count = len(self.job_results)
 
         response = self.client.post('/remove_frames', json={'frames': frames_to_remove_basenames})
         data = json.loads(response.data)
@@ -109,29 +94,29 @@ class TestFrameRemoval(unittest.TestCase):
         self.assertTrue(data['success'])
 
         for key_path in paths_keys_to_remove:
-            physical_path = os.path.join(app.root_path, key_path)
+            physical_path = key_path
             self.assertFalse(os.path.exists(physical_path))
-            self.assertNotIn(key_path, global_extracted_frames)
-            self.assertNotIn(key_path, global_analysis_results)
+            self.assertNotIn(key_path, self.job_frames)
+            self.assertNotIn(key_path, self.job_results)
         
-        self.assertEqual(len(global_extracted_frames), initial_extracted_count - 2)
-        self.assertEqual(len(global_analysis_results), initial_analysis_count - 2)
+        self.assertEqual(len(self.job_frames), initial_extracted_count - 2)
+        self.assertEqual(len(self.job_results), initial_analysis_count - 2)
         
         # Check the third frame (not removed) still exists
-        self.assertTrue(os.path.exists(os.path.join(app.root_path, self.dummy_frames_paths_keys[2])))
-        self.assertIn(self.dummy_frames_paths_keys[2], global_extracted_frames)
-        self.assertIn(self.dummy_frames_paths_keys[2], global_analysis_results)
+        self.assertTrue(os.path.exists(self.dummy_frames_paths_keys[2]))
+        self.assertIn(self.dummy_frames_paths_keys[2], self.job_frames)
+        self.assertIn(self.dummy_frames_paths_keys[2], self.job_results)
 
     def test_removal_of_non_existent_frame_basename(self):
         non_existent_basename = "frame_that_never_was.jpg"
         frame_to_remove_basename = self.dummy_frames_basenames[0]
         path_key_to_remove = self.dummy_frames_paths_keys[0]
-        physical_path_to_remove = os.path.join(app.root_path, path_key_to_remove)
+        physical_path_to_remove = path_key_to_remove
 
         frames_payload = [non_existent_basename, frame_to_remove_basename]
         
-        initial_extracted_count = len(global_extracted_frames)
-        initial_analysis_count = len(global_analysis_results)
+        initial_extracted_count = len(self.job_frames)
+        initial_analysis_count = len(self.job_results)
 
         response = self.client.post('/remove_frames', json={'frames': frames_payload})
         data = json.loads(response.data)
@@ -141,24 +126,24 @@ class TestFrameRemoval(unittest.TestCase):
 
         # Existing frame should be removed
         self.assertFalse(os.path.exists(physical_path_to_remove))
-        self.assertNotIn(path_key_to_remove, global_extracted_frames)
-        self.assertNotIn(path_key_to_remove, global_analysis_results)
+        self.assertNotIn(path_key_to_remove, self.job_frames)
+        self.assertNotIn(path_key_to_remove, self.job_results)
         
-        self.assertEqual(len(global_extracted_frames), initial_extracted_count - 1)
-        self.assertEqual(len(global_analysis_results), initial_analysis_count - 1)
+        self.assertEqual(len(self.job_frames), initial_extracted_count - 1)
+        self.assertEqual(len(self.job_results), initial_analysis_count - 1)
 
     def test_removal_when_file_missing_but_in_globals(self):
         # Simulate a file that is in globals but already deleted from disk
         frame_to_remove_key = self.dummy_frames_paths_keys[0]
-        physical_path_to_remove = os.path.join(app.root_path, frame_to_remove_key)
+        physical_path_to_remove = frame_to_remove_key
         
         # Manually delete it from disk
         os.remove(physical_path_to_remove)
         self.assertFalse(os.path.exists(physical_path_to_remove)) # Pre-condition
-        self.assertIn(frame_to_remove_key, global_extracted_frames) # Pre-condition: still in global
+        self.assertIn(frame_to_remove_key, self.job_frames) # Pre-condition: still registered with the job
 
         frames_payload = [os.path.basename(frame_to_remove_key)]
-        initial_globals_count = len(global_extracted_frames)
+        initial_globals_count = len(self.job_frames)
 
         response = self.client.post('/remove_frames', json={'frames': frames_payload})
         data = json.loads(response.data)
@@ -167,9 +152,9 @@ class TestFrameRemoval(unittest.TestCase):
         self.assertTrue(data['success'])
         
         # Check it's removed from globals
-        self.assertNotIn(frame_to_remove_key, global_extracted_frames)
-        self.assertNotIn(frame_to_remove_key, global_analysis_results)
-        self.assertEqual(len(global_extracted_frames), initial_globals_count - 1)
+        self.assertNotIn(frame_to_remove_key, self.job_frames)
+        self.assertNotIn(frame_to_remove_key, self.job_results)
+        self.assertEqual(len(self.job_frames), initial_globals_count - 1)
 
     def test_invalid_request_payload_no_json(self):
         response = self.client.post('/remove_frames', data="this is not json")
@@ -193,8 +178,8 @@ class TestFrameRemoval(unittest.TestCase):
         self.assertEqual(data['message'], 'Invalid request format. Expected {"frames": [...]}')
 
     def test_remove_no_frames_empty_list(self):
-        initial_extracted_frames = list(global_extracted_frames)
-        initial_analysis_results = dict(global_analysis_results)
+        initial_extracted_frames = list(self.job_frames)
+        initial_analysis_results = dict(self.job_results)
         
         response = self.client.post('/remove_frames', json={'frames': []})
         data = json.loads(response.data)
@@ -204,11 +189,233 @@ class TestFrameRemoval(unittest.TestCase):
         self.assertEqual(data['message'], 'No frames specified for removal.')
 
         # Check that no files were deleted and globals are unchanged
-        self.assertEqual(global_extracted_frames, initial_extracted_frames)
-        self.assertEqual(global_analysis_results, initial_analysis_results)
+        self.assertEqual(self.job_frames, initial_extracted_frames)
+        self.assertEqual(self.job_results, initial_analysis_results)
         for key_path in self.dummy_frames_paths_keys:
-            physical_path = os.path.join(app.root_path, key_path)
+            physical_path = key_path
             self.assertTrue(os.path.exists(physical_path))
 
+class TestJobIsolation(unittest.TestCase):
+
+    def setUp(self):
+        self.store = get_store()
+        self.clients = [app.test_client(), app.test_client()]
+        self.job_ids = []
+        for client in self.clients:
+            client.get('/preview_frames')  # first request creates a job for the session
+            with client.session_transaction() as sess:
+                self.job_ids.append(sess['job_id'])
+
+    def tearDown(self):
+        for job_id in self.job_ids:
+            self.store.delete(job_id)
+
+    def test_sessions_get_separate_jobs(self):
+        self.assertNotEqual(self.job_ids[0], self.job_ids[1])
+        frame = os.path.join(self.store.frame_dir(self.job_ids[0]), 'frame_0.jpg')
+        self.store.add_frames(self.job_ids[0], [frame])
+
+        first = json.loads(self.clients[0].get('/preview_frames').data)
+        second = json.loads(self.clients[1].get('/preview_frames').data)
+        self.assertEqual(first['frames'], ['frame_0.jpg'])
+        self.assertEqual(second['frames'], [])
+
+    def test_abort_flags_only_the_callers_job(self):
+        response = self.clients[0].post('/analyze/abort')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.store.is_cancelled(self.job_ids[0], ('analyze',)))
+        self.assertFalse(self.store.is_cancelled(self.job_ids[1], ('analyze',)))
+        self.assertFalse(self.store.is_cancelled(self.job_ids[0], ('extract',)))
+
+    def test_abort_without_job(self):
+        response = app.test_client().post('/extract/abort')
+        self.assertEqual(response.status_code, 404)
+
+class TestFrameServing(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.store = get_store()
+        self.job_id = self.store.create()
+        with self.client.session_transaction() as sess:
+            sess['job_id'] = self.job_id
+        # A real full-resolution frame, written without a thumbnail
+        self.frame = os.path.join(self.store.frame_dir(self.job_id), 'frame_0.jpg')
+        image = (np.random.default_rng(0).random((720, 1280, 3)) * 255).astype(np.uint8)
+        cv2.imwrite(self.frame, image)
+        self.store.add_frames(self.job_id, [self.frame])
+        self.store.save_result(self.job_id, self.frame, 'analysis')
+
+    def tearDown(self):
+        self.store.delete(self.job_id)
+
+    def test_frame_etag_and_304(self):
+        response = self.client.get('/frames/frame_0.jpg')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+
+        again = self.client.get('/frames/frame_0.jpg', headers={'If-None-Match': etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.data, b'')
+
+    def test_thumbnail_generated_and_smaller(self):
+        response = self.client.get('/frames/thumb/frame_0.webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/webp')
+        self.assertLess(len(response.data), os.path.getsize(self.frame) / 5)
+        self.assertIn('ETag', response.headers)
+        self.assertEqual(self.client.get('/frames/thumb/frame_9.webp').status_code, 404)
+
+    def test_results_api_links_versioned_thumbnails(self):
+        item = json.loads(self.client.get('/api/results').data)['items'][0]
+        self.assertTrue(item['thumb'].startswith('/frames/thumb/frame_0.webp?v='))
+        self.assertTrue(item['url'].startswith('/frames/frame_0.jpg?v='))
+
+        response = self.client.get(item['thumb'])
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('max-age=', response.headers['Cache-Control'])
+
+class TestPaginationAPI(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.store = get_store()
+        self.job_id = self.store.create()
+        with self.client.session_transaction() as sess:
+            sess['job_id'] = self.job_id
+        frame_dir = self.store.frame_dir(self.job_id)
+        self.frames = [os.path.join(frame_dir, f'frame_{i * 30}.jpg') for i in range(7)]
+        self.store.add_frames(self.job_id, self.frames)
+        for i, path in enumerate(self.frames):
+            result = 'Error during API call: timeout' if i in (2, 5) else f'Tailings pond {i}, clear water'
+            self.store.save_result(self.job_id, path, result)
+
+    def tearDown(self):
+        self.store.delete(self.job_id)
+
+    def _walk(self, url):
+        names, cursor = [], None
+        while True:
+            page = json.loads(self.client.get(url + (f'&cursor={cursor}' if cursor else '')).data)
+            names.append([item['name'] for item in page['items']])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return names
+
+    def test_results_pages_follow_cursor(self):
+        pages = self._walk('/api/results?limit=3')
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), [os.path.basename(f) for f in self.frames])
+
+    def test_results_filters(self):
+        errors = self._walk('/api/results?limit=10&status=error')
+        self.assertEqual(errors, [['frame_60.jpg', 'frame_150.jpg']])
+        success = self._walk('/api/results?limit=2&status=success')
+        self.assertEqual(len(sum(success, [])), 5)
+        keyword = self._walk('/api/results?limit=10&q=POND 4')
+        self.assertEqual(keyword, [['frame_120.jpg']])
+        self.assertEqual(self._walk('/api/results?q=100%25'), [[]])
+
+    def test_frames_pages_follow_cursor(self):
+        pages = self._walk('/api/frames?limit=4')
+        self.assertEqual([len(p) for p in pages], [4, 3])
+
+    def test_invalid_page_parameters(self):
+        self.assertEqual(self.client.get('/api/results?limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/frames?cursor=abc').status_code, 400)
+        self.assertEqual(self.client.get('/api/results?status=maybe').status_code, 400)
+
+class TestChunkedUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        self.store = get_store()
+        self.data = os.urandom(250_000)
+        resp = self.client.post('/upload/init', json={'filename': 'flight.mp4', 'size': len(self.data)})
+        self.assertEqual(resp.status_code, 200)
+        self.upload = resp.get_json()
+        self.url = f"/upload/{self.upload['upload_id']}"
+
+    def tearDown(self):
+        self.store.delete(self.upload['job'])
+
+    def _put(self, offset, chunk, checksum=True):
+        headers = {'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest()} if checksum else {}
+        return self.client.put(f"{self.url}?offset={offset}", data=chunk, headers=headers,
+                               content_type='application/octet-stream')
+
+    def test_upload_in_chunks_records_video_and_hash(self):
+        self.assertEqual(self.upload['offset'], 0)
+        for offset in range(0, len(self.data), 100_000):
+            resp = self._put(offset, self.data[offset:offset + 100_000])
+            self.assertEqual(resp.status_code, 200)
+        body = resp.get_json()
+        self.assertTrue(body['complete'])
+        self.assertEqual(body['sha256'], hashlib.sha256(self.data).hexdigest())
+
+        job = self.store.get(self.upload['job'])
+        self.assertEqual(job['video_sha256'], body['sha256'])
+        with open(job['video_path'], 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_resume_after_dropped_chunk(self):
+        self._put(0, self.data[:100_000])
+        # A chunk that fails its checksum is discarded and the offset stays put
+        bad = self._put(100_000, b'x' * 100_000, checksum=False)
+        self.assertEqual(bad.status_code, 200)  # no checksum sent: accepted as-is
+        corrupt = self.client.put(f"{self.url}?offset=200000", data=self.data[200_000:],
+                                  headers={'X-Chunk-SHA256': '0' * 64},
+                                  content_type='application/octet-stream')
+        self.assertEqual(corrupt.status_code, 422)
+        self.assertEqual(corrupt.get_json()['offset'], 200_000)
+        self.assertEqual(os.path.getsize(self.store.get_upload(self.upload['upload_id'])['path']), 200_000)
+
+        # Stale offsets are refused with the committed one, which the client resumes from
+        stale = self._put(0, self.data[:100_000])
+        self.assertEqual(stale.status_code, 409)
+        status = self.client.get(self.url).get_json()
+        self.assertEqual(status['offset'], 200_000)
+        done = self._put(status['offset'], self.data[200_000:]).get_json()
+        self.assertTrue(done['complete'])
+        expected = self.data[:100_000] + b'x' * 100_000 + self.data[200_000:]
+        self.assertEqual(done['sha256'], hashlib.sha256(expected).hexdigest())
+
+    def test_hash_recomputed_when_running_hash_is_lost(self):
+        self._put(0, self.data[:100_000])
+        uploads._hashers.clear()  # e.g. the next chunk went to another server process
+        done = self._put(100_000, self.data[100_000:]).get_json()
+        self.assertEqual(done['sha256'], hashlib.sha256(self.data).hexdigest())
+
+    def test_chunk_past_declared_size(self):
+        resp = self._put(0, self.data + b'extra')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_abort_drops_upload_and_its_state(self):
+        upload_id = self.upload['upload_id']
+        path = self.store.get_upload(upload_id)['path']
+        self._put(0, self.data[:100_000])
+        self.assertIn(upload_id, uploads._hashers)
+        resp = self.client.delete(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIsNone(self.store.get_upload(upload_id))
+        self.assertFalse(os.path.exists(path))
+        self.assertNotIn(upload_id, uploads._hashers)
+        self.assertNotIn(upload_id, uploads._locks)
+        self.assertEqual(self.client.delete(self.url).status_code, 404)
+
+    def test_stale_uploads_expire(self):
+        upload_id = self.upload['upload_id']
+        self._put(0, self.data[:100_000])
+        with mock.patch.object(uploads.config, 'UPLOAD_STALE_SECONDS', -1), \
+                mock.patch.object(uploads, '_next_sweep', 0.0):
+            other = self.client.post('/upload/init', json={'filename': 'next.mp4', 'size': 10}).get_json()
+        self.store.delete(other['job'])
+        self.assertIsNone(self.store.get_upload(upload_id))
+        self.assertNotIn(upload_id, uploads._hashers)
+        self.assertNotIn(upload_id, uploads._locks)
+        self.assertEqual(self._put(100_000, self.data[100_000:]).status_code, 404)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,120 @@
+import json
+import os
+import cv2
+import numpy as np
+import pytest
+import src.batch as batch
+from src.batch import VideoTask, collect_tasks, process_video, run_batch
+
+
+# 🔧 Fixture: two short synthetic videos with distinct frames
+@pytest.fixture
+def videos(tmp_path):
+    paths = []
+    for seed in range(2):
+        path = str(tmp_path / f"site_{seed}.mp4")
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (160, 120))
+        rng = np.random.default_rng(seed)
+        for _ in range(60):
+            writer.write(cv2.resize((rng.random((6, 8, 3)) * 255).astype(np.uint8), (160, 120)))
+        writer.release()
+        paths.append(path)
+    return paths
+
+
+# 🔧 Fixture: canned summary instead of the LLM
+@pytest.fixture(autouse=True)
+def fake_summary(monkeypatch):
+    monkeypatch.setattr(batch, "stream_summary", lambda results, stats=None: iter(["All ", "clear."]))
+
+
+# ✅ Test 1: Directories and manifests expand to unique tasks with per-entry context
+def test_collect_tasks(videos, tmp_path):
+    manifest = tmp_path / "videos.json"
+    manifest.write_text(json.dumps(["site_0.mp4", {"path": "site_1.mp4", "context": "Quarry"}]))
+    listing = tmp_path / "videos.txt"
+    listing.write_text("# surveys\nsite_1.mp4\n")
+
+    assert [t.path for t in collect_tasks([str(tmp_path)], "Pit")] == videos
+    tasks = collect_tasks([str(manifest), str(listing)], "Pit")
+    assert [(os.path.basename(t.path), t.context) for t in tasks] == [("site_0.mp4", "Pit"), ("site_1.mp4", "Quarry")]
+
+
+# ✅ Test 2: A run writes JSON and HTML reports plus an index
+def test_run_batch_writes_reports(videos, tmp_path):
+    out = str(tmp_path / "out")
+    tasks = [VideoTask(v, "Pit") for v in videos]
+    outcomes = run_batch(tasks, out, 10, workers=1, analyze=lambda f, c: "ok")
+
+    assert [o.status for o in outcomes] == ["done", "done"]
+    for outcome in outcomes:
+        with open(os.path.join(outcome.report_dir, "report.json")) as f:
+            report = json.load(f)
+        assert len(report["frames"]) == 6 and report["summary"] == "All clear."
+        with open(os.path.join(outcome.report_dir, "report.html")) as f:
+            assert "All clear." in f.read()
+    with open(os.path.join(out, "index.json")) as f:
+        assert [e["path"] for e in json.load(f)] == videos
+
+
+# ✅ Test 3: An interrupted video resumes with only the missing frames, finished ones are skipped
+def test_resume_after_interruption(videos, tmp_path):
+    out = str(tmp_path / "out")
+    task = VideoTask(videos[0], "Pit")
+    calls = []
+
+    def flaky(frame, context):
+        calls.append(os.path.basename(frame))
+        if len(calls) > 2:
+            raise KeyboardInterrupt
+        return f"ok {os.path.basename(frame)}"
+
+    with pytest.raises(KeyboardInterrupt):
+        process_video(task, out, 10, analyze=flaky)
+    report_dir = next(os.scandir(out)).path
+    with open(os.path.join(report_dir, "results.jsonl")) as f:
+        saved = [json.loads(line)["frame"] for line in f]
+    assert len(saved) <= 2
+
+    calls.clear()
+    outcome = process_video(task, out, 10, analyze=lambda f, c: calls.append(os.path.basename(f)) or "ok")
+    assert outcome.status == "done" and outcome.frames == 6
+    assert outcome.analyzed == len(calls) == 6 - len(saved)
+    assert not set(calls) & set(saved)
+
+    assert process_video(task, out, 10, analyze=lambda f, c: pytest.fail("re-analyzed")).status == "skipped"
+
+
+# ✅ Test 4: Failed analyses leave the video unfinished so the next run retries them
+def test_failed_frames_are_retried(videos, tmp_path):
+    out = str(tmp_path / "out")
+    task = VideoTask(videos[0], "Pit")
+    outcome = process_video(task, out, 10, analyze=lambda f, c: "Error during API call: 429")
+    assert outcome.status == "failed"
+    assert not os.path.exists(os.path.join(outcome.report_dir, "report.json"))
+
+    outcome = process_video(task, out, 10, analyze=lambda f, c: "ok")
+    assert outcome.status == "done" and outcome.analyzed == 6
+
+
+# ⚠️ Test 5: Changing the interval re-extracts and re-analyzes instead of reusing the old frames
+def test_changed_interval_starts_afresh(videos, tmp_path):
+    out = str(tmp_path / "out")
+    task = VideoTask(videos[0], "Pit")
+
+    def partly_failing(frame, context):
+        name = os.path.basename(frame)
+        return "Error during API call: 429" if name == "frame_5.jpg" else f"every 10th: {name}"
+
+    assert process_video(task, out, 10, analyze=partly_failing).status == "failed"
+    calls = []
+    outcome = process_video(task, out, 5, analyze=lambda f, c: calls.append(f) or "every 5th")
+    assert outcome.status == "done" and outcome.frames > 6 and len(calls) == outcome.frames
+    with open(os.path.join(outcome.report_dir, "report.json")) as f:
+        report = json.load(f)
+    assert {r["result"] for r in report["frames"]} == {"every 5th"}
+    assert report["extraction_settings"]["interval"] == 5
+
+    # Finished at interval 5, a run at interval 10 is not skipped either
+    outcome = process_video(task, out, 10, analyze=lambda f, c: "every 10th")
+    assert outcome.status == "done" and 0 < outcome.analyzed == outcome.frames <= 6
@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from openai import OpenAI, RateLimitError
+from benchmarks.e2e import percentile
+from benchmarks.stub_openai import REPLY, StubOpenAI
+from benchmarks.synthetic import make_video
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ✅ Test 1: Synthetic videos have the requested size and length
+def test_make_video(tmp_path):
+    import cv2
+    info = make_video(str(tmp_path / "synthetic.mp4"), width=160, height=90, seconds=2, fps=10)
+    cap = cv2.VideoCapture(info["path"])
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == info["frames"] == 20
+    assert (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))) == (160, 90)
+    cap.release()
+
+
+# ✅ Test 2: The stub answers like the chat completions API, streamed or not, and injects 429s
+def test_stub_server_replies_and_throttles():
+    with StubOpenAI() as stub:
+        client = OpenAI(api_key="stub", base_url=stub.base_url, max_retries=0)
+        reply = client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": "hi"}])
+        assert reply.choices[0].message.content == REPLY and reply.usage.total_tokens > 0
+        pieces = [c.choices[0].delta.content or "" for c in client.chat.completions.create(
+            model="gpt-4", messages=[], stream=True)]
+        assert "".join(pieces) == REPLY
+        assert stub.counters() == {"requests": 2, "throttled": 0, "streamed": 1}
+
+    with StubOpenAI(rate_limit=1.0) as stub:
+        client = OpenAI(api_key="stub", base_url=stub.base_url, max_retries=0)
+        with pytest.raises(RateLimitError):
+            client.chat.completions.create(model="gpt-4", messages=[])
+        assert stub.counters()["throttled"] == 1
+
+
+# ✅ Test 3: Nearest-rank percentiles
+def test_percentile():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([], 50) == 0.0
+
+
+# ✅ Test 4: A small end-to-end run with 429s completes and reports every stage as JSON
+def test_e2e_benchmark_report(tmp_path):
+    output = tmp_path / "report.json"
+    proc = subprocess.run(
+        [sys.executable, "benchmarks/e2e.py", "--width", "160", "--height", "90", "--seconds", "4",
+         "--interval", "10", "--rate-limit", "0.3", "--output", str(output)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    report = json.loads(output.read_text())
+    assert set(report["stages"]) == {"upload", "extract", "analyze", "final"}
+    analyze = report["stages"]["analyze"]
+    assert analyze["frames"] == report["stages"]["extract"]["frames"] == 12
+    assert analyze["completed"] and analyze["errors"] == 0
+    assert analyze["api_requests"] == analyze["api_frames"] + analyze["throttled"]
+    assert report["stages"]["final"]["ttft"] is not None
+    assert report["peak_rss_mb"] > 0
@@ -0,0 +1,51 @@
+import os
+import random
+import shutil
+import cv2
+import numpy as np
+import pytest
+from src.frame_hashing import BKTree, dhash, find_duplicates, hamming
+
+TEST_OUTPUT_DIR = "tests/output_hash_frames"
+
+# 🔧 Fixture to write a few synthetic frames and clean them up afterwards
+@pytest.fixture
+def frames():
+    os.makedirs(TEST_OUTPUT_DIR, exist_ok=True)
+    rng = np.random.default_rng(0)
+    base = cv2.resize((rng.random((12, 16, 3)) * 255).astype(np.uint8), (320, 240))
+    other = cv2.resize((rng.random((12, 16, 3)) * 255).astype(np.uint8), (320, 240))
+    images = [base, cv2.add(base, 3), other]
+    paths = []
+    for i, img in enumerate(images):
+        path = os.path.join(TEST_OUTPUT_DIR, f"frame_{i}.jpg")
+        cv2.imwrite(path, img)
+        paths.append(path)
+    yield paths
+    shutil.rmtree(TEST_OUTPUT_DIR)
+
+# ✅ Test 1: Near-identical frames map to the first one, distinct frames do not
+def test_find_duplicates(frames):
+    duplicates = find_duplicates(frames, max_distance=5)
+    assert duplicates == {frames[1]: frames[0]}
+
+# ✅ Test 2: Negative distance disables deduplication
+def test_find_duplicates_disabled(frames):
+    assert find_duplicates(frames, max_distance=-1) == {}
+
+# ⚠️ Test 3: Unreadable images hash to None
+def test_dhash_missing_file():
+    assert dhash("tests/does_not_exist.jpg") is None
+
+# ✅ Test 4: BK-tree nearest lookup agrees with a brute-force scan
+def test_bktree_matches_brute_force():
+    rnd = random.Random(42)
+    keys = [rnd.getrandbits(64) for _ in range(2000)]
+    tree = BKTree()
+    for i, key in enumerate(keys):
+        tree.add(key, i)
+    for _ in range(50):
+        probe = keys[rnd.randrange(len(keys))] ^ (1 << rnd.randrange(64))
+        best = min(hamming(probe, k) for k in keys)
+        match = tree.nearest(probe, max_distance=3)
+        assert match is not None and match[1] == best
@@ -0,0 +1,118 @@
+import os
+import cv2
+import numpy as np
+import pytest
+from src.app import app
+from src.jobs import get_store
+from src.video_processing import ExtractionStats, iter_frames
+import src.video_processing as video_processing
+from frame_quality import FrameQuality, score, score_batch
+
+
+def _scene(seed=0, size=(240, 320)):
+    """Textured frame: random blocks with hard edges, like rock faces and machinery."""
+    rng = np.random.default_rng(seed)
+    blocks = (rng.random((size[0] // 16, size[1] // 16, 3)) * 255).astype(np.uint8)
+    return cv2.resize(blocks, (size[1], size[0]), interpolation=cv2.INTER_NEAREST)
+
+
+def _blur(frame):
+    return cv2.GaussianBlur(frame, (0, 0), 10)
+
+
+def _fog(frame):
+    return cv2.addWeighted(frame, 0.3, np.full_like(frame, 210), 0.7, 0)
+
+
+# 🔧 Fixture: 40-frame video whose scheduled frames (every 10th) are blurred in slots 0 and 2
+@pytest.fixture
+def blurry_video(tmp_path):
+    path = str(tmp_path / "blurry.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (320, 240))
+    for i in range(40):
+        frame = _scene(i)
+        writer.write(_blur(frame) if i in (0, 20) else frame)
+    writer.release()
+    return path
+
+
+# ✅ Test 1: Blur lowers sharpness, fog raises haze and black frames count as clipped
+def test_scores_separate_bad_frames():
+    clear = score(_scene())
+    assert clear.passes()
+    assert score(_blur(_scene())).sharpness < clear.sharpness / 4
+    assert score(_fog(_scene())).haze > clear.haze + 0.3
+    assert score(np.zeros((240, 320, 3), np.uint8)).clipped == 1.0
+    assert not score(_blur(_scene())).passes()
+
+
+# ✅ Test 2: Scoring a batch matches scoring its frames one by one
+def test_batch_matches_single():
+    frames = [_scene(0), _blur(_scene(1)), _fog(_scene(2))]
+    batch = score_batch(np.stack(frames))
+    for frame, quality in zip(frames, batch):
+        single = score(frame)
+        assert quality.sharpness == pytest.approx(single.sharpness, rel=1e-4)
+        assert quality.haze == pytest.approx(single.haze)
+
+
+# ✅ Test 3: Swap mode keeps the next sharp frame in place of a blurred one
+def test_swap_replaces_blurred_frames(blurry_video, tmp_path, monkeypatch):
+    monkeypatch.setattr(video_processing.config, "QUALITY_GATE", "swap")
+    monkeypatch.setattr(video_processing.config, "FRAME_CACHE_ENABLED", False)
+    batches = []
+    real_score_batch = video_processing.frame_quality.score_batch
+    monkeypatch.setattr(video_processing.frame_quality, "score_batch",
+                        lambda frames: batches.append(len(frames)) or real_score_batch(frames))
+    stats = ExtractionStats()
+    frames = list(iter_frames(blurry_video, str(tmp_path / "out"), 10, stats))
+    # Each blurred slot's swap window (QUALITY_SEARCH_FRAMES candidates) is scored as one batch
+    assert sorted(batches)[-2:] == [8, 8]
+
+    assert [os.path.basename(f) for f in frames] == [f"frame_{i}.jpg" for i in range(4)]
+    assert stats.frames_swapped == 2 and stats.frames_dropped == 0
+    assert stats.frames_read == 40
+    # The sharpest of the following frames wins, so only the direction of the offset is fixed
+    assert [stats.quality[f].offset > 0 for f in frames] == [True, False, True, False]
+    assert all(stats.quality[f].passes() for f in frames)
+
+
+# ✅ Test 4: Drop mode skips blurred frames but keeps slot numbering
+def test_drop_skips_blurred_frames(blurry_video, tmp_path, monkeypatch):
+    monkeypatch.setattr(video_processing.config, "QUALITY_GATE", "drop")
+    stats = ExtractionStats()
+    frames = list(iter_frames(blurry_video, str(tmp_path / "out"), 10, stats))
+
+    assert [os.path.basename(f) for f in frames] == ["frame_1.jpg", "frame_3.jpg"]
+    assert stats.frames_dropped == 2 and stats.frames_swapped == 0
+
+
+# ✅ Test 5: With the gate off every scheduled frame is kept unscored
+def test_gate_off(blurry_video, tmp_path, monkeypatch):
+    monkeypatch.setattr(video_processing.config, "QUALITY_GATE", "off")
+    stats = ExtractionStats()
+    frames = list(iter_frames(blurry_video, str(tmp_path / "out"), 10, stats))
+    assert len(frames) == 4
+    assert stats.quality == {}
+
+
+# ✅ Test 6: Stored scores are returned by /preview_frames and /api/frames
+def test_quality_exposed_by_api():
+    client = app.test_client()
+    store = get_store()
+    job_id = store.create()
+    try:
+        with client.session_transaction() as sess:
+            sess['job_id'] = job_id
+        frame_dir = store.frame_dir(job_id)
+        paths = [os.path.join(frame_dir, f"frame_{i}.jpg") for i in range(2)]
+        store.add_frames(job_id, paths, {paths[0]: FrameQuality(42.123456, 0.01, 0.2, offset=3)})
+
+        data = client.get('/preview_frames').get_json()
+        assert data['quality'] == [{'sharpness': 42.1235, 'clipped': 0.01, 'haze': 0.2, 'offset': 3}, None]
+
+        items = client.get('/api/frames').get_json()['items']
+        assert items[0]['quality']['offset'] == 3
+        assert items[1]['quality'] is None
+    finally:
+        store.delete(job_id)
@@ -0,0 +1,136 @@
+import hashlib
+import os
+from types import SimpleNamespace
+import cv2
+import numpy as np
+import pytest
+import frame_store  # the module object the app, extractor and analysis read from
+import gpt_integration as app_gpt_integration
+from benchmarks.synthetic import make_video
+from src.app import app
+from src.frame_store import FrameStore
+from src.jobs import get_store
+from src.video_processing import iter_frames
+
+
+# 🔧 Fixture: a fresh process-wide store for the app, extractor and analysis
+@pytest.fixture
+def store(monkeypatch):
+    store = FrameStore(64 * 1024 * 1024)
+    monkeypatch.setattr(frame_store, "_store", store)
+    return store
+
+
+def _put(store, path, data):
+    """Write a file and keep its bytes, as extraction does."""
+    with open(path, "wb") as f:
+        f.write(data)
+    store.put(str(path), data)
+
+
+# ✅ Test 1: Memory is bounded by bytes and the least recently used frames go first
+def test_lru_eviction(tmp_path):
+    store = FrameStore(max_bytes=300)
+    for name in "abc":
+        _put(store, tmp_path / name, name.encode() * 100)
+    assert store.get(str(tmp_path / "a")).data == b"a" * 100  # a becomes most recently used
+    _put(store, tmp_path / "d", b"d" * 100)
+    assert str(tmp_path / "b") not in store
+    assert [p in store for p in (tmp_path / "a", tmp_path / "c", tmp_path / "d")] == [True, True, True]
+    assert store.size() == 300
+    _put(store, tmp_path / "huge", b"x" * 301)  # larger than the budget: not kept
+    assert str(tmp_path / "huge") not in store and store.size() == 300
+
+
+# ✅ Test 2: Evicted frames spill to the memory-mapped ring and come back from it
+def test_spill_ring(tmp_path):
+    store = FrameStore(max_bytes=200, spill_dir=str(tmp_path / "spill"), spill_bytes=250)
+    frames = {f"f{i}": bytes([i]) * 100 for i in range(6)}
+    for name, data in frames.items():
+        _put(store, tmp_path / name, data)
+    # f0..f3 were pushed out; the 250-byte ring only holds the last two of them
+    assert str(tmp_path / "f0") not in store and str(tmp_path / "f1") not in store
+    spilled = store.get(str(tmp_path / "f2"))
+    assert spilled.data == frames["f2"] and spilled.etag == hashlib.sha1(frames["f2"]).hexdigest()
+    assert store.get(str(tmp_path / "f3")).data == frames["f3"]
+
+    store.discard_dir(str(tmp_path))
+    assert all(str(tmp_path / name) not in store for name in frames)
+
+
+# ⚠️ Test 3: Files written outside the store are read through once, then replaced bytes win
+def test_read_through_and_write(store, tmp_path):
+    path = str(tmp_path / "frame_0.jpg")
+    with open(path, "wb") as f:
+        f.write(b"on disk")
+    first = store.read(path)
+    assert first.data == b"on disk"
+    assert store.read(path) is first  # kept in memory, not read again
+    store.write(path, b"rewritten")
+    with open(path, "rb") as f:
+        assert f.read() == b"rewritten"
+    assert store.read(path).data == b"rewritten"
+    os.remove(path)
+    assert store.get(path) is None
+    with pytest.raises(FileNotFoundError):
+        store.read(path)
+
+
+# ⚠️ Test 4: Frames rewritten or removed by another server process are not served stale
+def test_other_process_changes_invalidate(tmp_path):
+    worker_a, worker_b = FrameStore(1 << 20), FrameStore(1 << 20, str(tmp_path / "spill"), 1 << 20)
+    path = str(tmp_path / "frame_0.jpg")
+    worker_a.write(path, b"first extraction")
+    old = worker_b.read(path)
+    worker_a.write(path, b"re-extracted frame")  # worker B is never told
+    new = worker_b.read(path)
+    assert new.data == b"re-extracted frame" and new.etag != old.etag
+
+    # Also for entries that were spilled out of memory
+    for i in range(2):
+        _put(worker_b, tmp_path / f"filler_{i}", bytes(600 * 1024))
+    assert path in worker_b and worker_b.size() == 600 * 1024  # only filler_1 is left in memory
+    os.remove(path)
+    assert worker_b.get(path) is None and path not in worker_b
+
+
+# ✅ Test 5: Extracted frames are served and analyzed from memory without reading their files
+def test_extracted_frames_skip_disk(store, tmp_path, monkeypatch):
+    reply = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Haul road"))],
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120))
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kw: reply)))
+    monkeypatch.setattr(app_gpt_integration.config, "ANALYSIS_CACHE_ENABLED", False)
+    monkeypatch.setattr(app_gpt_integration, "rate_limiter",
+                        SimpleNamespace(acquire=lambda n: 0.0, reconcile=lambda e, a: None))
+    monkeypatch.setattr(app_gpt_integration, "get_client", lambda: client)
+    monkeypatch.setattr(frame_store.config, "FRAME_CACHE_ENABLED", False)
+
+    video = str(tmp_path / "clip.mp4")
+    make_video(video, width=160, height=120, seconds=2)
+    jobs = get_store()
+    job_id = jobs.create()
+    client_app = app.test_client()
+    try:
+        with client_app.session_transaction() as sess:
+            sess['job_id'] = job_id
+        frames = list(iter_frames(video, jobs.frame_dir(job_id), 30))
+        expected = [store.get(p).data for p in frames]
+
+        def no_reads(*args, **kwargs):
+            raise AssertionError("frame file read")
+        monkeypatch.setattr(frame_store, "open", no_reads, raising=False)
+
+        response = client_app.get(f'/frames/{os.path.basename(frames[0])}')
+        assert response.status_code == 200
+        assert response.mimetype == "image/jpeg"
+        assert response.get_data() == expected[0]
+        assert cv2.imdecode(np.frombuffer(expected[0], np.uint8), cv2.IMREAD_COLOR).shape == (120, 160, 3)
+        assert client_app.get(f'/frames/{os.path.basename(frames[0])}',
+                              headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+        assert app_gpt_integration.analyze_image(frames[1], "Pit") == "Haul road"
+
+        jobs.delete(job_id)
+        assert all(p not in store for p in frames)
+    finally:
+        jobs.delete(job_id)
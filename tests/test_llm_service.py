@@ -0,0 +1,187 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from langchain_community.chat_models import ChatOpenAI
+from openai import OpenAI
+from src.services import llm_service
+from src.services.analysis_cache import AnalysisCache
+
+# 🔧 Fake LLM call: records every call and returns the cited frames of its input
+class FakeSummarizer:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, kind, text):
+        with self.lock:
+            self.calls.append(kind)
+        frames = sorted(set(re.findall(r"frame_\d+", text)), key=lambda f: int(f.split("_")[1]))
+        return f"[{', '.join(frames)}] {kind} summary"
+
+# 🔧 Keep the persistent chunk summary cache out of tests unless a test installs one
+@pytest.fixture(autouse=True)
+def no_summary_cache(monkeypatch):
+    monkeypatch.setattr(llm_service, "get_summary_cache", lambda: None)
+
+@pytest.fixture
+def small_budget(monkeypatch):
+    monkeypatch.setattr(llm_service.config, "SUMMARY_CHUNK_TOKENS", 200)
+    monkeypatch.setattr(llm_service.config, "SUMMARY_WORKERS", 4)
+    monkeypatch.setattr(llm_service.config, "SUMMARY_MAX_LEVELS", 6)
+
+def _results(n):
+    return {f"data/frames/frame_{i}.jpg": f"Frame {i}: " + "tailings and turbid water " * 10
+            for i in range(n)}
+
+# ✅ Test 1: Small runs go straight to the final summary
+def test_single_call_when_within_budget(small_budget):
+    fake = FakeSummarizer()
+    summary = llm_service.map_reduce_summary(llm_service.cited_entries(_results(2)), fake)
+    assert fake.calls == ["final"]
+    assert "frame_0" in summary and "frame_1" in summary
+
+# ✅ Test 2: Large runs are mapped, reduced, and keep provenance of every frame
+def test_hierarchical_reduce_keeps_provenance(small_budget):
+    fake = FakeSummarizer()
+    summary = llm_service.map_reduce_summary(llm_service.cited_entries(_results(120)), fake)
+    assert fake.calls.count("map") > 1
+    assert "reduce" in fake.calls
+    assert fake.calls[-1] == "final"
+    assert all(f"frame_{i}" in summary for i in range(120))
+
+# ✅ Test 3: Identical analyses are merged into one cited entry
+def test_cited_entries_groups_identical_results():
+    entries = llm_service.cited_entries({
+        "a/frame_1.jpg": "Clear water", "a/frame_2.jpg": "Erosion", "a/frame_3.jpg": "Clear water"})
+    assert entries == ["[frame_1, frame_3] Clear water", "[frame_2] Erosion"]
+
+# ✅ Test 4: Chunks respect the token budget and do not shift when an entry is removed
+def test_chunk_entries_budget_and_stability():
+    entries = [f"[frame_{i}] " + "tailings " * (5 + i % 20) for i in range(200)]
+    chunks = llm_service.chunk_entries(entries, 250)
+    assert [e for c in chunks for e in c] == entries
+    assert all(sum(llm_service.count_tokens(e) for e in c) <= 250 for c in chunks if len(c) > 1)
+    removed = entries[100]
+    after = llm_service.chunk_entries([e for e in entries if e != removed], 250)
+    changed = [c for c in after if c not in chunks]
+    assert len(changed) <= 2
+
+# ✅ Test 5: After removing a frame only the affected chunks and the final step hit the LLM
+def test_resummarize_after_removal_reuses_cached_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_service.config, "SUMMARY_CHUNK_TOKENS", 1500)
+    cache = AnalysisCache(str(tmp_path / "summary_cache.db"), 0, 0)
+    monkeypatch.setattr(llm_service, "get_summary_cache", lambda: cache)
+    calls = []
+
+    def fake(kind, text):
+        # Compact summaries, like a real model's, citing the span of frames covered
+        calls.append(kind)
+        frames = re.findall(r"frame_\d+", text)
+        return f"[{frames[0]}..{frames[-1]}] {kind} summary of {len(frames)} frames " + "findings " * 30
+
+    results = _results(300)
+    llm_service._summarize(results, "fake", fake)
+    full_run = len(calls)
+
+    del results["data/frames/frame_150.jpg"]
+    calls.clear()
+    llm_service._summarize(results, "fake", fake)
+    assert calls[-1] == "final"
+    assert len(calls) <= 3 < full_run
+    assert cache.stats()["hits"] > 0
+
+# 🔧 Fake OpenAI server: streams the reply word by word when asked to, else answers in one go
+class StubStreamingCompletions(BaseHTTPRequestHandler):
+    reply = "Tailings seepage near the pit [frame_0, frame_1]."
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StubStreamingCompletions.requests.append(body)
+        if not body.get("stream"):
+            data = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.reply}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in re.findall(r"\S+\s*", self.reply):
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                     "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    StubStreamingCompletions.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubStreamingCompletions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    yield base_url
+    server.shutdown()
+
+def _point_backends(monkeypatch, module, chain_url, openai_url):
+    monkeypatch.setattr(module, "_llm", ChatOpenAI(model_name="gpt-4", openai_api_key="test",
+                                                   openai_api_base=chain_url, max_retries=0))
+    monkeypatch.setattr(module, "_client", OpenAI(api_key="test", base_url=openai_url, max_retries=0))
+
+# ✅ Test 6: Both backends stream the final summary piece by piece and record timing
+@pytest.mark.parametrize("backend", ["langchain", "openai"])
+def test_stream_summary_backends(monkeypatch, stub_server, backend):
+    _point_backends(monkeypatch, llm_service, stub_server, stub_server)
+    stats = llm_service.SummaryStats()
+    pieces = list(llm_service.stream_summary(_results(2), backend, stats))
+    assert len(pieces) > 1
+    assert "".join(pieces) == StubStreamingCompletions.reply
+    assert stats.backend == backend
+    assert stats.tokens == len(pieces)
+    assert 0 <= stats.first_token <= stats.elapsed
+    assert StubStreamingCompletions.requests[-1]["stream"] is True
+
+# ✅ Test 7: A failing LangChain backend falls back to the direct OpenAI client
+def test_stream_summary_falls_back_to_openai(monkeypatch, stub_server):
+    monkeypatch.setattr(llm_service.config, "SUMMARY_BACKEND", "langchain")
+    _point_backends(monkeypatch, llm_service, "http://127.0.0.1:9/v1", stub_server)
+    stats = llm_service.SummaryStats()
+    assert "".join(llm_service.stream_summary(_results(2), stats=stats)) == StubStreamingCompletions.reply
+    assert stats.backend == "openai"
+
+# ✅ Test 8: /final_stream forwards pieces as SSE token events and ends with timing
+def test_final_stream_route(monkeypatch, stub_server):
+    from src.app import app
+    from src.jobs import get_store
+    import services.llm_service as app_llm_service  # the module object the app imported
+    monkeypatch.setattr(app_llm_service, "get_summary_cache", lambda: None)
+    _point_backends(monkeypatch, app_llm_service, stub_server, stub_server)
+    store = get_store()
+    job_id = store.create()
+    try:
+        paths = [f"{store.frame_dir(job_id)}/frame_{i}.jpg" for i in range(2)]
+        store.add_frames(job_id, paths)
+        for p in paths:
+            store.save_result(job_id, p, "Turbid water")
+        body = app.test_client().get(f"/final_stream?job={job_id}&backend=openai").get_data(as_text=True)
+    finally:
+        store.delete(job_id)
+    events = [m for m in body.split("\n\n") if m]
+    tokens = [m.split("data: ", 1)[1] for m in events if m.startswith("event: token")]
+    assert "".join(tokens) == StubStreamingCompletions.reply
+    assert events[-1].startswith("event: done")
+    done = json.loads(events[-1].split("data: ", 1)[1])
+    assert done["backend"] == "openai" and done["ttft"] <= done["elapsed"]
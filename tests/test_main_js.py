@@ -0,0 +1,56 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "src")
+SCRIPT = os.path.join(ROOT, "static", "js", "main.js")
+PAGE = os.path.join(ROOT, "templates", "index.html")
+
+# Minimal browser stand-in: elements record their listeners, and main.js runs on DOMContentLoaded
+HARNESS = r"""
+const fs = require('fs');
+const vm = require('vm');
+const [script, ids] = [process.argv[1], JSON.parse(process.argv[2])];
+
+function element(id) {
+  return {
+    id, value: '', checked: false, disabled: false, textContent: '', innerHTML: '',
+    style: {}, dataset: {}, listeners: {},
+    classList: { add() {}, remove() {}, toggle() {}, contains() { return false; } },
+    addEventListener(type, fn) { (this.listeners[type] = this.listeners[type] || []).push(fn); },
+    appendChild(child) { return child; }, append() {}, remove() {}, closest() { return null; },
+    querySelector() { return null; }, querySelectorAll() { return []; },
+  };
+}
+
+const elements = Object.fromEntries(ids.map(id => [id, element(id)]));
+const document = element('document');
+document.getElementById = id => elements[id] || null;
+document.createElement = tag => element(tag);
+const window = { location: { href: '/' } };
+const context = {
+  document, window, console, setTimeout, clearTimeout, localStorage: { getItem() { return null; }, setItem() {}, removeItem() {} },
+  IntersectionObserver: class { observe() {} },
+  EventSource: class { close() {} },
+  fetch: () => new Promise(() => {}),
+};
+vm.runInNewContext(fs.readFileSync(script, 'utf8'), context, { filename: script });
+document.listeners.DOMContentLoaded.forEach(fn => fn());
+const wired = Object.keys(elements).filter(id => Object.keys(elements[id].listeners).length);
+console.log(JSON.stringify(wired));
+"""
+
+
+# ✅ Test 1: main.js loads against the index page's elements and wires up its controls
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_main_js_loads():
+    with open(PAGE, encoding="utf-8") as f:
+        ids = re.findall(r'id="([^"]+)"', f.read())
+    result = subprocess.run(["node", "-e", HARNESS, SCRIPT, json.dumps(ids)],
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    wired = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    assert {"video", "cancel-upload", "extract-btn", "analyze-btn", "pipeline-btn"} <= wired
@@ -0,0 +1,113 @@
+import logging
+from types import SimpleNamespace
+import cv2
+import numpy as np
+import pytest
+import metrics  # the module object the app and pipeline record into
+from metrics import Counter, Histogram, ProgressLog, Registry
+from src.app import app
+from src.video_processing import extract_frames_parallel
+import gpt_integration as app_gpt_integration
+
+
+# 🔧 Fixture: short synthetic video with distinct frames
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "metrics.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (160, 120))
+    rng = np.random.default_rng(0)
+    for _ in range(60):
+        writer.write(cv2.resize((rng.random((6, 8, 3)) * 255).astype(np.uint8), (160, 120)))
+    writer.release()
+    return path
+
+
+# ✅ Test 1: Counters and histograms render in the Prometheus text format
+def test_render_text_format():
+    registry = Registry()
+    requests = registry.register(Counter("demo_requests_total", "Requests", ("status",)))
+    latency = registry.register(Histogram("demo_seconds", "Latency", buckets=(0.1, 1.0)))
+    requests.inc(status="ok")
+    requests.inc(2, status='bad "quote"')
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    text = registry.render()
+    assert "# TYPE demo_requests_total counter" in text
+    assert 'demo_requests_total{status="ok"} 1' in text
+    assert 'demo_requests_total{status="bad \\"quote\\""} 2' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="1"} 2' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in text
+    assert "demo_seconds_sum 5.55" in text and "demo_seconds_count 3" in text
+    with pytest.raises(ValueError):
+        requests.inc()
+
+
+# ✅ Test 2: Snapshots from another registry merge into totals
+def test_snapshot_merge():
+    a, b = Registry(), Registry()
+    for registry in (a, b):
+        registry.register(Histogram("demo_seconds", "Latency", buckets=(1.0,))).observe(0.5)
+    a.merge(b.snapshot())
+    assert a._metrics["demo_seconds"].count() == 2
+
+
+# ✅ Test 3: Progress is logged at most once per interval, not once per item
+def test_progress_log_is_throttled(caplog):
+    logger = logging.getLogger("test.progress")
+    progress = ProgressLog(logger, "Extracted", interval=3600)
+    with caplog.at_level(logging.INFO, logger="test.progress"):
+        for _ in range(500):
+            progress.update()
+    assert progress.count == 500 and not caplog.records
+
+    progress = ProgressLog(logger, "Analyzed", total=3, interval=0)
+    with caplog.at_level(logging.INFO, logger="test.progress"):
+        progress.update()
+    assert caplog.records[-1].getMessage().startswith("Analyzed 1/3 frames")
+
+
+# ✅ Test 4: Timings recorded in extraction worker processes reach the parent's metrics
+def test_parallel_extraction_records_worker_timings(video, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics.config, "EXTRACT_MIN_SEGMENT_FRAMES", 10)
+    monkeypatch.setenv("QUALITY_GATE", "off")  # read by the spawned workers
+    monkeypatch.setattr(metrics.config, "FRAME_CACHE_ENABLED", False)  # frames cached by earlier runs are not decoded
+    decoded = metrics.FRAME_DECODE_SECONDS.count()
+    saved = metrics.FRAMES_SAVED.value()
+    frames = extract_frames_parallel(video, str(tmp_path / "frames"), interval=5, workers=2)
+    assert len(frames) == 12
+    assert metrics.FRAME_DECODE_SECONDS.count() - decoded == 12
+    assert metrics.FRAMES_SAVED.value() - saved == 12
+
+
+# ✅ Test 5: /metrics exposes analysis outcomes, errors and token usage
+def test_metrics_endpoint(tmp_path, monkeypatch):
+    reply = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Tailings visible"))],
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120))
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=lambda **kw: reply)))
+    frame = tmp_path / "frame_0.jpg"
+    cv2.imwrite(str(frame), np.zeros((32, 32, 3), np.uint8))
+    monkeypatch.setattr(app_gpt_integration.config, "ANALYSIS_CACHE_ENABLED", False)
+    monkeypatch.setattr(app_gpt_integration, "rate_limiter",
+                        SimpleNamespace(acquire=lambda n: 0.0, reconcile=lambda e, a: None))
+    monkeypatch.setattr(app_gpt_integration, "get_client", lambda: client)
+    ok = metrics.ANALYZE_SECONDS.count(outcome="ok")
+    tokens = metrics.OPENAI_TOKENS.value(call="analyze", kind="prompt")
+    uploads = metrics.IMAGE_PAYLOAD_BYTES.count(kind="upload")
+
+    assert app_gpt_integration.analyze_image(str(frame), "Pit") == "Tailings visible"
+    assert app_gpt_integration.analyze_image(str(tmp_path / "missing.jpg"), "Pit").startswith("Error during API call")
+    assert metrics.ANALYZE_SECONDS.count(outcome="ok") == ok + 1
+    assert metrics.OPENAI_TOKENS.value(call="analyze", kind="prompt") == tokens + 100
+    assert metrics.IMAGE_PAYLOAD_BYTES.count(kind="upload") == uploads + 1
+
+    response = app.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert "# TYPE minewatch_analyze_seconds histogram" in body
+    assert 'minewatch_image_est_tokens_bucket{le="85"}' in body
+    assert 'minewatch_analyze_errors_total{error="FileNotFoundError"}' in body
+    assert 'minewatch_openai_tokens_total{call="analyze",kind="completion"}' in body
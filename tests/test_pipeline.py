@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+import pytest
+from src.pipeline import run_pipeline
+from src.thumbnails import thumb_path
+
+
+# 🔧 Fixture: short synthetic video with distinct frames
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "pipeline.mp4")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (160, 120))
+    rng = np.random.default_rng(0)
+    for _ in range(60):
+        writer.write(cv2.resize((rng.random((6, 8, 3)) * 255).astype(np.uint8), (160, 120)))
+    writer.release()
+    return path
+
+
+# ✅ Test 1: Every extracted frame is analyzed exactly once and the run reports completion
+def test_pipeline_analyzes_every_frame(video, tmp_path):
+    events = list(run_pipeline(video, str(tmp_path / "frames"), 10, "ctx",
+                               analyze=lambda f, c: f"ok {f}"))
+    extracted = [e[1] for e in events if e[0] == "extracted"]
+    analyzed = {e[1]: e[2] for e in events if e[0] == "analyzed"}
+    assert len(extracted) == 6
+    assert set(analyzed) == set(extracted)
+    assert all(os.path.isfile(thumb_path(f)) for f in extracted)
+    assert events[-1][0] == "done"
+
+
+# ✅ Test 2: Analysis starts before extraction has finished
+def test_pipeline_overlaps_extraction_and_analysis(video, tmp_path):
+    first_analyzed = None
+    seen = 0
+    for event in run_pipeline(video, str(tmp_path / "frames"), 1, "ctx",
+                              analyze=lambda f, c: "ok"):
+        if event[0] == "extracted":
+            seen += 1
+        elif event[0] == "analyzed" and first_analyzed is None:
+            first_analyzed = seen
+    assert first_analyzed is not None and first_analyzed < 60
+
+
+# ✅ Test 3: Setting the stop event winds down the decoder and workers promptly
+def test_pipeline_stop(video, tmp_path):
+    stop = threading.Event()
+    events = run_pipeline(video, str(tmp_path / "frames"), 1, "ctx", workers=1,
+                          analyze=lambda f, c: time.sleep(0.05) or "ok", stop=stop)
+    next(events)
+    stop.set()
+    events.close()
+    deadline = time.perf_counter() + 1
+    while any(t.name.startswith("pipeline-") for t in threading.enumerate()):
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+
+# ⚠️ Test 4: A video that cannot be opened ends the run with its error, not with 'done'
+def test_pipeline_error_is_final(tmp_path):
+    events = list(run_pipeline(str(tmp_path / "missing.mp4"), str(tmp_path / "frames"), 10, "ctx",
+                               analyze=lambda f, c: "ok"))
+    assert [e[0] for e in events] == ["error"]
@@ -0,0 +1,9 @@
+from benchmarks.startup import HEAVY_MODULES, measure_imports
+
+# ✅ Test 1: The app imports without an API key and leaves heavy modules unloaded
+def test_app_import_is_lazy():
+    report = measure_imports("app")
+    assert report["heavy_loaded"] == []
+    names = {m["name"] for m in report["modules"]}
+    assert not names & set(HEAVY_MODULES)
+    assert report["total_us"] > 0
@@ -0,0 +1,263 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import app as app_module  # the module object serving requests
+import asgi
+import streams
+from benchmarks.synthetic import make_video
+from src.jobs import CancelToken, get_store
+
+
+def _events(body):
+    """(id, event, data) of each message in an SSE body; comments and retry fields are skipped."""
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if ": " in line and not line.startswith(":"))
+        if "data" in fields:
+            events.append((fields.get("id"), fields.get("event", "message"), fields["data"]))
+    return events
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+async def _asgi_get(path, query="", headers=(), disconnect_after=None):
+    """Run one GET through the ASGI app. Returns (status, headers, body)."""
+    sent = []
+    disconnected = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        if disconnect_after is not None:
+            await asyncio.sleep(disconnect_after)
+            return {"type": "http.disconnect"}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers],
+             "server": ("testserver", 80), "client": ("127.0.0.1", 5000)}
+    await asgi.app(scope, receive, send)
+    disconnected.set()
+    start = sent[0]
+    body = b"".join(m.get("body", b"") for m in sent[1:]).decode()
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+# 🔧 Fixture: job whose analysis is stubbed; `gate` holds analyses back until set
+@pytest.fixture
+def job(monkeypatch):
+    gate = threading.Event()
+
+    def fake(path, context):
+        gate.wait(10)
+        return f"Analysis of {os.path.basename(path)}"
+
+    monkeypatch.setattr(app_module, "analyze_image", fake)
+    monkeypatch.setattr(app_module, "analyze_images", lambda paths, context: {p: fake(p, context) for p in paths})
+    monkeypatch.setattr(app_module.config, "SSE_POLL_INTERVAL", 0.02)
+    store = get_store()
+    job_id = store.create()
+    paths = [os.path.join(store.frame_dir(job_id), f"frame_{i}.jpg") for i in range(3)]
+    for path in paths:
+        with open(path, "wb") as f:
+            f.write(os.urandom(64))
+    store.add_frames(job_id, paths)
+    yield job_id, gate
+    gate.set()
+    store.delete(job_id)
+    # Runs still executing cancel themselves once the job is gone
+    _wait(lambda: all(r.job_id != job_id for r in list(streams._runs.values())))
+
+
+# ✅ Test 1: Events carry IDs; a reconnect with Last-Event-ID resumes the same run
+def test_resume_from_last_event_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module.config, "SSE_POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(app_module.config, "QUALITY_GATE", "off")
+    monkeypatch.setattr(app_module.config, "FRAME_CACHE_ENABLED", False)
+    video = str(tmp_path / "clip.mp4")
+    make_video(video, width=160, height=120, seconds=2)
+    store = get_store()
+    job_id = store.create(video)
+    client = app_module.app.test_client()
+    try:
+        body = client.get(f'/extract?job={job_id}&interval=10').get_data(as_text=True)
+        assert body.startswith("retry: ")
+        events = _events(body)
+        assert events[-2][2].startswith("Extraction complete: 6 frames")
+        assert events[-1][1] == "end"
+        ids = [int(e[0]) for e in events[:-1]]
+        assert ids == sorted(ids)
+
+        # Resuming replays only what followed, without extracting again
+        resumed = _events(client.get(f'/extract?job={job_id}',
+                                     headers={'Last-Event-ID': str(ids[2])}).get_data(as_text=True))
+        assert [e[2] for e in resumed[:-1]] == [e[2] for e in events[3:-1]]
+        assert len(store.frames(job_id)) == 6
+
+        # Nothing left to send: 204 tells EventSource to stop reconnecting
+        assert client.get(f'/extract?job={job_id}', headers={'Last-Event-ID': str(ids[-1])}).status_code == 204
+        assert client.get(f'/extract?job={job_id}', headers={'Last-Event-ID': 'bogus'}).status_code == 204
+    finally:
+        store.delete(job_id)
+
+
+# ✅ Test 2: Idle streams send heartbeat comments
+def test_heartbeat(job, monkeypatch):
+    job_id, gate = job
+    monkeypatch.setattr(streams.config, "SSE_HEARTBEAT_INTERVAL", 0)
+
+    def work():
+        gate.wait(10)
+        yield "done"
+
+    run = streams.start(job_id, "analyze", work, CancelToken(job_id))
+    tail = streams.Tail(run)
+    assert tail.poll() == ": keepalive\n\n"
+    gate.set()
+    _wait(lambda: get_store().stream_done(run))
+    text = tail.poll()
+    assert "data: done" in text and "event: end" in text and tail.done
+
+
+# ⚠️ Test 3: A run nobody follows any more is cancelled after the grace period
+def test_abandoned_run_is_cancelled(job, monkeypatch):
+    job_id, _ = job
+    monkeypatch.setattr(streams.config, "SSE_DISCONNECT_GRACE", 0.3)
+    cancel = CancelToken(job_id, ('analyze',))
+
+    def work():
+        yield "started"
+        while not cancel.is_set():
+            time.sleep(0.02)
+        yield "stopped"
+
+    run = streams.start(job_id, "analyze", work, cancel)
+    started = time.monotonic()
+    _wait(lambda: get_store().stream_done(run))
+    assert time.monotonic() - started >= 0.3
+    assert [e[2] for e in get_store().events_after(run)] == ["started", "stopped"]
+
+
+# ✅ Test 4: The ASGI app follows hundreds of streams on the event loop, not in threads
+def test_asgi_follows_many_streams(job):
+    job_id, gate = job
+
+    def work():
+        yield "started"
+        gate.wait(10)
+        yield from (f"frame_{i}.jpg → ok" for i in range(3))
+        yield "Analysis complete"
+
+    run = streams.start(job_id, "analyze", work, CancelToken(job_id))
+    _wait(lambda: get_store().events_after(run))
+    first_id = get_store().events_after(run)[0][0]
+
+    async def follow_all():
+        threads = threading.active_count()
+        tasks = [asyncio.create_task(_asgi_get('/analyze_stream', f'job={job_id}',
+                                               [('Last-Event-ID', str(first_id))]))
+                 for _ in range(200)]
+        await asyncio.sleep(0.3)
+        assert threading.active_count() - threads < 50
+        gate.set()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(follow_all())
+    for status, headers, body in results:
+        assert status == 200
+        assert headers["content-type"].startswith("text/event-stream")
+        assert streams.RUN_HEADER.lower() not in headers
+        messages = _events(body)
+        assert [m[2] for m in messages[:-1]] == [f"frame_{i}.jpg → ok" for i in range(3)] + ["Analysis complete"]
+        assert messages[-1][1] == "end"
+
+
+# ✅ Test 5: Disconnects end the ASGI response at once; other routes pass through to Flask
+def test_asgi_disconnect_and_passthrough(job):
+    job_id, gate = job
+
+    async def scenario():
+        started = time.monotonic()
+        status, _, body = await _asgi_get('/analyze_stream', f'job={job_id}&context=Pit', disconnect_after=0.1)
+        elapsed = time.monotonic() - started
+        metrics_status, metrics_headers, metrics_body = await _asgi_get('/metrics')
+        return status, body, elapsed, metrics_status, metrics_headers, metrics_body
+
+    status, body, elapsed, metrics_status, metrics_headers, metrics_body = asyncio.run(scenario())
+    assert status == 200 and body.startswith("retry: ")
+    assert elapsed < 2
+    assert metrics_status == 200 and metrics_headers["content-type"].startswith("text/plain")
+    assert 'minewatch_stream_connections_total{mode="async",resumed="false"}' in metrics_body
+
+
+# ⚠️ Test 6: A run replaced from another server process cancels itself
+def test_replaced_run_cancels_itself(job):
+    job_id, _ = job
+    store = get_store()
+    cancel = CancelToken(job_id, ('analyze',))
+
+    def work():
+        yield "started"
+        while not cancel.is_set():
+            time.sleep(0.02)
+        yield "stopped"
+
+    superseded = streams.metrics.STREAM_RUNS.value(stream="analyze", outcome="superseded")
+    run = streams.start(job_id, "analyze", work, cancel)
+    _wait(lambda: store.events_after(run))
+    newer = store.start_stream(job_id, "analyze")  # what streams.start does on the other process
+
+    # The old run has nothing to report, so the watchdog notices it was replaced
+    _wait(lambda: run not in streams._runs)
+    assert cancel.is_set()
+    assert store.events_after(run) == [] and store.events_after(newer) == []
+    assert store.append_event(job_id, run, "late") is None
+    assert streams.metrics.STREAM_RUNS.value(stream="analyze", outcome="superseded") == superseded + 1
+
+
+# ✅ Test 7: Streamed bodies relay on their own threads; requests are served while the relays are all busy
+def test_asgi_relays_do_not_block_requests(monkeypatch):
+    relays = ThreadPoolExecutor(1)
+    monkeypatch.setattr(asgi, "_relays", relays)
+    gate = threading.Event()
+
+    def chunks():
+        yield b"data: first\n\n"
+        gate.wait(10)
+        yield b"data: last\n\n"
+
+    async def scenario():
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        relay = asyncio.create_task(asgi._send_iter(chunks(), send))
+        await asyncio.sleep(0.1)
+        status, _, _ = await asyncio.wait_for(_asgi_get('/metrics'), 5)
+        gate.set()
+        await relay
+        return status, b"".join(m["body"] for m in sent)
+
+    try:
+        status, body = asyncio.run(scenario())
+    finally:
+        gate.set()
+        relays.shutdown()
+    assert status == 200
+    assert body == b"data: first\n\ndata: last\n\n"
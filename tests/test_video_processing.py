@@ -1,11 +1,34 @@
 import os
 import shutil
 import pytest
-from src.video_processing import extract_frames
+import frame_cache  # the module object video_processing reads its cache from
+from benchmarks.synthetic import make_video
+from src.frame_cache import FrameCache
+import src.video_processing as video_processing
+from src.video_processing import (
+    ExtractionStats, extract_frames, extract_frames_parallel, iter_frames, iter_frames_adaptive,
+    plan_segments
+)
 
 TEST_VIDEO_PATH = "data/sample_video.mp4"
 TEST_OUTPUT_DIR = "tests/output_frames"
 
+# 🔧 Fixture: generate the sample video when the repo checkout does not have one
+@pytest.fixture(scope="module", autouse=True)
+def sample_video():
+    if not os.path.exists(TEST_VIDEO_PATH):
+        make_video(TEST_VIDEO_PATH, width=320, height=240, seconds=10)
+    return TEST_VIDEO_PATH
+
+# 🔧 Fixture: an empty frame cache with the quality gate off, so slots map to exact frames
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = FrameCache(str(tmp_path / "frame_cache"), max_bytes=0)
+    monkeypatch.setattr(frame_cache, "_cache", cache)
+    monkeypatch.setattr(video_processing.config, "FRAME_CACHE_ENABLED", True)
+    monkeypatch.setattr(video_processing.config, "QUALITY_GATE", "off")
+    return cache
+
 # 🔧 Fixture to automatically clean up the test output directory after each test
 @pytest.fixture(autouse=True)
 def clean_output_dir():
@@ -39,3 +62,81 @@ def test_custom_output_dir_and_interval():
     frames = extract_frames(TEST_VIDEO_PATH, output_dir=TEST_OUTPUT_DIR, interval=10)
     assert len(frames) > 0
     assert os.path.exists(TEST_OUTPUT_DIR)
+
+# ✅ Test 6: Parallel extraction matches serial numbering and order
+def test_parallel_extraction_matches_serial():
+    serial = extract_frames(TEST_VIDEO_PATH, output_dir=TEST_OUTPUT_DIR, interval=10)
+    parallel = extract_frames_parallel(TEST_VIDEO_PATH, output_dir=TEST_OUTPUT_DIR, interval=10, workers=2)
+    assert parallel == serial
+
+# ✅ Test 7: Segment planning covers every kept frame and leaves the tail open-ended
+def test_plan_segments_contiguous():
+    segments = plan_segments(total_frames=100_000, interval=30, workers=4)
+    assert segments[0][0] == 0
+    assert segments[-1][1] is None
+    assert all(a[1] == b[0] for a, b in zip(segments, segments[1:]))
+    assert plan_segments(total_frames=10, interval=30, workers=4) == [(0, None)]
+
+# ✅ Test 8: Adaptive sampling never exceeds max spacing, even on a static scene
+def test_adaptive_sampling_respects_max_spacing():
+    fixed = extract_frames(TEST_VIDEO_PATH, output_dir=TEST_OUTPUT_DIR, interval=50)
+    adaptive = list(iter_frames_adaptive(TEST_VIDEO_PATH, output_dir=TEST_OUTPUT_DIR,
+                                         min_spacing=10, max_spacing=50, threshold=1.0))
+    assert len(adaptive) == len(fixed)
+
+# ✅ Test 9: Halving the interval decodes only the frames not extracted before
+def test_frame_cache_reuses_frames(cache, tmp_path):
+    coarse = ExtractionStats()
+    list(iter_frames(TEST_VIDEO_PATH, str(tmp_path / "coarse"), 60, coarse))
+    fine = ExtractionStats()
+    frames = list(iter_frames(TEST_VIDEO_PATH, str(tmp_path / "fine"), 30, fine))
+
+    assert coarse.frames_cached == 0
+    assert fine.frames_cached == coarse.frames_saved
+    assert fine.frames_saved - fine.frames_cached == fine.frames_saved // 2
+    # Reused JPEGs are the ones a fresh extraction would write
+    fresh = str(tmp_path / "fresh")
+    cache.max_bytes = 1
+    cache.evict()
+    reference = list(iter_frames(TEST_VIDEO_PATH, fresh, 30))
+    for cached, decoded in zip(frames, reference):
+        with open(cached, "rb") as a, open(decoded, "rb") as b:
+            assert a.read() == b.read()
+
+# ✅ Test 10: Cached frames carry their decode timestamps and evict least recently used first
+def test_frame_cache_timestamps_and_eviction(cache, tmp_path):
+    list(iter_frames(TEST_VIDEO_PATH, str(tmp_path / "out"), 100))
+    video = cache.video_key(TEST_VIDEO_PATH)
+    entries = cache.entries(video)
+    assert sorted(entries) == [0, 100, 200]
+    assert entries[0].pos_msec == pytest.approx(0, abs=1)
+    assert entries[200].pos_msec == pytest.approx(200 * 1000 / 30, abs=1)
+
+    cache.materialize(video, entries[0], str(tmp_path / "reused.jpg"))  # most recently used
+    cache.max_bytes = cache.size() - 1
+    assert cache.evict() == 1
+    assert sorted(cache.entries(video)) == [0, 200]
+
+# ✅ Test 11: Parallel workers read and fill the same cache
+def test_frame_cache_parallel(cache, tmp_path, monkeypatch):
+    monkeypatch.setenv("FRAME_CACHE_DIR", cache.root)  # read by the spawned workers
+    monkeypatch.setenv("QUALITY_GATE", "off")
+    monkeypatch.setattr(video_processing.config, "EXTRACT_MIN_SEGMENT_FRAMES", 60)
+    first = ExtractionStats()
+    serial = list(iter_frames(TEST_VIDEO_PATH, str(tmp_path / "serial"), 20, first))
+    stats = ExtractionStats()
+    parallel = extract_frames_parallel(TEST_VIDEO_PATH, str(tmp_path / "parallel"), 10, workers=2, stats=stats)
+    assert len(parallel) == 2 * len(serial) - (1 if len(parallel) % 2 else 0)
+    assert stats.frames_cached == len(serial)
+
+# ✅ Test 12: A hash recorded at upload keys the cache without hashing the video again
+def test_frame_cache_uses_known_hash(cache, tmp_path, monkeypatch):
+    video = cache.video_key(TEST_VIDEO_PATH)
+    list(iter_frames(TEST_VIDEO_PATH, str(tmp_path / "first"), 100))
+
+    def rehash(path):
+        raise AssertionError("video hashed again")
+    monkeypatch.setattr(cache, "video_key", rehash)
+    stats = ExtractionStats()
+    list(iter_frames(TEST_VIDEO_PATH, str(tmp_path / "second"), 100, stats, video_sha256=video))
+    assert stats.frames_cached == stats.frames_saved == 3